@@ -0,0 +1,310 @@
+"""
+Almacenamiento de documentos desacoplado del disco local.
+
+Los documentos se identifican por una clave neutra (`documentos/{usuario_id}/{nombre}`),
+que es lo que se guarda en `Documento.ruta`. El backend se elige con ALMACENAMIENTO:
+
+- local: archivos bajo ALMACENAMIENTO_DIR (por defecto `uploads`, el directorio
+  de siempre). Solo sirve para una única instancia de la API.
+- s3: cualquier almacén compatible con S3 (AWS, MinIO...). Varias instancias
+  detrás de un balanceador comparten los mismos documentos.
+
+Ambos ofrecen escritura atómica desde un archivo temporal (la subida se copia
+por trozos a disco local y luego se sube entera o con multipart), descarga en
+streaming con Range y peticiones condicionales, y URLs firmadas para que el
+cliente descargue sin pasar los bytes por los workers de la API.
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from uuid import uuid4
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+ALMACENAMIENTO = os.getenv("ALMACENAMIENTO", "local").lower()
+ALMACENAMIENTO_DIR = os.getenv("ALMACENAMIENTO_DIR", "uploads")
+URL_FIRMADA_SEGUNDOS = int(os.getenv("URL_FIRMADA_SEGUNDOS", "300"))
+
+S3_BUCKET = os.getenv("S3_BUCKET", "registro-horario")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY") or None
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY") or None
+
+TROZO = 64 * 1024
+
+
+def validar_clave(*partes: str) -> str:
+    """Une las partes en una clave; 404 si alguna intenta salir de su carpeta."""
+    for parte in partes:
+        parte = str(parte)
+        if not parte or parte in (".", "..") or "/" in parte or "\\" in parte or "\x00" in parte:
+            raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    return "/".join(str(p) for p in partes)
+
+
+def content_disposition(nombre: str) -> str:
+    codificado = quote(nombre)
+    if codificado != nombre:
+        return f"attachment; filename*=utf-8''{codificado}"
+    return f'attachment; filename="{nombre}"'
+
+
+def _coincide_etag(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+
+
+def no_modificado(request: Request, etag: str, last_modified: str) -> bool:
+    """Evalúa If-None-Match / If-Modified-Since contra la versión actual."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _coincide_etag(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class AlmacenamientoLocal:
+    nombre = "local"
+
+    def __init__(self, raiz: str = ALMACENAMIENTO_DIR):
+        self.raiz = raiz
+
+    def preparar(self):
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        base = os.path.realpath(self.raiz)
+        ruta = os.path.realpath(os.path.join(base, clave))
+        if os.path.commonpath([base, ruta]) != base or ruta == base:
+            raise HTTPException(status_code=404, detail="Archivo no encontrado")
+        return ruta
+
+    def temporal(self, clave: str) -> str:
+        """Ruta temporal en el mismo sistema de archivos que el destino (os.replace atómico)."""
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        return f"{ruta}.{uuid4().hex}.tmp"
+
+    def guardar_desde(self, clave: str, ruta_tmp: str, media_type: str | None = None):
+        """Publica un temporal ya completo con la clave dada (el temporal desaparece)."""
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        os.replace(ruta_tmp, ruta)
+
+    def guardar(self, clave: str, contenido: bytes, media_type: str | None = None):
+        ruta_tmp = self.temporal(clave)
+        with open(ruta_tmp, "wb") as f:
+            f.write(contenido)
+        self.guardar_desde(clave, ruta_tmp, media_type)
+
+    def leer(self, clave: str) -> bytes:
+        try:
+            with open(self._ruta(clave), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    def existe(self, clave: str) -> bool:
+        return os.path.isfile(self._ruta(clave))
+
+    def eliminar(self, clave: str):
+        try:
+            os.remove(self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+    def url_firmada(self, clave: str, nombre: str, segundos: int = URL_FIRMADA_SEGUNDOS) -> str | None:
+        """En local no hay URL externa: se usa la descarga firmada de la propia API."""
+        return None
+
+    def respuesta(self, request: Request, clave: str, nombre: str, media_type: str | None = None):
+        """
+        FileResponse envía el archivo por trozos (o con sendfile si el servidor
+        lo soporta) y atiende Range/If-Range; si el cliente ya tiene la versión
+        actual se responde 304 sin cuerpo.
+        """
+        ruta = self._ruta(clave)
+        try:
+            stat = os.stat(ruta)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+        respuesta = FileResponse(ruta, media_type=media_type, filename=nombre, stat_result=stat)
+        etag, last_modified = respuesta.headers["etag"], respuesta.headers["last-modified"]
+        if no_modificado(request, etag, last_modified):
+            return Response(status_code=304, headers={"ETag": etag, "Last-Modified": last_modified})
+        return respuesta
+
+
+class AlmacenamientoS3:
+    nombre = "s3"
+
+    def __init__(self):
+        import boto3
+        from botocore.config import Config
+
+        def cliente(endpoint_url):
+            return boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=S3_REGION,
+                aws_access_key_id=S3_ACCESS_KEY,
+                aws_secret_access_key=S3_SECRET_KEY,
+                config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+            )
+
+        self.bucket = S3_BUCKET
+        self.cliente = cliente(S3_ENDPOINT_URL)
+        # Las URLs firmadas deben usar el host que ve el cliente (p. ej. MinIO
+        # detrás de docker-compose es http://minio:9000 solo para la API).
+        self.cliente_publico = cliente(S3_PUBLIC_ENDPOINT_URL) if S3_PUBLIC_ENDPOINT_URL else self.cliente
+
+    def _error(self, e) -> tuple[str, int]:
+        return e.response.get("Error", {}).get("Code", ""), e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+
+    def preparar(self):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.cliente.head_bucket(Bucket=self.bucket)
+        except ClientError as e:
+            if self._error(e)[1] != 404:
+                raise
+            self.cliente.create_bucket(Bucket=self.bucket)
+
+    def temporal(self, clave: str) -> str:
+        fd, ruta = tempfile.mkstemp(suffix=".tmp")
+        os.close(fd)
+        return ruta
+
+    def guardar_desde(self, clave: str, ruta_tmp: str, media_type: str | None = None):
+        """upload_file sube por partes en paralelo los archivos grandes (multipart)."""
+        try:
+            self.cliente.upload_file(
+                ruta_tmp, self.bucket, clave,
+                ExtraArgs={"ContentType": media_type} if media_type else None,
+            )
+        finally:
+            os.remove(ruta_tmp)
+
+    def guardar(self, clave: str, contenido: bytes, media_type: str | None = None):
+        extra = {"ContentType": media_type} if media_type else {}
+        self.cliente.put_object(Bucket=self.bucket, Key=clave, Body=contenido, **extra)
+
+    def leer(self, clave: str) -> bytes:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.cliente.get_object(Bucket=self.bucket, Key=clave)["Body"].read()
+        except ClientError as e:
+            if self._error(e)[1] == 404:
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+            raise
+
+    def existe(self, clave: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.cliente.head_object(Bucket=self.bucket, Key=clave)
+            return True
+        except ClientError as e:
+            if self._error(e)[1] == 404:
+                return False
+            raise
+
+    def eliminar(self, clave: str):
+        self.cliente.delete_object(Bucket=self.bucket, Key=clave)
+
+    def url_firmada(self, clave: str, nombre: str, segundos: int = URL_FIRMADA_SEGUNDOS) -> str:
+        return self.cliente_publico.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": clave,
+                "ResponseContentDisposition": content_disposition(nombre),
+            },
+            ExpiresIn=segundos,
+        )
+
+    def respuesta(self, request: Request, clave: str, nombre: str, media_type: str | None = None):
+        """
+        Reenvía el objeto en streaming. Range, If-None-Match e If-Modified-Since
+        se delegan en S3; If-Range se resuelve aquí con un HEAD previo.
+        """
+        from botocore.exceptions import ClientError
+
+        params = {"Bucket": self.bucket, "Key": clave}
+        rango = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        try:
+            if rango and if_range:
+                cabecera = self.cliente.head_object(**params)
+                ultima = formatdate(cabecera["LastModified"].timestamp(), usegmt=True)
+                if if_range not in (cabecera["ETag"], ultima):
+                    rango = None
+            if rango:
+                params["Range"] = rango
+            if request.headers.get("if-none-match"):
+                params["IfNoneMatch"] = request.headers["if-none-match"]
+            elif request.headers.get("if-modified-since"):
+                try:
+                    params["IfModifiedSince"] = parsedate_to_datetime(request.headers["if-modified-since"])
+                except (TypeError, ValueError):
+                    pass
+            objeto = self.cliente.get_object(**params)
+        except ClientError as e:
+            codigo, estado = self._error(e)
+            if estado == 304:
+                cabeceras = e.response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+                return Response(status_code=304, headers={
+                    k: cabeceras[k.lower()] for k in ("ETag", "Last-Modified") if k.lower() in cabeceras
+                })
+            if estado == 404 or codigo in ("NoSuchKey", "NotFound"):
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+            if estado == 416:
+                return Response(status_code=416)
+            raise
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(objeto["ContentLength"]),
+            "Content-Disposition": content_disposition(nombre),
+            "ETag": objeto["ETag"],
+            "Last-Modified": formatdate(objeto["LastModified"].timestamp(), usegmt=True),
+        }
+        if objeto.get("ContentRange"):
+            headers["Content-Range"] = objeto["ContentRange"]
+
+        return StreamingResponse(
+            objeto["Body"].iter_chunks(TROZO),
+            status_code=206 if objeto.get("ContentRange") else 200,
+            media_type=media_type or objeto.get("ContentType") or "application/octet-stream",
+            headers=headers,
+        )
+
+
+def _crear():
+    if ALMACENAMIENTO == "s3":
+        return AlmacenamientoS3()
+    if ALMACENAMIENTO == "local":
+        return AlmacenamientoLocal()
+    raise RuntimeError(f"ALMACENAMIENTO desconocido: {ALMACENAMIENTO}")
+
+
+almacenamiento = _crear()
+
+
+def caducidad(segundos: int = URL_FIRMADA_SEGUNDOS) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=segundos)
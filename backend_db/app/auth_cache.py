@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.usuario import Usuario
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+
+
+class UsuarioActual:
+    """
+    Copia ligera (sin sesión de SQLAlchemy) del usuario autenticado.
+    Expone los mismos atributos que usan los routers sobre `Usuario`.
+    """
+
+    __slots__ = (
+        "id",
+        "empresa_id",
+        "email",
+        "nombre",
+        "apellidos",
+        "dni",
+        "rol",
+        "activo",
+        "fecha_creacion",
+    )
+
+    def __init__(self, **campos):
+        for campo in self.__slots__:
+            setattr(self, campo, campos.get(campo))
+
+    @classmethod
+    def desde_modelo(cls, usuario: Usuario) -> "UsuarioActual":
+        return cls(**{campo: getattr(usuario, campo) for campo in cls.__slots__})
+
+    def __repr__(self):
+        return f"<UsuarioActual {self.email} ({self.rol})>"
+
+
+class PrincipalCache:
+    """
+    Caché LRU con TTL de usuarios autenticados, indexada por el `sub` del JWT.
+    Es local al proceso: cada worker de uvicorn mantiene la suya y el TTL
+    acota cuánto puede tardar en verse un cambio hecho desde otro proceso.
+    """
+
+    def __init__(self, max_entradas: int = AUTH_CACHE_MAX, ttl: float = AUTH_CACHE_TTL):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas: "OrderedDict[str, tuple[float, UsuarioActual]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expiradas = 0
+        self.desalojadas = 0
+        self.invalidaciones = 0
+
+    def get(self, sub: str) -> UsuarioActual | None:
+        if self.max_entradas <= 0:
+            self.misses += 1
+            return None
+
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(sub)
+            if entrada is None:
+                self.misses += 1
+                return None
+
+            caduca, principal = entrada
+            if caduca <= ahora:
+                del self._entradas[sub]
+                self.expiradas += 1
+                self.misses += 1
+                return None
+
+            self._entradas.move_to_end(sub)
+            self.hits += 1
+            return principal
+
+    def put(self, sub: str, principal: UsuarioActual):
+        if self.max_entradas <= 0:
+            return
+
+        with self._lock:
+            self._entradas[sub] = (time.monotonic() + self.ttl, principal)
+            self._entradas.move_to_end(sub)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojadas += 1
+
+    def invalidar(self, usuario_id) -> int:
+        """Elimina todas las entradas del usuario (por id o por email)."""
+        usuario_id = str(usuario_id)
+        with self._lock:
+            claves = [
+                sub for sub, (_, principal) in self._entradas.items()
+                if str(principal.id) == usuario_id
+            ]
+            for sub in claves:
+                del self._entradas[sub]
+            self.invalidaciones += len(claves)
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+            "ttl_segundos": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "expiradas": self.expiradas,
+            "desalojadas": self.desalojadas,
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidar_usuario(usuario_id):
+    """
+    Invalida explícitamente un usuario. Necesario tras `query(...).update()`
+    o SQL directo, que no disparan los eventos del ORM.
+    """
+    principal_cache.invalidar(usuario_id)
+
+
+# Invalidación automática: cualquier UPDATE/DELETE de un Usuario hecho con el ORM
+# se invalida al hacer flush y de nuevo tras el commit, para que ninguna petición
+# concurrente deje cacheada la versión anterior a la transacción.
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _usuario_modificado(mapper, connection, target):
+    principal_cache.invalidar(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("usuarios_invalidados", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _tras_commit(session):
+    for usuario_id in session.info.pop("usuarios_invalidados", ()):
+        principal_cache.invalidar(usuario_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _tras_rollback(session):
+    session.info.pop("usuarios_invalidados", None)
@@ -0,0 +1,155 @@
+"""
+Borra del almacenamiento los blobs que ya no usa ningún documento.
+
+Primero recalcula `blobs.referencias` contando las filas de documentos que
+apuntan a cada blob (las bajas en cascada al borrar un usuario no pasan por
+registrar_documentos y dejan el contador alto). Son las únicas referencias a
+un blob: el resto de tablas (trabajos_informe.archivo) guardan la clave por
+usuario que devuelve guardar_archivo y se resuelven al descargar.
+
+Después borra los blobs sin referencias que no se han usado en las últimas
+--gracia-horas: el margen protege a un envío que acaba de guardar el blob y
+aún no ha dado de alta sus documentos.
+
+Cada blob se borra con su fila bloqueada (SKIP LOCKED), primero el objeto y
+luego la fila, así que si algo falla a medias la fila sigue ahí y el
+siguiente guardar_blob vuelve a escribir el contenido.
+
+La API lo lanza cada BLOBS_LIMPIEZA_HORAS (0 = esta instancia no limpia);
+con varias réplicas solo corre en la que consigue el advisory lock. A mano:
+
+    python -m app.blobs limpiar [--gracia-horas 24] [--dry-run]
+    docker compose exec api python -m app.blobs limpiar --dry-run
+"""
+import argparse
+import asyncio
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.almacenamiento import almacenamiento
+from app.database import engine
+from app.routers.documentos import PREFIJO_BLOBS, clave_blob
+
+BLOBS_LIMPIEZA_HORAS = float(os.getenv("BLOBS_LIMPIEZA_HORAS", "24"))
+BLOBS_GRACIA_HORAS = int(os.getenv("BLOBS_GRACIA_HORAS", "24"))
+
+LOTE = 500
+
+RECONTAR = text(f"""
+    UPDATE blobs b
+    SET referencias = c.n
+    FROM (
+        SELECT b2.sha256, count(d.id) AS n
+        FROM blobs b2
+        LEFT JOIN documentos d
+          ON d.ruta = '{PREFIJO_BLOBS}/' || substr(b2.sha256, 1, 2) || '/' || b2.sha256
+        GROUP BY b2.sha256
+    ) c
+    WHERE c.sha256 = b.sha256 AND b.referencias <> c.n
+""")
+
+CANDIDATOS = text("""
+    SELECT sha256, tamano
+    FROM blobs
+    WHERE referencias <= 0
+      AND fecha_uso < now() - make_interval(hours => :gracia)
+    ORDER BY fecha_uso
+    LIMIT :lote
+    FOR UPDATE SKIP LOCKED
+""")
+
+# Una sola réplica limpia a la vez; las demás se saltan la pasada.
+CERROJO = text("SELECT pg_try_advisory_lock(hashtext('limpiar_blobs'))")
+SOLTAR = text("SELECT pg_advisory_unlock(hashtext('limpiar_blobs'))")
+
+_tarea: asyncio.Task | None = None
+
+
+def limpiar(gracia_horas: int = BLOBS_GRACIA_HORAS, dry_run: bool = False, listar: bool = False):
+    """Recalcula referencias y borra los blobs huérfanos. Devuelve (corregidos, borrados, bytes)."""
+    with engine.begin() as conn:
+        corregidos = conn.execute(RECONTAR).rowcount
+
+    borrados = liberados = 0
+    while True:
+        with engine.begin() as conn:
+            filas = conn.execute(CANDIDATOS, {"gracia": gracia_horas, "lote": LOTE}).all()
+            if not filas:
+                break
+
+            for sha256, tamano in filas:
+                if listar:
+                    print(f"- {clave_blob(sha256)} ({tamano} bytes)")
+                if not dry_run:
+                    almacenamiento.eliminar(clave_blob(sha256))
+                    conn.execute(text("DELETE FROM blobs WHERE sha256 = :sha256"), {"sha256": sha256})
+                borrados += 1
+                liberados += tamano
+
+        if dry_run or len(filas) < LOTE:
+            break
+
+    return corregidos, borrados, liberados
+
+
+def limpiar_si_libre(gracia_horas: int = BLOBS_GRACIA_HORAS):
+    """Como `limpiar`, pero devuelve None si otra réplica ya está limpiando."""
+    with engine.connect() as conn:
+        if not conn.execute(CERROJO).scalar():
+            return None
+        conn.commit()
+        try:
+            return limpiar(gracia_horas)
+        finally:
+            conn.execute(SOLTAR)
+            conn.commit()
+
+
+async def _periodica():
+    while True:
+        await asyncio.sleep(BLOBS_LIMPIEZA_HORAS * 3600)
+        try:
+            resultado = await run_in_threadpool(limpiar_si_libre)
+            if resultado:
+                corregidos, borrados, liberados = resultado
+                print(f"🧹 Blobs: {corregidos} referencias corregidas, {borrados} borrados "
+                      f"({liberados / 1024 / 1024:.1f} MB)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Error limpiando blobs: {e}")
+
+
+def iniciar_limpieza():
+    global _tarea
+    if BLOBS_LIMPIEZA_HORAS > 0:
+        _tarea = asyncio.create_task(_periodica())
+
+
+async def detener_limpieza():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        await asyncio.gather(_tarea, return_exceptions=True)
+        _tarea = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="accion", required=True)
+    limpieza = sub.add_parser("limpiar", help="Borra los blobs sin documentos")
+    limpieza.add_argument("--gracia-horas", type=int, default=BLOBS_GRACIA_HORAS,
+                          help="No borrar blobs usados hace menos de esto")
+    limpieza.add_argument("--dry-run", action="store_true", help="Solo lista lo que se borraría")
+    args = parser.parse_args()
+
+    corregidos, borrados, liberados = limpiar(args.gracia_horas, args.dry_run, listar=True)
+    print(f"🔢 Referencias corregidas en {corregidos} blobs")
+    accion = "a borrar" if args.dry_run else "borrados"
+    print(f"✅ {borrados} blobs {accion} ({liberados / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Ingesta diferida de fichajes para los picos de inicio de turno
+(FICHAJES_BUFFER=1; por defecto desactivada).
+
+Fichando de uno en uno, cada POST /fichajes/{tipo} hace su commit (un fsync
+de Postgres) y su refresh. Con el buffer:
+
+1. El fichaje se añade a un registro local de solo escritura (segmentos
+   `fichajes-<n>.wal` en FICHAJES_BUFFER_DIR, una línea JSON por evento) y se
+   responde 202 en cuanto está en disco. Las escrituras que llegan mientras
+   se hace un fsync se agrupan en el siguiente (group commit): un fsync por
+   tanda, no por fichaje.
+2. Una tarea vuelca lo pendiente a Postgres en lotes de hasta
+   FICHAJES_BUFFER_LOTE eventos o cada FICHAJES_BUFFER_MS, con
+   app.ingesta.registrar_fichajes (un INSERT de varias filas con
+   ON CONFLICT DO NOTHING, jornadas, estado_actual y eventos).
+3. Un segmento se borra cuando todos sus eventos están en Postgres. Al
+   arrancar se vuelven a volcar los segmentos que queden (caída del
+   proceso): el id del fichaje va en el registro, así que lo que ya llegó a
+   Postgres se descarta como duplicado.
+
+Cada proceso necesita su propio FICHAJES_BUFFER_DIR en disco persistente
+(un volumen por réplica); se bloquea con un archivo .lock para que dos
+procesos no lo compartan por error.
+"""
+import asyncio
+import fcntl
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+from sqlalchemy.exc import IntegrityError
+
+from app.database import AsyncSessionLocal, _env_bool
+from app.ingesta import FICHAJE_DEDUP_SEGUNDOS, registrar_fichajes
+
+FICHAJES_BUFFER = _env_bool("FICHAJES_BUFFER", False)
+FICHAJES_BUFFER_DIR = os.getenv("FICHAJES_BUFFER_DIR", "buffer_fichajes")
+FICHAJES_BUFFER_LOTE = int(os.getenv("FICHAJES_BUFFER_LOTE", "500"))
+FICHAJES_BUFFER_MS = int(os.getenv("FICHAJES_BUFFER_MS", "50"))
+FICHAJES_BUFFER_SEGMENTO_MB = int(os.getenv("FICHAJES_BUFFER_SEGMENTO_MB", "16"))
+
+
+def _serializar(evento: dict) -> bytes:
+    return (json.dumps({**evento, "fecha_hora": evento["fecha_hora"].isoformat()}, default=str) + "\n").encode()
+
+
+def _deserializar(linea: bytes) -> dict:
+    evento = json.loads(linea)
+    for campo in ("id", "usuario_id", "empresa_id"):
+        evento[campo] = UUID(evento[campo])
+    evento["fecha_hora"] = datetime.fromisoformat(evento["fecha_hora"])
+    return evento
+
+
+def _fsync_dir(ruta: str):
+    fd = os.open(ruta, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def _volcar(eventos: list[dict]):
+    try:
+        async with AsyncSessionLocal() as db:
+            await registrar_fichajes(db, eventos, validar=False)
+            await db.commit()
+    except IntegrityError as e:
+        # Un evento que no puede entrar nunca (p. ej. usuario borrado) no
+        # debe bloquear el resto: se vuelca uno a uno y se descarta ese.
+        if len(eventos) == 1:
+            print(f"❌ Buffer de fichajes: se descarta el fichaje {eventos[0]['id']}: {e.orig}")
+            return
+        for evento in eventos:
+            await _volcar([evento])
+
+
+class BufferFichajes:
+    def __init__(self, directorio: str = FICHAJES_BUFFER_DIR, lote: int = FICHAJES_BUFFER_LOTE,
+                 espera_ms: int = FICHAJES_BUFFER_MS):
+        self.directorio = directorio
+        self.lote = lote
+        self.espera = espera_ms / 1000
+        self.max_segmento = FICHAJES_BUFFER_SEGMENTO_MB * 1024 * 1024
+
+        self._bloqueo = None
+        self._archivo = None
+        self._segmento = 0
+        self._tamano = 0
+        # Eventos aceptados pendientes de escribir: (línea, evento, future).
+        self._por_escribir = []
+        # Eventos ya en disco pendientes de volcar: (segmento, evento).
+        self._pendientes = []
+        # Por segmento, cuántos de sus eventos faltan por llegar a Postgres.
+        self._sin_volcar: dict[int, int] = {}
+        # Para responder a reintentos sin ir a la BD.
+        self._claves: dict[tuple, dict] = {}
+        self._ultimos: dict[str, dict] = {}
+
+        self._hay_escritura = asyncio.Event()
+        self._hay_pendientes = asyncio.Event()
+        self._lote_lleno = asyncio.Event()
+        self._cerrando = False
+        self._rotar = False
+        self._tareas = []
+
+    # --- Archivos (se llaman desde un hilo) ---
+
+    def _ruta(self, segmento: int) -> str:
+        return os.path.join(self.directorio, f"fichajes-{segmento:012d}.wal")
+
+    def _segmentos_en_disco(self) -> list[int]:
+        return sorted(
+            int(nombre[len("fichajes-"):-len(".wal")])
+            for nombre in os.listdir(self.directorio)
+            if nombre.startswith("fichajes-") and nombre.endswith(".wal")
+        )
+
+    def _abrir(self, segmento: int):
+        self._archivo = open(self._ruta(segmento), "ab")
+        _fsync_dir(self.directorio)
+
+    def _escribir(self, datos: bytes, rotar: int | None, borrar: bool):
+        """Con rotar, cierra ese segmento (y lo borra si ya está volcado) y escribe en el siguiente."""
+        if rotar is not None:
+            self._archivo.close()
+            if borrar:
+                os.remove(self._ruta(rotar))
+            self._abrir(rotar + 1)
+        self._archivo.write(datos)
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+    def _recuperar(self) -> list[tuple[int, dict]]:
+        os.makedirs(self.directorio, exist_ok=True)
+        self._bloqueo = open(os.path.join(self.directorio, ".lock"), "w")
+        try:
+            fcntl.flock(self._bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError(f"FICHAJES_BUFFER_DIR={self.directorio} está en uso por otro proceso")
+
+        recuperados = []
+        segmentos = self._segmentos_en_disco()
+        for segmento in segmentos:
+            with open(self._ruta(segmento), "rb") as f:
+                for linea in f:
+                    # Una línea incompleta es una escritura que no llegó a
+                    # confirmarse (no se respondió al cliente).
+                    try:
+                        recuperados.append((segmento, _deserializar(linea)))
+                    except (ValueError, KeyError):
+                        print(f"⚠️  Buffer de fichajes: línea inválida en el segmento {segmento}, se ignora")
+        self._segmento = segmentos[-1] + 1 if segmentos else 0
+        self._abrir(self._segmento)
+        return recuperados
+
+    def _borrar_segmentos(self, segmentos: list[int]):
+        for segmento in segmentos:
+            try:
+                os.remove(self._ruta(segmento))
+            except FileNotFoundError:
+                pass
+
+    # --- API ---
+
+    async def iniciar(self):
+        recuperados = await asyncio.to_thread(self._recuperar)
+        for segmento, evento in recuperados:
+            self._pendientes.append((segmento, evento))
+            self._sin_volcar[segmento] = self._sin_volcar.get(segmento, 0) + 1
+            if evento.get("clave") is not None:
+                self._claves[(str(evento["usuario_id"]), evento["clave"])] = evento
+        # Segmentos vacíos (o solo con una línea a medias): nada que volcar.
+        vacios = [s for s in await asyncio.to_thread(self._segmentos_en_disco) if s not in self._sin_volcar and s != self._segmento]
+        await asyncio.to_thread(self._borrar_segmentos, vacios)
+        if recuperados:
+            print(f"♻️  Buffer de fichajes: {len(recuperados)} eventos pendientes de volcar")
+            self._hay_pendientes.set()
+        self._tareas = [asyncio.create_task(self._escritor()), asyncio.create_task(self._volcador())]
+
+    def repetido(self, usuario_id, tipo: str, clave: str | None, ahora: datetime) -> dict | None:
+        """Evento aceptado por este proceso con la misma clave o, sin clave, en la ventana de FICHAJE_DEDUP_SEGUNDOS."""
+        if clave is not None:
+            return self._claves.get((str(usuario_id), clave))
+        ultimo = self._ultimos.get(str(usuario_id))
+        if (
+            ultimo is not None and ultimo["tipo"] == tipo
+            and ahora - ultimo["fecha_hora"] < timedelta(seconds=FICHAJE_DEDUP_SEGUNDOS)
+        ):
+            return ultimo
+        return None
+
+    async def encolar(self, usuario_id, empresa_id, tipo: str, clave: str | None = None,
+                      fecha_hora: datetime | None = None) -> dict:
+        """Acepta un fichaje y vuelve cuando está en disco. Devuelve el evento (con su id)."""
+        if self._cerrando:
+            raise RuntimeError("Buffer de fichajes cerrado")
+        evento = {
+            "id": uuid4(),
+            "usuario_id": usuario_id,
+            "empresa_id": empresa_id,
+            "tipo": tipo,
+            "fecha_hora": fecha_hora or datetime.now(timezone.utc),
+            "clave": clave,
+        }
+        # Se registra antes de esperar al disco para que un reintento
+        # simultáneo ya lo encuentre.
+        anterior = self._ultimos.get(str(usuario_id))
+        self._ultimos[str(usuario_id)] = evento
+        if clave is not None:
+            self._claves[(str(usuario_id), clave)] = evento
+
+        escrito = asyncio.get_running_loop().create_future()
+        self._por_escribir.append((_serializar(evento), evento, escrito))
+        self._hay_escritura.set()
+        try:
+            await escrito
+        except Exception:
+            if self._ultimos.get(str(usuario_id)) is evento:
+                if anterior is None:
+                    self._ultimos.pop(str(usuario_id), None)
+                else:
+                    self._ultimos[str(usuario_id)] = anterior
+            if clave is not None:
+                self._claves.pop((str(usuario_id), clave), None)
+            raise
+        return evento
+
+    async def detener(self, espera: float = 30):
+        """Deja de aceptar fichajes y vuelca lo pendiente; lo que no dé tiempo se queda en disco."""
+        self._cerrando = True
+        self._hay_escritura.set()
+        self._hay_pendientes.set()
+        self._lote_lleno.set()
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._tareas), espera)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Buffer de fichajes: {len(self._pendientes)} eventos quedan en disco para el próximo arranque")
+            for tarea in self._tareas:
+                tarea.cancel()
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+        if self._archivo is not None:
+            self._archivo.close()
+            if not self._sin_volcar.get(self._segmento) and not self._pendientes:
+                await asyncio.to_thread(self._borrar_segmentos, [self._segmento])
+        if self._bloqueo is not None:
+            self._bloqueo.close()
+
+    # --- Tareas ---
+
+    async def _escritor(self):
+        while True:
+            if not self._por_escribir:
+                if self._cerrando:
+                    return
+                await self._hay_escritura.wait()
+                self._hay_escritura.clear()
+                continue
+            grupo, self._por_escribir = self._por_escribir, []
+
+            datos = b"".join(linea for linea, _, _ in grupo)
+            # Se cambia de segmento cuando el actual ya está volcado entero
+            # (y se borra), cuando es demasiado grande o tras un error de
+            # escritura (puede haber quedado una línea a medias).
+            volcado = self._sin_volcar.get(self._segmento, 0) == 0
+            rotar = None
+            if self._tamano > 0 and (volcado or self._tamano >= self.max_segmento or self._rotar):
+                rotar = self._segmento
+            try:
+                await asyncio.to_thread(self._escribir, datos, rotar, rotar is not None and volcado)
+            except Exception as e:
+                print(f"❌ Buffer de fichajes: error escribiendo en disco: {e}")
+                self._rotar = True
+                self._tamano += len(datos)
+                for _, _, escrito in grupo:
+                    if not escrito.done():
+                        escrito.set_exception(e)
+                continue
+
+            if rotar is not None:
+                if volcado:
+                    self._sin_volcar.pop(rotar, None)
+                self._segmento, self._tamano, self._rotar = rotar + 1, 0, False
+            self._tamano += len(datos)
+            self._sin_volcar[self._segmento] = self._sin_volcar.get(self._segmento, 0) + len(grupo)
+            for _, evento, escrito in grupo:
+                self._pendientes.append((self._segmento, evento))
+                if not escrito.done():
+                    escrito.set_result(None)
+            self._hay_pendientes.set()
+            if len(self._pendientes) >= self.lote:
+                self._lote_lleno.set()
+
+    async def _volcador(self):
+        espera_error = 1
+        while True:
+            await self._hay_pendientes.wait()
+            if len(self._pendientes) < self.lote and not self._cerrando:
+                try:
+                    await asyncio.wait_for(self._lote_lleno.wait(), self.espera)
+                except asyncio.TimeoutError:
+                    pass
+            self._hay_pendientes.clear()
+            self._lote_lleno.clear()
+
+            lote = self._pendientes[:self.lote]
+            if not lote:
+                if self._cerrando:
+                    if self._tareas[0].done():
+                        return
+                    # Lo último que quede por escribir se vuelca antes de salir.
+                    await asyncio.wait([self._tareas[0]])
+                    self._hay_pendientes.set()
+                continue
+
+            try:
+                await _volcar([evento for _, evento in lote])
+            except Exception as e:
+                # Postgres caído o similar: los eventos siguen en disco y en memoria.
+                print(f"❌ Buffer de fichajes: error volcando {len(lote)} eventos: {e}")
+                await asyncio.sleep(espera_error)
+                espera_error = min(espera_error * 2, 30)
+                self._hay_pendientes.set()
+                continue
+            espera_error = 1
+
+            del self._pendientes[:len(lote)]
+            volcados = set()
+            for segmento, evento in lote:
+                self._sin_volcar[segmento] -= 1
+                volcados.add(segmento)
+                if evento.get("clave") is not None:
+                    self._claves.pop((str(evento["usuario_id"]), evento["clave"]), None)
+            completos = [s for s in volcados if self._sin_volcar[s] == 0 and s != self._segmento]
+            for segmento in completos:
+                del self._sin_volcar[segmento]
+            if self._sin_volcar.get(self._segmento) == 0:
+                del self._sin_volcar[self._segmento]
+            if completos:
+                await asyncio.to_thread(self._borrar_segmentos, completos)
+            if self._pendientes or self._cerrando:
+                self._hay_pendientes.set()
+
+
+buffer: BufferFichajes | None = None
+
+
+async def iniciar_buffer():
+    global buffer
+    if FICHAJES_BUFFER and buffer is None:
+        buffer = BufferFichajes()
+        await buffer.iniciar()
+
+
+async def detener_buffer():
+    global buffer
+    if buffer is not None:
+        await buffer.detener()
+        buffer = None
@@ -0,0 +1,144 @@
+"""
+Caché en disco de informes generados (CSV, PDF, XLSX), direccionada por contenido.
+
+La clave es el sha256 de (usuario, tipo, periodo, formato, versión de datos),
+donde la versión de datos sale de los fichajes del periodo: número de filas y
+`max(fecha_creacion)`. Un fichaje nuevo en el periodo cambia la versión, y con
+ella la clave, así que no hace falta invalidar nada a mano: la entrada
+antigua deja de pedirse y acaba desalojada.
+
+La clave sirve también de ETag. El tamaño total está acotado por
+CACHE_INFORMES_MAX_MB; al pasarse se borran las entradas usadas hace más
+tiempo (mtime, que se actualiza en cada acierto).
+"""
+import hashlib
+import os
+import shutil
+import threading
+from uuid import uuid4
+
+from sqlalchemy import func, select
+
+from app.models.fichaje import Fichaje
+
+CACHE_DIR = os.getenv("CACHE_INFORMES_DIR", "uploads/cache_informes")
+CACHE_INFORMES_MAX_MB = float(os.getenv("CACHE_INFORMES_MAX_MB", "512"))
+
+# Subir al cambiar el diseño de los informes para no servir versiones viejas.
+VERSION_FORMATO = 1
+
+_lock = threading.Lock()
+_tamano_total: int | None = None
+
+
+def consulta_version(usuario_id, inicio, fin):
+    """SELECT count(*), max(fecha_creacion) de los fichajes del periodo."""
+    return select(func.count(), func.max(Fichaje.fecha_creacion)).where(
+        Fichaje.usuario_id == usuario_id,
+        Fichaje.fecha_hora >= inicio,
+        Fichaje.fecha_hora < fin,
+    )
+
+
+def clave(usuario_id, tipo: str, periodo: str, formato: str, num_fichajes: int, ultima_creacion) -> str:
+    partes = [
+        str(VERSION_FORMATO),
+        str(usuario_id),
+        tipo,
+        periodo,
+        formato,
+        str(num_fichajes),
+        ultima_creacion.isoformat() if ultima_creacion else "",
+    ]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()
+
+
+def etag(clave_cache: str, sufijo: str = "") -> str:
+    return f'"{clave_cache}{sufijo}"'
+
+
+def coincide_etag(if_none_match: str | None, valor: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return valor in [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+
+
+def _ruta(clave_cache: str) -> str:
+    return os.path.join(CACHE_DIR, clave_cache[:2], clave_cache)
+
+
+def obtener(clave_cache: str) -> str | None:
+    """Ruta del informe cacheado, o None. Marca la entrada como usada."""
+    ruta = _ruta(clave_cache)
+    try:
+        os.utime(ruta)
+    except FileNotFoundError:
+        return None
+    return ruta
+
+
+def _registrar(tamano: int):
+    global _tamano_total
+    with _lock:
+        if _tamano_total is None:
+            _tamano_total = sum(tam for _, tam, _ in _entradas())
+        else:
+            _tamano_total += tamano
+        if _tamano_total > CACHE_INFORMES_MAX_MB * 1024 * 1024:
+            _podar()
+
+
+def guardar(clave_cache: str, contenido: bytes) -> str:
+    ruta = _ruta(clave_cache)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(contenido)
+    os.replace(tmp, ruta)
+    _registrar(len(contenido))
+    return ruta
+
+
+def guardar_copia(clave_cache: str, origen: str) -> str:
+    """Guarda en caché un archivo ya escrito (p. ej. el CSV generado en streaming)."""
+    ruta = _ruta(clave_cache)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f"{ruta}.{uuid4().hex}.tmp"
+    shutil.copyfile(origen, tmp)
+    os.replace(tmp, ruta)
+    _registrar(os.path.getsize(ruta))
+    return ruta
+
+
+def _entradas():
+    for raiz, _, archivos in os.walk(CACHE_DIR):
+        for nombre in archivos:
+            if nombre.endswith(".tmp"):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            yield ruta, st.st_size, st.st_mtime
+
+
+def _podar():
+    """Borra las entradas menos usadas hasta quedar al 90% del límite. Con _lock tomado."""
+    global _tamano_total
+    entradas = sorted(_entradas(), key=lambda e: e[2])
+    total = sum(tam for _, tam, _ in entradas)
+    objetivo = CACHE_INFORMES_MAX_MB * 1024 * 1024 * 0.9
+
+    for ruta, tam, _ in entradas:
+        if total <= objetivo:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tam
+
+    _tamano_total = total
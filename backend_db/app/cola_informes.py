@@ -0,0 +1,220 @@
+"""
+Cola de informes en segundo plano, respaldada por la tabla trabajos_informe.
+
+- `encolar` inserta el trabajo como 'pendiente' y despierta a los workers.
+- Los workers son tareas asyncio arrancadas en el startup de la API. Reclaman
+  trabajos con `SELECT ... FOR UPDATE SKIP LOCKED`, así que varios procesos
+  de uvicorn comparten la cola sin repartirse el mismo trabajo. Si el aviso
+  llega a otro proceso, se enteran en el siguiente sondeo.
+- El render se hace en el pool de procesos de app.informes (salvo que el
+  informe ya esté en app.cache_informes); después se guarda el archivo en
+  uploads/documentos y se avisa con una Notificacion.
+- Un trabajo 'procesando' cuyo worker murió vuelve a reclamarse pasados
+  INFORMES_TIMEOUT_SEGUNDOS, hasta INFORMES_MAX_INTENTOS veces.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, select
+
+from app import cache_informes
+from app.database import AsyncSessionLocal
+from app.eventos import publicar_async
+from app.informes import (
+    INFORMES_PROCESOS,
+    generar,
+    nombre_informe,
+    rango_periodo,
+    renderizar_async,
+    titulo_informe,
+)
+from app.models.fichaje import Fichaje
+from app.models.notification import Notificacion
+from app.models.trabajo_informe import TrabajoInforme
+from app.routers.documentos import guardar_archivo
+from app.routers.notification import datos_notificacion
+
+INFORMES_WORKERS = int(os.getenv("INFORMES_WORKERS", str(INFORMES_PROCESOS)))
+INFORMES_POLL_SEGUNDOS = float(os.getenv("INFORMES_POLL_SEGUNDOS", "2"))
+INFORMES_TIMEOUT_SEGUNDOS = int(os.getenv("INFORMES_TIMEOUT_SEGUNDOS", "600"))
+INFORMES_MAX_INTENTOS = int(os.getenv("INFORMES_MAX_INTENTOS", "3"))
+
+_aviso: asyncio.Event | None = None
+_workers: list[asyncio.Task] = []
+
+
+def _avisar():
+    if _aviso is not None:
+        _aviso.set()
+
+
+async def encolar(db, usuario_id, solicitante_id, empresa_id, tipo, periodo, formato) -> TrabajoInforme:
+    trabajo = TrabajoInforme(
+        usuario_id=usuario_id,
+        solicitante_id=solicitante_id,
+        empresa_id=empresa_id,
+        tipo=tipo,
+        periodo=periodo,
+        formato=formato,
+        estado="pendiente",
+        intentos=0,
+    )
+    db.add(trabajo)
+    await db.commit()
+    _avisar()
+    return trabajo
+
+
+async def reclamar():
+    """Marca como 'procesando' el trabajo más antiguo disponible y devuelve su id."""
+    async with AsyncSessionLocal() as db:
+        ahora = datetime.now(timezone.utc)
+        while True:
+            trabajo = (
+                await db.execute(
+                    select(TrabajoInforme)
+                    .where(
+                        or_(
+                            TrabajoInforme.estado == "pendiente",
+                            and_(
+                                TrabajoInforme.estado == "procesando",
+                                TrabajoInforme.fecha_inicio
+                                < ahora - timedelta(seconds=INFORMES_TIMEOUT_SEGUNDOS),
+                            ),
+                        )
+                    )
+                    .order_by(TrabajoInforme.fecha_creacion)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+            ).scalars().first()
+
+            if trabajo is None:
+                await db.commit()
+                return None
+
+            if trabajo.intentos >= INFORMES_MAX_INTENTOS:
+                trabajo.estado = "error"
+                trabajo.error = "Se agotaron los reintentos"
+                trabajo.fecha_fin = ahora
+                await db.commit()
+                continue
+
+            trabajo.estado = "procesando"
+            trabajo.intentos += 1
+            trabajo.fecha_inicio = ahora
+            await db.commit()
+            return trabajo.id
+
+
+def _leer_cache(clave: str) -> bytes | None:
+    ruta = cache_informes.obtener(clave)
+    if ruta is None:
+        return None
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+async def procesar(trabajo_id):
+    async with AsyncSessionLocal() as db:
+        trabajo = await db.get(TrabajoInforme, trabajo_id)
+        nombre = nombre_informe(trabajo.tipo, trabajo.periodo, trabajo.formato)
+
+        try:
+            inicio, fin = rango_periodo(trabajo.tipo, trabajo.periodo)
+            num_fichajes, ultima_creacion = (
+                await db.execute(cache_informes.consulta_version(trabajo.usuario_id, inicio, fin))
+            ).one()
+            if not num_fichajes:
+                raise ValueError("No hay fichajes en el periodo")
+
+            clave = cache_informes.clave(
+                trabajo.usuario_id, trabajo.tipo, trabajo.periodo, trabajo.formato,
+                num_fichajes, ultima_creacion,
+            )
+            contenido = await run_in_threadpool(_leer_cache, clave)
+            if contenido is None:
+                filas = (
+                    await db.execute(
+                        select(Fichaje.tipo, Fichaje.fecha_hora)
+                        .where(
+                            Fichaje.usuario_id == trabajo.usuario_id,
+                            Fichaje.fecha_hora >= inicio,
+                            Fichaje.fecha_hora < fin,
+                        )
+                        .order_by(Fichaje.fecha_hora.asc())
+                    )
+                ).all()
+                contenido = await renderizar_async(
+                    generar,
+                    trabajo.formato,
+                    titulo_informe(trabajo.tipo, trabajo.periodo),
+                    [tuple(f) for f in filas],
+                )
+                await run_in_threadpool(cache_informes.guardar, clave, contenido)
+
+            trabajo.archivo = await run_in_threadpool(
+                guardar_archivo, str(trabajo.usuario_id), nombre, contenido, "informe"
+            )
+            trabajo.estado = "completado"
+            titulo, mensaje = "Informe listo", f"Tu informe {trabajo.tipo} de {trabajo.periodo} ya se puede descargar."
+        except Exception as e:
+            trabajo.estado = "error"
+            trabajo.error = str(e)
+            titulo, mensaje = "Error en el informe", f"No se pudo generar el informe {trabajo.tipo} de {trabajo.periodo}: {e}"
+            print(f"❌ Error generando informe {trabajo.id}: {e}")
+
+        trabajo.fecha_fin = datetime.now(timezone.utc)
+        notificacion = Notificacion(
+            usuario_id=trabajo.solicitante_id,
+            empresa_id=trabajo.empresa_id,
+            titulo=titulo,
+            mensaje=mensaje,
+            tipo="informe",
+            origen="sistema",
+            archivo=nombre if trabajo.estado == "completado" else None,
+            fecha_envio=datetime.utcnow(),
+        )
+        db.add(notificacion)
+        await db.flush()
+        await publicar_async(
+            db, "notificacion", datos_notificacion(notificacion),
+            audiencia="usuario", usuario_id=notificacion.usuario_id,
+        )
+        await db.commit()
+
+
+async def _worker():
+    while True:
+        try:
+            trabajo_id = await reclamar()
+            if trabajo_id is not None:
+                await procesar(trabajo_id)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Error en la cola de informes: {e}")
+
+        try:
+            await asyncio.wait_for(_aviso.wait(), INFORMES_POLL_SEGUNDOS)
+        except asyncio.TimeoutError:
+            pass
+        _aviso.clear()
+
+
+def iniciar_workers():
+    """Arranca INFORMES_WORKERS tareas (0 = esta instancia no procesa informes)."""
+    global _aviso
+    _aviso = asyncio.Event()
+    for _ in range(INFORMES_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def detener_workers():
+    for tarea in _workers:
+        tarea.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -1,17 +1,81 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool
+from app.db_metrics import QueuePoolMedido, AsyncQueuePoolMedido
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:password123@db_registro:5432/registro_horario")
 
-engine = create_engine(DATABASE_URL)
+
+def _url_async(url: str) -> str:
+    """Convierte la URL síncrona (psycopg2) en su equivalente asyncpg."""
+    for prefijo in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefijo):
+            return "postgresql+asyncpg://" + url[len(prefijo):]
+    return url
+
+
+def _env_bool(nombre: str, defecto: bool) -> bool:
+    return os.getenv(nombre, str(defecto)).strip().lower() in ("1", "true", "yes", "si", "sí")
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _url_async(DATABASE_URL))
+
+# Pool de conexiones (valores por defecto = los de SQLAlchemy + pre-ping/recycle).
+# Cada engine (sync y async) tiene su propio pool de este tamaño.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Detrás de PgBouncer (transaction pooling) el pool lo gestiona PgBouncer:
+# sin pool local y sin caché de sentencias preparadas en asyncpg.
+DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+
+
+def _opciones_pool(pool_class) -> dict:
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, **_opciones_pool(QueuePoolMedido))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=(
+        {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        if DB_PGBOUNCER else {}
+    ),
+    **_opciones_pool(AsyncQueuePoolMedido),
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 def get_db():
     db: Session = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
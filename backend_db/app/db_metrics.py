@@ -0,0 +1,103 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Acumulador de la petición en curso. Se guarda un dict mutable para que lo
+# compartan el threadpool (rutas síncronas) y los greenlets de asyncpg, que
+# trabajan sobre copias del contexto.
+_peticion_actual: ContextVar[dict | None] = ContextVar("peticion_db_pool", default=None)
+
+
+class MetricasPool:
+    """Contadores de espera para obtener conexión del pool, por proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.peticiones = 0
+        self.peticiones_con_espera = 0
+        self.espera_peticion_max = 0.0
+
+    def registrar_checkout(self, segundos: float, timeout: bool = False):
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+
+        acumulado = _peticion_actual.get()
+        if acumulado is not None:
+            acumulado["espera"] += segundos
+            acumulado["checkouts"] += 1
+
+    def registrar_peticion(self, acumulado: dict):
+        with self._lock:
+            self.peticiones += 1
+            if acumulado["checkouts"] and acumulado["espera"] >= 0.001:
+                self.peticiones_con_espera += 1
+            self.espera_peticion_max = max(self.espera_peticion_max, acumulado["espera"])
+
+    def stats(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "espera_media_ms": round(self.espera_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "espera_max_ms": round(self.espera_max * 1000, 3),
+            "peticiones": self.peticiones,
+            "peticiones_con_espera": self.peticiones_con_espera,
+            "espera_peticion_max_ms": round(self.espera_peticion_max * 1000, 3),
+        }
+
+
+metricas_pool = MetricasPool()
+
+
+def iniciar_peticion() -> dict:
+    acumulado = {"espera": 0.0, "checkouts": 0}
+    _peticion_actual.set(acumulado)
+    return acumulado
+
+
+class _PoolMedido:
+    """Mixin que mide cuánto se espera en `_do_get` (checkout del pool)."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except Exception:
+            metricas_pool.registrar_checkout(time.perf_counter() - inicio, timeout=True)
+            raise
+        metricas_pool.registrar_checkout(time.perf_counter() - inicio)
+        return conexion
+
+
+class QueuePoolMedido(_PoolMedido, QueuePool):
+    pass
+
+
+class AsyncQueuePoolMedido(_PoolMedido, AsyncAdaptedQueuePool):
+    pass
+
+
+def estado_pool(pool) -> dict:
+    """Foto del pool; NullPool (modo PgBouncer) no mantiene conexiones."""
+    if not isinstance(pool, QueuePool):
+        return {"tipo": type(pool).__name__}
+
+    return {
+        "tipo": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    }
@@ -0,0 +1,225 @@
+"""
+Eventos en tiempo real (notificaciones y fichajes) para los clientes
+conectados a GET /eventos/stream.
+
+- Publicar: `publicar` / `publicar_async` ejecutan pg_notify dentro de la
+  transacción que hace la escritura, así que el evento solo sale si el commit
+  se confirma, y en el orden de los commits.
+- Recibir: cada proceso de la API mantiene una conexión asyncpg dedicada
+  (fuera del pool) con LISTEN en CANAL y reparte cada evento entre sus
+  suscriptores locales. Todas las réplicas reciben todos los NOTIFY, sin
+  sondeos. Con PgBouncer en modo transacción LISTEN no funciona: hay que
+  apuntar EVENTOS_DATABASE_URL directamente a Postgres.
+- Audiencia de cada evento:
+    usuario           solo usuario_id
+    empleados         los empleados de empresa_id (difusiones)
+    usuario_y_admins  usuario_id y los admins de empresa_id (fichajes)
+
+Si un cliente no da abasto (cola llena) o se pierde la conexión de LISTEN,
+se le envía `resincronizar` para que recargue con /notificaciones/me?since=...
+"""
+import asyncio
+import json
+import os
+
+import asyncpg
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import make_url
+
+from app.database import ASYNC_DATABASE_URL
+
+CANAL = "registro_eventos"
+EVENTOS_DATABASE_URL = os.getenv("EVENTOS_DATABASE_URL", ASYNC_DATABASE_URL)
+EVENTOS_COLA_MAX = int(os.getenv("EVENTOS_COLA_MAX", "100"))
+EVENTOS_PING_SEGUNDOS = float(os.getenv("EVENTOS_PING_SEGUNDOS", "30"))
+
+# NOTIFY admite hasta 8000 bytes de payload.
+_MAX_PAYLOAD = 7900
+
+
+class Suscripcion:
+    __slots__ = ("usuario_id", "empresa_id", "rol", "cola")
+
+    def __init__(self, usuario_id, empresa_id, rol):
+        self.usuario_id = str(usuario_id)
+        self.empresa_id = str(empresa_id) if empresa_id else None
+        self.rol = rol
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=EVENTOS_COLA_MAX)
+
+    def entregar(self, evento: dict):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Se descarta lo pendiente y se pide al cliente que recargue.
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait({"tipo": "resincronizar", "datos": {}})
+
+
+_por_usuario: dict[str, set[Suscripcion]] = {}
+_por_empresa: dict[str, set[Suscripcion]] = {}
+_observadores = []
+_escucha: asyncio.Task | None = None
+
+
+def observar(funcion):
+    """
+    Registra una función que recibe cada evento que llega a este proceso
+    (con audiencia, usuario_id y empresa_id), y {"tipo": "resincronizar"}
+    si se han podido perder. Sirve para mantener cachés locales al día.
+    """
+    _observadores.append(funcion)
+
+
+def _observar(evento: dict):
+    for funcion in _observadores:
+        try:
+            funcion(evento)
+        except Exception as e:
+            print(f"⚠️  Error procesando evento {evento.get('tipo')}: {e}")
+
+
+def suscribir(usuario_id, empresa_id, rol) -> Suscripcion:
+    suscripcion = Suscripcion(usuario_id, empresa_id, rol)
+    _por_usuario.setdefault(suscripcion.usuario_id, set()).add(suscripcion)
+    if suscripcion.empresa_id:
+        _por_empresa.setdefault(suscripcion.empresa_id, set()).add(suscripcion)
+    return suscripcion
+
+
+def desuscribir(suscripcion: Suscripcion):
+    for indice, clave in ((_por_usuario, suscripcion.usuario_id), (_por_empresa, suscripcion.empresa_id)):
+        grupo = indice.get(clave)
+        if grupo is not None:
+            grupo.discard(suscripcion)
+            if not grupo:
+                del indice[clave]
+
+
+def _destinatarios(evento: dict):
+    audiencia = evento.get("audiencia")
+    usuario_id, empresa_id = evento.get("usuario_id"), evento.get("empresa_id")
+
+    if audiencia in ("usuario", "usuario_y_admins") and usuario_id:
+        yield from _por_usuario.get(usuario_id, ())
+    if audiencia == "empleados" and empresa_id:
+        yield from (s for s in _por_empresa.get(empresa_id, ()) if s.rol == "empleado")
+    if audiencia == "usuario_y_admins" and empresa_id:
+        yield from (
+            s for s in _por_empresa.get(empresa_id, ())
+            if s.rol == "admin" and s.usuario_id != usuario_id
+        )
+
+
+def repartir(evento: dict):
+    _observar(evento)
+    mensaje = {"tipo": evento["tipo"], "datos": evento.get("datos", {})}
+    for suscripcion in list(_destinatarios(evento)):
+        suscripcion.entregar(mensaje)
+
+
+def _resincronizar_todos():
+    _observar({"tipo": "resincronizar"})
+    for grupo in list(_por_usuario.values()):
+        for suscripcion in list(grupo):
+            suscripcion.entregar({"tipo": "resincronizar", "datos": {}})
+
+
+def _payload(tipo: str, datos: dict, audiencia: str, usuario_id=None, empresa_id=None) -> str:
+    evento = {
+        "tipo": tipo,
+        "audiencia": audiencia,
+        "usuario_id": str(usuario_id) if usuario_id else None,
+        "empresa_id": str(empresa_id) if empresa_id else None,
+        "datos": datos,
+    }
+    payload = json.dumps(evento, default=str)
+    if len(payload.encode()) > _MAX_PAYLOAD and "mensaje" in datos:
+        # El cliente recupera el texto completo con /notificaciones/me.
+        evento["datos"] = {**datos, "mensaje": None, "incompleto": True}
+        payload = json.dumps(evento, default=str)
+    return payload
+
+
+def _sentencia(*args, **kwargs):
+    return select(func.pg_notify(CANAL, _payload(*args, **kwargs)))
+
+
+def publicar(db, tipo: str, datos: dict, audiencia: str, usuario_id=None, empresa_id=None):
+    """Encola el evento en la transacción de `db` (Session); sale al hacer commit."""
+    db.execute(_sentencia(tipo, datos, audiencia, usuario_id, empresa_id))
+
+
+async def publicar_async(db, tipo: str, datos: dict, audiencia: str, usuario_id=None, empresa_id=None):
+    """Como publicar, para AsyncSession."""
+    await db.execute(_sentencia(tipo, datos, audiencia, usuario_id, empresa_id))
+
+
+async def publicar_varios_async(db, eventos: list[dict]):
+    """Varios eventos (argumentos de publicar por nombre) con una sola sentencia, en orden."""
+    if not eventos:
+        return
+    await db.execute(
+        text(f"SELECT pg_notify('{CANAL}', p) FROM unnest(CAST(:payloads AS text[])) WITH ORDINALITY AS t(p, n) ORDER BY n"),
+        {"payloads": [_payload(**e) for e in eventos]},
+    )
+
+
+def _recibir(conexion, pid, canal, payload):
+    try:
+        repartir(json.loads(payload))
+    except (ValueError, KeyError) as e:
+        print(f"⚠️  Evento inválido en {canal}: {e}")
+
+
+def _dsn() -> str:
+    return make_url(EVENTOS_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+async def _escuchar():
+    espera = 1
+    while True:
+        conexion = None
+        try:
+            conexion = await asyncpg.connect(_dsn())
+            await conexion.add_listener(CANAL, _recibir)
+            cerrada = asyncio.Event()
+            conexion.add_termination_listener(lambda _: cerrada.set())
+            espera = 1
+            # Si el servidor cierra la conexión se sabe al momento; el ping
+            # periódico detecta además las que se caen sin aviso (red).
+            while True:
+                try:
+                    await asyncio.wait_for(cerrada.wait(), EVENTOS_PING_SEGUNDOS)
+                    raise ConnectionError("conexión cerrada por el servidor")
+                except asyncio.TimeoutError:
+                    await asyncio.wait_for(conexion.fetchval("SELECT 1"), EVENTOS_PING_SEGUNDOS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Conexión de eventos perdida: {e}")
+            # Lo que se notificó mientras tanto no ha llegado a nadie.
+            _resincronizar_todos()
+        finally:
+            if conexion is not None:
+                try:
+                    await asyncio.shield(conexion.close(timeout=5))
+                except Exception:
+                    conexion.terminate()
+
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 30)
+
+
+def iniciar_escucha():
+    global _escucha
+    if _escucha is None:
+        _escucha = asyncio.create_task(_escuchar())
+
+
+async def detener_escucha():
+    global _escucha
+    if _escucha is not None:
+        _escucha.cancel()
+        await asyncio.gather(_escucha, return_exceptions=True)
+        _escucha = None
@@ -0,0 +1,156 @@
+"""
+Exportación masiva de fichajes de una empresa.
+
+Se habla directamente con asyncpg (sin ORM ni filas de SQLAlchemy):
+
+- CSV: `COPY (...) TO STDOUT` y los trozos que devuelve Postgres se pasan
+  tal cual a la respuesta HTTP.
+- Parquet / Arrow: cursor de servidor leído por lotes; cada lote se convierte
+  en un RecordBatch y se envía en cuanto se ha escrito.
+
+Cada exportación usa su propia conexión del pool async porque el cuerpo de
+la respuesta se genera después de que FastAPI haya cerrado las dependencias.
+"""
+import asyncio
+import io
+
+from app.database import async_engine
+
+EXPORT_LOTE_FILAS = 50_000
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+# Ordenado por fecha_hora para que Postgres lea el índice (empresa_id, fecha_hora)
+# en orden y no tenga que ordenar todo el rango antes de enviar la primera fila.
+_CONSULTA = """
+    SELECT f.id::text AS fichaje_id,
+           f.usuario_id::text AS usuario_id,
+           u.email,
+           u.nombre,
+           u.apellidos,
+           f.tipo,
+           f.fecha_hora
+    FROM fichajes f
+    JOIN usuarios u ON u.id = f.usuario_id
+    WHERE f.empresa_id = $1::uuid
+      AND f.fecha_hora >= $2::timestamptz
+      AND f.fecha_hora < $3::timestamptz
+    ORDER BY f.fecha_hora
+"""
+
+_FIN = object()
+
+
+async def _conexion_asyncpg(conn):
+    """Conexión asyncpg subyacente a una AsyncConnection de SQLAlchemy."""
+    return (await conn.get_raw_connection()).driver_connection
+
+
+async def exportar_csv(empresa_id, inicio, fin):
+    """Genera el CSV con COPY TO STDOUT, trozo a trozo según llega de Postgres."""
+    cola: asyncio.Queue = asyncio.Queue(maxsize=32)
+
+    async def copiar():
+        try:
+            async with async_engine.connect() as conn:
+                raw = await _conexion_asyncpg(conn)
+                await raw.copy_from_query(
+                    _CONSULTA, empresa_id, inicio, fin,
+                    output=cola.put, format="csv", header=True,
+                )
+        except Exception as e:
+            await cola.put(e)
+        finally:
+            await cola.put(_FIN)
+
+    tarea = asyncio.create_task(copiar())
+    try:
+        while True:
+            trozo = await cola.get()
+            if trozo is _FIN:
+                break
+            if isinstance(trozo, Exception):
+                raise trozo
+            yield bytes(trozo)
+    finally:
+        # Si el cliente se desconecta, se corta el COPY y la conexión vuelve al pool.
+        if not tarea.done():
+            tarea.cancel()
+            try:
+                await tarea
+            except BaseException:
+                pass
+
+
+class _Sumidero(io.RawIOBase):
+    """
+    Fichero de solo escritura que acumula lo escrito hasta que se vacía.
+    `tell()` devuelve la posición absoluta, que Parquet necesita para los
+    offsets del pie aunque los bytes anteriores ya se hayan enviado.
+    """
+
+    def __init__(self):
+        self._trozos = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._trozos.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+async def exportar_columnar(empresa_id, inicio, fin, formato: str):
+    """Genera Parquet (un row group por lote) o un stream IPC de Arrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("fichaje_id", pa.string()),
+        ("usuario_id", pa.string()),
+        ("email", pa.string()),
+        ("nombre", pa.string()),
+        ("apellidos", pa.string()),
+        ("tipo", pa.string()),
+        ("fecha_hora", pa.timestamp("us", tz="UTC")),
+    ])
+
+    sumidero = _Sumidero()
+    if formato == "parquet":
+        escritor = pq.ParquetWriter(sumidero, esquema, compression="zstd")
+    else:
+        escritor = pa.ipc.new_stream(sumidero, esquema)
+
+    async with async_engine.connect() as conn:
+        raw = await _conexion_asyncpg(conn)
+        async with raw.transaction(readonly=True):
+            cursor = await raw.cursor(_CONSULTA, empresa_id, inicio, fin)
+            while True:
+                filas = await cursor.fetch(EXPORT_LOTE_FILAS)
+                if not filas:
+                    break
+                columnas = list(zip(*filas))
+                lote = pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)],
+                    schema=esquema,
+                )
+                escritor.write_batch(lote)
+                yield sumidero.vaciar()
+
+    escritor.close()
+    yield sumidero.vaciar()
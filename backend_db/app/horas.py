@@ -0,0 +1,148 @@
+"""
+Cálculo vectorizado de horas trabajadas y de pausa por usuario y día.
+
+Reproduce con NumPy la semántica de `EstadoJornada` (app/jornadas.py) sobre
+datos en columnas, para calcular empresas enteras sin recorrer fila a fila:
+
+- Cada `entrada` abre una sesión; los eventos anteriores a la primera
+  entrada del día se ignoran.
+- Dentro de una sesión, los eventos posteriores a su primera `salida` se
+  ignoran.
+- Las pausas se emparejan colapsando repeticiones consecutivas
+  (inicio, inicio, fin → inicio, fin); un `fin_pausa` sin pausa abierta
+  se ignora.
+- Una sesión termina en su `salida` (que cierra también la pausa abierta),
+  en la siguiente `entrada` del día o, si no hay ninguna, en el último
+  evento del día. Solo restan las pausas cerradas.
+"""
+import numpy as np
+import pandas as pd
+
+NS = 1_000_000_000
+
+
+def _a_utc_naive(fecha_hora) -> np.ndarray:
+    serie = pd.Series(pd.to_datetime(fecha_hora))
+    if serie.dt.tz is not None:
+        serie = serie.dt.tz_convert("UTC").dt.tz_localize(None)
+    return serie.to_numpy(dtype="datetime64[ns]")
+
+
+def calcular_horas(usuario_id, tipo, fecha_hora) -> pd.DataFrame:
+    """
+    Recibe tres columnas de igual longitud (usuario_id, tipo, fecha_hora) y
+    devuelve un DataFrame con una fila por (usuario_id, fecha):
+    `segundos_trabajados` y `segundos_pausa`. Las horas sin zona se toman
+    como UTC, igual que en jornadas_diarias.
+    """
+    columnas = ["usuario_id", "fecha", "segundos_trabajados", "segundos_pausa"]
+    tipo = np.asarray(tipo, dtype=object)
+    n = len(tipo)
+    if n == 0:
+        return pd.DataFrame(columns=columnas)
+
+    codigos, usuarios = pd.factorize(np.asarray(usuario_id, dtype=object))
+    instantes = _a_utc_naive(fecha_hora)
+    t_ns = instantes.astype(np.int64)
+
+    # Orden estable por (usuario, instante): empates en el orden de entrada
+    orden = np.lexsort((t_ns, codigos))
+    codigos = codigos[orden]
+    tipo = tipo[orden]
+    t_ns = t_ns[orden]
+    dia = instantes[orden].astype("datetime64[D]")
+
+    es_entrada = tipo == "entrada"
+    es_salida = tipo == "salida"
+    es_ini = tipo == "inicio_pausa"
+    es_fin = tipo == "fin_pausa"
+
+    # Grupos (usuario, día)
+    nuevo_grupo = np.ones(n, dtype=bool)
+    nuevo_grupo[1:] = (codigos[1:] != codigos[:-1]) | (dia[1:] != dia[:-1])
+    grupo = np.cumsum(nuevo_grupo) - 1
+    inicios_grupo = np.flatnonzero(nuevo_grupo)
+    n_grupos = len(inicios_grupo)
+    ultimo_de_grupo = np.r_[inicios_grupo[1:] - 1, n - 1]
+
+    # Sesiones: empiezan en cada entrada (y al inicio de cada grupo, sin validez
+    # si esa primera fila no es una entrada)
+    nueva_sesion = es_entrada | nuevo_grupo
+    sesion = np.cumsum(nueva_sesion) - 1
+    inicios_sesion = np.flatnonzero(nueva_sesion)
+    n_sesiones = len(inicios_sesion)
+    sesion_valida = es_entrada[inicios_sesion]
+    grupo_sesion = grupo[inicios_sesion]
+
+    # Filas "vivas": de una sesión válida y sin salida previa dentro de ella
+    salidas_previas = np.cumsum(es_salida) - es_salida
+    salidas_previas = salidas_previas - salidas_previas[inicios_sesion][sesion]
+    viva = sesion_valida[sesion] & (salidas_previas == 0)
+
+    # Pausas: colapsar repeticiones consecutivas dentro de la sesión
+    idx_pausa = np.flatnonzero(viva & (es_ini | es_fin))
+    ini_pausa = es_ini[idx_pausa]
+    sesion_pausa = sesion[idx_pausa]
+    misma_sesion_prev = np.zeros(len(idx_pausa), dtype=bool)
+    misma_sesion_prev[1:] = sesion_pausa[1:] == sesion_pausa[:-1]
+    prev_es_ini = np.zeros(len(idx_pausa), dtype=bool)
+    prev_es_ini[1:] = ini_pausa[:-1]
+    prev_es_ini &= misma_sesion_prev
+    conservada = ini_pausa != prev_es_ini
+
+    pausas = idx_pausa[conservada]
+    pausas_ini = es_ini[pausas]
+    pausas_sesion = sesion[pausas]
+
+    # Pausas cerradas: cada fin conservado con el inicio conservado anterior
+    pos_fin = np.flatnonzero(~pausas_ini)
+    duracion = t_ns[pausas[pos_fin]] - t_ns[pausas[pos_fin - 1]]
+    pausa_cerrada = np.bincount(
+        pausas_sesion[pos_fin], weights=duracion.astype(np.float64), minlength=n_sesiones
+    )
+
+    # Pausa abierta: la última pausa conservada de la sesión es un inicio
+    pausa_abierta = np.zeros(n_sesiones, dtype=bool)
+    inicio_pausa_abierta = np.zeros(n_sesiones, dtype=np.int64)
+    if len(pausas):
+        es_ultima = np.r_[pausas_sesion[1:] != pausas_sesion[:-1], True]
+        ultimas = pausas[es_ultima]
+        abiertas = ultimas[es_ini[ultimas]]
+        pausa_abierta[sesion[abiertas]] = True
+        inicio_pausa_abierta[sesion[abiertas]] = t_ns[abiertas]
+
+    # Cierre de cada sesión
+    con_salida = np.zeros(n_sesiones, dtype=bool)
+    t_salida = np.zeros(n_sesiones, dtype=np.int64)
+    salidas = np.flatnonzero(viva & es_salida)
+    con_salida[sesion[salidas]] = True
+    t_salida[sesion[salidas]] = t_ns[salidas]
+
+    hay_siguiente = np.zeros(n_sesiones, dtype=bool)
+    hay_siguiente[:-1] = grupo_sesion[1:] == grupo_sesion[:-1]
+    t_siguiente = np.zeros(n_sesiones, dtype=np.int64)
+    t_siguiente[:-1] = t_ns[inicios_sesion[1:]]
+
+    t_fin = np.where(
+        con_salida,
+        t_salida,
+        np.where(hay_siguiente, t_siguiente, t_ns[ultimo_de_grupo[grupo_sesion]]),
+    )
+
+    pausa_sesion = pausa_cerrada + np.where(
+        con_salida & pausa_abierta, (t_salida - inicio_pausa_abierta).astype(np.float64), 0.0
+    )
+    trabajado_sesion = (t_fin - t_ns[inicios_sesion]).astype(np.float64) - pausa_sesion
+
+    trabajado_sesion = np.where(sesion_valida, trabajado_sesion, 0.0)
+    pausa_sesion = np.where(sesion_valida, pausa_sesion, 0.0)
+
+    trabajado = np.bincount(grupo_sesion, weights=trabajado_sesion, minlength=n_grupos)
+    pausa = np.bincount(grupo_sesion, weights=pausa_sesion, minlength=n_grupos)
+
+    return pd.DataFrame({
+        "usuario_id": usuarios[codigos[inicios_grupo]],
+        "fecha": pd.to_datetime(dia[inicios_grupo]).date,
+        "segundos_trabajados": trabajado / NS,
+        "segundos_pausa": pausa / NS,
+    }, columns=columnas)
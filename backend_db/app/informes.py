@@ -0,0 +1,193 @@
+"""
+Generación de informes de fichajes (PDF, XLSX y CSV).
+
+Las funciones de render son puras: reciben las filas `(tipo, fecha_hora)` ya
+leídas de la BD y devuelven los bytes del documento. Así se pueden ejecutar
+en un pool de procesos (`renderizar` / `renderizar_async`) y el trabajo de
+ReportLab/openpyxl, que es CPU puro, no compite por el GIL con la API.
+
+Este módulo lo importan también los procesos hijos del pool: no debe
+importar nada que abra conexiones (app.database, modelos...).
+"""
+import csv
+import multiprocessing
+import os
+from asyncio import get_running_loop
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from io import BytesIO, StringIO
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.pdfgen import canvas
+
+INFORMES_PROCESOS = int(os.getenv("INFORMES_PROCESOS", str(min(os.cpu_count() or 2, 4))))
+
+TIPOS_INFORME = ("semanal", "mensual")
+
+FORMATOS_INFORME = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+
+def rango_periodo(tipo: str, periodo: str) -> tuple[datetime, datetime]:
+    """[inicio, fin) de una semana (YYYY-MM-DD) o un mes (YYYY-MM). ValueError si no es válido."""
+    if tipo == "semanal":
+        inicio = datetime.strptime(periodo, "%Y-%m-%d")
+        return inicio, inicio + timedelta(days=7)
+    if tipo == "mensual":
+        inicio = datetime.strptime(periodo, "%Y-%m")
+        return inicio, (inicio + timedelta(days=32)).replace(day=1)
+    raise ValueError(f"Tipo de informe inválido: {tipo}")
+
+
+def nombre_informe(tipo: str, periodo: str, formato: str) -> str:
+    """Mismos nombres que los endpoints síncronos de /documentos."""
+    if tipo == "semanal":
+        return f"informe_{periodo}.{formato}"
+    return f"informe_mensual_{periodo}.{formato}"
+
+
+def titulo_informe(tipo: str, periodo: str) -> str:
+    return f"Informe {tipo} de fichajes - {periodo}"
+
+
+def pdf_por_dias(titulo: str, filas) -> bytes:
+    """Informe agrupado por día (descargas semanales/mensuales en PDF)."""
+    fichajes_por_dia = defaultdict(list)
+    for tipo, fecha_hora in filas:
+        fichajes_por_dia[fecha_hora.date()].append((tipo, fecha_hora))
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 60
+
+    pdf.setFont("Helvetica-Bold", 18)
+    pdf.drawString(50, y, titulo)
+    y -= 40
+
+    pdf.setFont("Helvetica", 12)
+
+    for dia, items in fichajes_por_dia.items():
+
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(40, y, dia.strftime("%A %d/%m/%Y"))
+        y -= 20
+
+        pdf.setStrokeColor(colors.grey)
+        pdf.line(40, y, width - 40, y)
+        y -= 20
+
+        pdf.setFont("Helvetica", 12)
+
+        for tipo, fecha_hora in items:
+            txt = f"- {tipo.capitalize()} a las {fecha_hora.strftime('%H:%M:%S')}"
+            pdf.drawString(60, y, txt)
+            y -= 18
+
+            if y < 60:
+                pdf.showPage()
+                pdf.setFont("Helvetica", 12)
+                y = height - 60
+
+        y -= 15
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def pdf_listado(titulo: str, subtitulo: str, filas) -> bytes:
+    """Listado plano de fichajes (reporte mensual de /fichajes)."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+
+    c.drawString(50, 760, titulo)
+    c.drawString(50, 740, subtitulo)
+
+    y = 700
+    for tipo, fecha_hora in filas:
+        c.drawString(
+            50, y,
+            f"{fecha_hora.date()} {fecha_hora.time()} - {tipo}"
+        )
+        y -= 16
+        if y < 50:
+            c.showPage()
+            y = 750
+
+    c.save()
+    return buffer.getvalue()
+
+
+def xlsx(filas) -> bytes:
+    df = pd.DataFrame(
+        [
+            {
+                "Fecha": fecha_hora.date().isoformat(),
+                "Hora": fecha_hora.time().isoformat(),
+                "Tipo": tipo,
+            }
+            for tipo, fecha_hora in filas
+        ],
+        columns=["Fecha", "Hora", "Tipo"],
+    )
+
+    output = BytesIO()
+    df.to_excel(output, index=False)
+    return output.getvalue()
+
+
+def csv_fichajes(filas) -> bytes:
+    texto = StringIO()
+    escritor = csv.writer(texto, lineterminator="\n")
+    escritor.writerow(["Fecha", "Tipo", "Hora"])
+    for tipo, fecha_hora in filas:
+        escritor.writerow([fecha_hora.date(), tipo, fecha_hora.time()])
+    return texto.getvalue().encode()
+
+
+def generar(formato: str, titulo: str, filas) -> bytes:
+    """Punto de entrada de la cola de informes."""
+    if formato == "pdf":
+        return pdf_por_dias(titulo, filas)
+    if formato == "xlsx":
+        return xlsx(filas)
+    if formato == "csv":
+        return csv_fichajes(filas)
+    raise ValueError(f"Formato de informe inválido: {formato}")
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def pool_procesos() -> ProcessPoolExecutor:
+    """Pool compartido, creado al primer uso. `spawn` para no heredar conexiones ni hilos."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=INFORMES_PROCESOS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def renderizar(funcion, *args) -> bytes:
+    """Ejecuta el render en el pool y espera (para endpoints síncronos, desde el threadpool)."""
+    return pool_procesos().submit(funcion, *args).result()
+
+
+async def renderizar_async(funcion, *args) -> bytes:
+    return await get_running_loop().run_in_executor(pool_procesos(), partial(funcion, *args))
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
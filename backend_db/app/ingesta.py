@@ -0,0 +1,360 @@
+"""
+Alta de fichajes en lote (POST /fichajes/lote): terminales y apps que han
+estado sin conexión y envían de golpe lo que registraron.
+
+Cada evento trae la hora del cliente y una clave de idempotencia. Todo el
+lote se resuelve en una transacción:
+
+1. Bloqueo por usuario (advisory lock de transacción) para que dos lotes
+   del mismo usuario no se validen a la vez contra el mismo estado.
+2. Claves ya vistas (fichajes_idempotencia, o repetidas dentro del lote):
+   `duplicado`, con el fichaje que se creó la primera vez.
+3. Validación con la máquina entrada/pausa/salida, mezclando en orden de
+   hora los fichajes que ya había ese día con los del lote. Cada evento se
+   valida contra el que le precede; los rechazados no cambian el estado.
+4. Un único INSERT de varias filas para los fichajes y otro para sus claves;
+   después jornadas, estado_actual y evento `fichaje`, como al fichar.
+
+Las claves caducadas se borran al arrancar la API y con
+
+    python -m app.ingesta purgar-claves
+"""
+import argparse
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import and_, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.eventos import publicar_varios_async
+from app.jornadas import a_utc, actualizar_jornadas
+from app.models.fichaje import Fichaje
+from app.models.fichaje_idempotencia import FichajeIdempotencia
+from app.presencia import actualizar_estado_actual
+
+TIPOS = ("entrada", "salida", "inicio_pausa", "fin_pausa")
+
+# Estado previo (último fichaje del día, None si no hay) desde el que se
+# admite cada tipo.
+TRANSICIONES = {
+    "entrada": {None, "salida"},
+    "inicio_pausa": {"entrada", "fin_pausa"},
+    "fin_pausa": {"inicio_pausa"},
+    "salida": {"entrada", "inicio_pausa", "fin_pausa"},
+}
+
+# Desfase de reloj admitido a los clientes y antigüedad máxima de un evento.
+FICHAJE_MARGEN_FUTURO_SEGUNDOS = int(os.getenv("FICHAJE_MARGEN_FUTURO_SEGUNDOS", "300"))
+FICHAJE_LOTE_MAX_DIAS = int(os.getenv("FICHAJE_LOTE_MAX_DIAS", "31"))
+# Un segundo fichaje del mismo tipo dentro de esta ventana se considera un
+# reintento del cliente (POST /fichajes/{tipo} sin clave de idempotencia).
+FICHAJE_DEDUP_SEGUNDOS = int(os.getenv("FICHAJE_DEDUP_SEGUNDOS", "10"))
+# Una clave guardada hoy solo puede volver con un evento de hasta
+# FICHAJE_LOTE_MAX_DIAS atrás; pasado eso (más este margen) ya no sirve.
+FICHAJE_CLAVES_MARGEN_DIAS = int(os.getenv("FICHAJE_CLAVES_MARGEN_DIAS", "7"))
+
+
+async def bloquear_usuarios(db, usuario_ids):
+    """
+    Serializa, hasta el fin de la transacción, las altas de fichajes de estos
+    usuarios. Una sola sentencia; los bloqueos se toman en orden para no
+    interbloquear con otro lote (Postgres evalúa la función tras ordenar).
+    """
+    await db.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(hashtext(k)) "
+            "FROM unnest(CAST(:claves AS text[])) AS k ORDER BY hashtext(k)"
+        ),
+        {"claves": sorted({f"fichajes:{u}" for u in usuario_ids})},
+    )
+
+
+async def _claves_existentes(db, pares) -> dict:
+    if not pares:
+        return {}
+    filas = await db.execute(
+        select(FichajeIdempotencia.usuario_id, FichajeIdempotencia.clave, FichajeIdempotencia.fichaje_id)
+        .where(tuple_(FichajeIdempotencia.usuario_id, FichajeIdempotencia.clave).in_(list(pares)))
+    )
+    return {(str(f.usuario_id), f.clave): f.fichaje_id for f in filas}
+
+
+async def _fichajes_previos(db, desde_por_usuario: dict) -> dict:
+    """Fichajes de cada usuario desde el inicio del día de su evento más antiguo del lote."""
+    filas = await db.execute(
+        select(Fichaje.usuario_id, Fichaje.tipo, Fichaje.fecha_hora)
+        .where(or_(*(
+            and_(Fichaje.usuario_id == usuario_id, Fichaje.fecha_hora >= datetime(desde.year, desde.month, desde.day, tzinfo=timezone.utc))
+            for usuario_id, desde in desde_por_usuario.items()
+        )))
+    )
+    previos = defaultdict(list)
+    for f in filas:
+        previos[str(f.usuario_id)].append((f.tipo, a_utc(f.fecha_hora)))
+    return previos
+
+
+async def fichaje_repetido(db, usuario_id, tipo: str, clave: str | None, ahora: datetime):
+    """
+    Para un fichaje suelto, con bloquear_usuarios ya tomado: el fichaje
+    creado antes con la misma clave o, sin clave, el último del usuario si es
+    del mismo tipo y de hace menos de FICHAJE_DEDUP_SEGUNDOS. None si es nuevo.
+    """
+    if clave is not None:
+        previo = (
+            await db.execute(
+                select(FichajeIdempotencia.fichaje_id, FichajeIdempotencia.fecha_hora)
+                .where(FichajeIdempotencia.usuario_id == usuario_id, FichajeIdempotencia.clave == clave)
+            )
+        ).first()
+        if previo is None:
+            return None
+        # Con fecha_hora la búsqueda va a una sola partición.
+        return (
+            await db.execute(
+                select(Fichaje).where(Fichaje.id == previo.fichaje_id, Fichaje.fecha_hora == previo.fecha_hora)
+            )
+        ).scalar_one_or_none()
+
+    if FICHAJE_DEDUP_SEGUNDOS <= 0:
+        return None
+    ultimo = (
+        await db.execute(
+            select(Fichaje)
+            .where(
+                Fichaje.usuario_id == usuario_id,
+                Fichaje.fecha_hora >= ahora - timedelta(seconds=FICHAJE_DEDUP_SEGUNDOS),
+            )
+            .order_by(Fichaje.fecha_hora.desc())
+            .limit(1)
+        )
+    ).scalar_one_or_none()
+    return ultimo if ultimo is not None and ultimo.tipo == tipo else None
+
+
+async def guardar_clave(db, fichaje, clave: str):
+    await db.execute(pg_insert(FichajeIdempotencia).values(
+        usuario_id=fichaje.usuario_id, clave=clave, fichaje_id=fichaje.id, fecha_hora=fichaje.fecha_hora,
+    ).on_conflict_do_nothing())
+
+
+def purgar_claves(conn, lote: int = 10000) -> int:
+    """
+    Borra de fichajes_idempotencia las claves con más de
+    FICHAJE_LOTE_MAX_DIAS + FICHAJE_CLAVES_MARGEN_DIAS días, en lotes de
+    `lote` filas (una transacción por lote). Devuelve cuántas borró.
+    """
+    total = 0
+    while True:
+        borradas = conn.execute(
+            text("""
+                DELETE FROM fichajes_idempotencia
+                WHERE (usuario_id, clave) IN (
+                    SELECT usuario_id, clave
+                    FROM fichajes_idempotencia
+                    WHERE fecha_creacion < now() - make_interval(days => :dias)
+                    LIMIT :lote
+                )
+            """),
+            {"dias": FICHAJE_LOTE_MAX_DIAS + FICHAJE_CLAVES_MARGEN_DIAS, "lote": lote},
+        ).rowcount
+        conn.commit()
+        total += borradas
+        if borradas < lote:
+            return total
+
+
+def _validar(previos: list, candidatos: list) -> dict:
+    """
+    Recorre en orden de hora los fichajes existentes y los candidatos
+    (indice, tipo, fecha_hora) de un usuario. Devuelve {indice: motivo} de
+    los rechazados.
+    """
+    linea = [(fecha_hora, 0, None, tipo) for tipo, fecha_hora in previos]
+    linea += [(fecha_hora, 1, indice, tipo) for indice, tipo, fecha_hora in candidatos]
+    linea.sort(key=lambda e: (e[0], e[1], e[2] if e[2] is not None else -1))
+
+    rechazados = {}
+    anterior, dia = None, None
+    for fecha_hora, nuevo, indice, tipo in linea:
+        if fecha_hora.date() != dia:
+            anterior, dia = None, fecha_hora.date()
+        if nuevo and anterior not in TRANSICIONES[tipo]:
+            rechazados[indice] = (
+                f"'{tipo}' no puede ir después de '{anterior}'" if anterior
+                else f"'{tipo}' no puede ser el primer fichaje del día"
+            )
+            continue
+        anterior = tipo
+    return rechazados
+
+
+async def registrar_fichajes(db, eventos: list[dict], validar: bool = True) -> list[dict]:
+    """
+    Valida e inserta `eventos` (dicts con usuario_id, empresa_id, tipo,
+    fecha_hora, clave y opcionalmente id) en la transacción de `db`, sin
+    hacer commit. Devuelve un resultado por evento, en el mismo orden.
+
+    Con validar=False (volcado del buffer de app.buffer_fichajes) no se
+    aplican la máquina de estados ni los límites de hora, igual que al fichar
+    de uno en uno, y un id que ya está en fichajes cuenta como duplicado.
+    """
+    ahora = datetime.now(timezone.utc)
+    limite_futuro = ahora + timedelta(seconds=FICHAJE_MARGEN_FUTURO_SEGUNDOS)
+    limite_pasado = ahora - timedelta(days=FICHAJE_LOTE_MAX_DIAS)
+
+    resultados = [
+        {"indice": i, "clave": e.get("clave"), "estado": None, "fichaje_id": None}
+        for i, e in enumerate(eventos)
+    ]
+
+    def rechazar(i, motivo):
+        resultados[i]["estado"] = "rechazado"
+        resultados[i]["motivo"] = motivo
+
+    await bloquear_usuarios(db, [e["usuario_id"] for e in eventos])
+
+    # Claves: ya registradas o repetidas dentro del lote.
+    existentes = await _claves_existentes(db, {
+        (str(e["usuario_id"]), e["clave"]) for e in eventos if e.get("clave") is not None
+    })
+    primera = {}
+    pendientes = []
+    for i, e in enumerate(eventos):
+        par = (str(e["usuario_id"]), e.get("clave"))
+        if par in existentes:
+            resultados[i]["estado"] = "duplicado"
+            resultados[i]["fichaje_id"] = str(existentes[par])
+        elif par in primera:
+            resultados[i]["estado"] = "duplicado"
+        elif e["tipo"] not in TIPOS:
+            rechazar(i, "Tipo de fichaje inválido")
+        elif validar and not limite_pasado <= a_utc(e["fecha_hora"]) <= limite_futuro:
+            rechazar(i, "Hora fuera del rango admitido")
+        else:
+            if par[1] is not None:
+                primera[par] = i
+            pendientes.append(i)
+
+    # Máquina de estados por usuario.
+    previos = {}
+    if validar:
+        candidatos = defaultdict(list)
+        for i in pendientes:
+            e = eventos[i]
+            candidatos[str(e["usuario_id"])].append((i, e["tipo"], a_utc(e["fecha_hora"])))
+
+        if candidatos:
+            previos = await _fichajes_previos(db, {
+                usuario_id: min(c[2] for c in lista) for usuario_id, lista in candidatos.items()
+            })
+        for usuario_id, lista in candidatos.items():
+            for i, motivo in _validar(previos.get(usuario_id, []), lista).items():
+                rechazar(i, motivo)
+
+    nuevos = {}
+    ids = {}
+    for i in pendientes:
+        if resultados[i]["estado"] is None:
+            e = eventos[i]
+            if e.get("id") is not None:
+                # Mismo evento dos veces en el lote (reenvío del buffer).
+                if e["id"] in ids:
+                    resultados[i]["estado"] = "duplicado"
+                    resultados[i]["fichaje_id"] = str(e["id"])
+                    continue
+                ids[e["id"]] = i
+            nuevos[i] = Fichaje(
+                id=e.get("id") or uuid4(),
+                usuario_id=e["usuario_id"],
+                empresa_id=e["empresa_id"],
+                tipo=e["tipo"],
+                fecha_hora=a_utc(e["fecha_hora"]),
+            )
+
+    if nuevos:
+        insertados = set((
+            await db.execute(
+                pg_insert(Fichaje).on_conflict_do_nothing().returning(Fichaje.id),
+                [
+                    {"id": f.id, "usuario_id": f.usuario_id, "empresa_id": f.empresa_id, "tipo": f.tipo, "fecha_hora": f.fecha_hora}
+                    for f in nuevos.values()
+                ],
+            )
+        ).scalars())
+        for i, f in list(nuevos.items()):
+            resultados[i]["fichaje_id"] = str(f.id)
+            if f.id in insertados:
+                resultados[i]["estado"] = "creado"
+            else:
+                resultados[i]["estado"] = "duplicado"
+                del nuevos[i]
+
+    # Las repeticiones dentro del lote apuntan al fichaje de la primera aparición.
+    for i, e in enumerate(eventos):
+        if resultados[i]["estado"] == "duplicado" and resultados[i]["fichaje_id"] is None:
+            original = resultados[primera[(str(e["usuario_id"]), e["clave"])]]
+            if original["estado"] in ("creado", "duplicado"):
+                resultados[i]["fichaje_id"] = original["fichaje_id"]
+            else:
+                rechazar(i, "Clave repetida en el lote")
+
+    if not nuevos:
+        return resultados
+
+    con_clave = [(i, f) for i, f in nuevos.items() if eventos[i].get("clave") is not None]
+    if con_clave:
+        await db.execute(pg_insert(FichajeIdempotencia).on_conflict_do_nothing(), [
+            {"usuario_id": f.usuario_id, "clave": eventos[i]["clave"], "fichaje_id": f.id, "fecha_hora": f.fecha_hora}
+            for i, f in con_clave
+        ])
+
+    nuevos = list(nuevos.values())
+    await actualizar_jornadas(db, nuevos)
+    await actualizar_estado_actual(db, nuevos)
+
+    # Un evento por usuario, solo si el lote trae su estado más reciente.
+    ultimos = {}
+    for f in nuevos:
+        actual = ultimos.get(str(f.usuario_id))
+        if actual is None or f.fecha_hora >= actual.fecha_hora:
+            ultimos[str(f.usuario_id)] = f
+    await publicar_varios_async(db, [
+        {
+            "tipo": "fichaje",
+            "datos": {"usuario_id": usuario_id, "estado": f.tipo, "hora": f.fecha_hora.isoformat()},
+            "audiencia": "usuario_y_admins",
+            "usuario_id": f.usuario_id,
+            "empresa_id": f.empresa_id,
+        }
+        for usuario_id, f in ultimos.items()
+        if not any(fecha_hora > f.fecha_hora for _, fecha_hora in previos.get(usuario_id, []))
+    ])
+
+    return resultados
+
+
+def resumen(resultados: list[dict]) -> dict:
+    cuenta = {"creados": 0, "duplicados": 0, "rechazados": 0}
+    for r in resultados:
+        cuenta[{"creado": "creados", "duplicado": "duplicados", "rechazado": "rechazados"}[r["estado"]]] += 1
+    return cuenta
+
+
+def main():
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="accion", required=True)
+    sub.add_parser("purgar-claves", help="Borra las claves de idempotencia caducadas")
+    parser.parse_args()
+
+    with engine.connect() as conn:
+        borradas = purgar_claves(conn)
+    print(f"✅ Claves de idempotencia borradas: {borradas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Resumen diario de horas (tabla jornadas_diarias).
+
+`EstadoJornada` es la máquina entrada/pausa/salida que usaba
+obtener_horas_empleado, pero aplicable evento a evento: al fichar solo se
+lee y actualiza la fila del día en lugar de repasar todo el historial.
+
+    python -m app.jornadas backfill [--usuario UUID]
+
+recalcula la tabla desde los fichajes existentes.
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.fichaje import Fichaje
+from app.models.jornada import JornadaDiaria
+
+ANOMALIA_ENTRADA_DUPLICADA = 1
+ANOMALIA_SALIDA_SIN_ENTRADA = 2
+ANOMALIA_PAUSA_IGNORADA = 4
+ANOMALIA_SALIDA_EN_PAUSA = 8
+
+ANOMALIAS = {
+    ANOMALIA_ENTRADA_DUPLICADA: "entrada_duplicada",
+    ANOMALIA_SALIDA_SIN_ENTRADA: "salida_sin_entrada",
+    ANOMALIA_PAUSA_IGNORADA: "pausa_ignorada",
+    ANOMALIA_SALIDA_EN_PAUSA: "salida_en_pausa",
+}
+
+
+def describir_anomalias(mascara: int) -> list[str]:
+    return [nombre for bit, nombre in ANOMALIAS.items() if mascara & bit]
+
+
+def a_utc(fecha_hora: datetime) -> datetime:
+    """Las columnas TIMESTAMP sin zona guardan la hora UTC (la de la sesión)."""
+    if fecha_hora.tzinfo is None:
+        return fecha_hora.replace(tzinfo=timezone.utc)
+    return fecha_hora.astimezone(timezone.utc)
+
+
+def fecha_de(fecha_hora: datetime):
+    return a_utc(fecha_hora).date()
+
+
+class EstadoJornada:
+    """
+    Estado de un día de un usuario. Aplicar sus eventos en orden da el mismo
+    resultado que el bucle original: cada `entrada` abre sesión (cerrando la
+    anterior si seguía abierta), las pausas solo cuentan dentro de una sesión,
+    `salida` cierra sesión y pausa, y una sesión abierta se cuenta hasta el
+    último evento del día.
+    """
+
+    __slots__ = (
+        "segundos_cerrados",
+        "pausa_cerrada",
+        "entrada",
+        "pausa_ini",
+        "pausa_total",
+        "ultimo_evento",
+        "primera_entrada",
+        "ultima_salida",
+        "anomalias",
+        "num_eventos",
+    )
+
+    def __init__(self):
+        self.segundos_cerrados = 0.0
+        self.pausa_cerrada = 0.0
+        self.entrada = None
+        self.pausa_ini = None
+        self.pausa_total = 0.0
+        self.ultimo_evento = None
+        self.primera_entrada = None
+        self.ultima_salida = None
+        self.anomalias = 0
+        self.num_eventos = 0
+
+    @classmethod
+    def desde_eventos(cls, eventos) -> "EstadoJornada":
+        """`eventos`: pares (tipo, fecha_hora) ordenados por fecha_hora."""
+        estado = cls()
+        for tipo, fecha_hora in eventos:
+            estado.aplicar(tipo, fecha_hora)
+        return estado
+
+    @classmethod
+    def desde_jornada(cls, jornada: JornadaDiaria) -> "EstadoJornada":
+        estado = cls()
+        estado.segundos_cerrados = jornada.segundos_cerrados or 0.0
+        estado.pausa_cerrada = jornada.pausa_cerrada or 0.0
+        estado.entrada = jornada.entrada_abierta and a_utc(jornada.entrada_abierta)
+        estado.pausa_ini = jornada.pausa_inicio and a_utc(jornada.pausa_inicio)
+        estado.pausa_total = jornada.pausa_acumulada or 0.0
+        estado.ultimo_evento = jornada.ultimo_evento and a_utc(jornada.ultimo_evento)
+        estado.primera_entrada = jornada.primera_entrada
+        estado.ultima_salida = jornada.ultima_salida
+        estado.anomalias = jornada.anomalias or 0
+        estado.num_eventos = jornada.num_eventos or 0
+        return estado
+
+    def _cerrar_sesion(self, fecha_hora: datetime):
+        self.segundos_cerrados += (fecha_hora - self.entrada).total_seconds() - self.pausa_total
+        self.pausa_cerrada += self.pausa_total
+
+    def aplicar(self, tipo: str, fecha_hora: datetime):
+        fecha_hora = a_utc(fecha_hora)
+
+        if tipo == "entrada":
+            if self.entrada is not None:
+                self._cerrar_sesion(fecha_hora)
+                self.anomalias |= ANOMALIA_ENTRADA_DUPLICADA
+            self.entrada = fecha_hora
+            self.pausa_ini = None
+            self.pausa_total = 0.0
+            if self.primera_entrada is None:
+                self.primera_entrada = fecha_hora
+
+        elif tipo == "inicio_pausa":
+            if self.entrada is not None and self.pausa_ini is None:
+                self.pausa_ini = fecha_hora
+            else:
+                self.anomalias |= ANOMALIA_PAUSA_IGNORADA
+
+        elif tipo == "fin_pausa":
+            if self.pausa_ini is not None:
+                self.pausa_total += (fecha_hora - self.pausa_ini).total_seconds()
+                self.pausa_ini = None
+            else:
+                self.anomalias |= ANOMALIA_PAUSA_IGNORADA
+
+        elif tipo == "salida":
+            if self.entrada is not None:
+                if self.pausa_ini is not None:
+                    self.pausa_total += (fecha_hora - self.pausa_ini).total_seconds()
+                    self.pausa_ini = None
+                    self.anomalias |= ANOMALIA_SALIDA_EN_PAUSA
+                self._cerrar_sesion(fecha_hora)
+                self.entrada = None
+                self.pausa_total = 0.0
+                self.ultima_salida = fecha_hora
+            else:
+                self.anomalias |= ANOMALIA_SALIDA_SIN_ENTRADA
+
+        self.ultimo_evento = fecha_hora
+        self.num_eventos += 1
+
+    @property
+    def segundos_trabajados(self) -> float:
+        if self.entrada is None:
+            return self.segundos_cerrados
+        return self.segundos_cerrados + (self.ultimo_evento - self.entrada).total_seconds() - self.pausa_total
+
+    @property
+    def segundos_pausa(self) -> float:
+        if self.entrada is None:
+            return self.pausa_cerrada
+        return self.pausa_cerrada + self.pausa_total
+
+    def como_valores(self) -> dict:
+        """Columnas de jornadas_diarias que dependen del estado."""
+        return {
+            "segundos_trabajados": self.segundos_trabajados,
+            "segundos_pausa": self.segundos_pausa,
+            "primera_entrada": self.primera_entrada,
+            "ultima_salida": self.ultima_salida,
+            "anomalias": self.anomalias,
+            "num_eventos": self.num_eventos,
+            "segundos_cerrados": self.segundos_cerrados,
+            "pausa_cerrada": self.pausa_cerrada,
+            "entrada_abierta": self.entrada,
+            "pausa_inicio": self.pausa_ini,
+            "pausa_acumulada": self.pausa_total,
+            "ultimo_evento": self.ultimo_evento,
+        }
+
+    def volcar(self, jornada: JornadaDiaria):
+        for campo, valor in self.como_valores().items():
+            setattr(jornada, campo, valor)
+
+
+def _limites_dia(fecha):
+    inicio = datetime(fecha.year, fecha.month, fecha.day, tzinfo=timezone.utc)
+    return inicio, inicio + timedelta(days=1)
+
+
+async def _recalcular_dia(db: AsyncSession, usuario_id, fecha) -> EstadoJornada:
+    inicio, fin = _limites_dia(fecha)
+    eventos = (
+        await db.execute(
+            select(Fichaje.tipo, Fichaje.fecha_hora)
+            .where(
+                Fichaje.usuario_id == usuario_id,
+                Fichaje.fecha_hora >= inicio,
+                Fichaje.fecha_hora < fin,
+            )
+            .order_by(Fichaje.fecha_hora.asc())
+        )
+    ).all()
+    return EstadoJornada.desde_eventos(eventos)
+
+
+async def _bloquear_jornadas(db: AsyncSession, claves: dict) -> dict:
+    """
+    Filas de jornadas_diarias de `claves` ({(usuario_id, fecha): empresa_id}),
+    creando las que falten, bloqueadas FOR UPDATE en orden fijo (usuario,
+    fecha) para no interbloquear con otras transacciones. Una consulta si ya
+    existen todas (lo normal salvo el primer fichaje del día) y tres como
+    mucho, sea cual sea el número de jornadas.
+    """
+    def consulta(pares):
+        return (
+            select(JornadaDiaria)
+            .where(tuple_(JornadaDiaria.usuario_id, JornadaDiaria.fecha).in_(pares))
+            .order_by(JornadaDiaria.usuario_id, JornadaDiaria.fecha)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+
+    pares = sorted(claves, key=lambda k: (str(k[0]), k[1]))
+    jornadas = {(str(j.usuario_id), j.fecha): j for j in (await db.execute(consulta(pares))).scalars()}
+
+    faltan = [k for k in pares if (str(k[0]), k[1]) not in jornadas]
+    if faltan:
+        await db.execute(
+            pg_insert(JornadaDiaria).on_conflict_do_nothing(),
+            [{"usuario_id": u, "fecha": f, "empresa_id": claves[(u, f)]} for u, f in faltan],
+        )
+        for j in (await db.execute(consulta(faltan))).scalars():
+            jornadas[(str(j.usuario_id), j.fecha)] = j
+    return jornadas
+
+
+async def actualizar_jornadas(db: AsyncSession, fichajes):
+    """
+    Aplica fichajes ya insertados (flush hecho) a sus jornadas, dentro de la
+    transacción en curso. Si algún evento llega con hora anterior al último
+    aplicado en su día, ese día se recalcula desde los fichajes.
+    """
+    grupos = defaultdict(list)
+    for f in fichajes:
+        grupos[(f.usuario_id, fecha_de(f.fecha_hora))].append(f)
+    if not grupos:
+        return
+
+    jornadas = await _bloquear_jornadas(db, {k: eventos[0].empresa_id for k, eventos in grupos.items()})
+    for usuario_id, fecha in sorted(grupos, key=lambda k: (str(k[0]), k[1])):
+        eventos = sorted(grupos[(usuario_id, fecha)], key=lambda f: a_utc(f.fecha_hora))
+        jornada = jornadas[(str(usuario_id), fecha)]
+
+        estado = EstadoJornada.desde_jornada(jornada)
+        if estado.ultimo_evento is not None and a_utc(eventos[0].fecha_hora) < estado.ultimo_evento:
+            estado = await _recalcular_dia(db, usuario_id, fecha)
+        else:
+            for f in eventos:
+                estado.aplicar(f.tipo, f.fecha_hora)
+
+        estado.volcar(jornada)
+
+
+def backfill(lectura, escritura, usuario_id=None, lote: int = 1000, commit: bool = True) -> int:
+    """
+    Recalcula jornadas_diarias desde fichajes. Lee con un cursor de servidor
+    por la conexión `lectura` y hace upsert por lotes (un commit por lote)
+    por la conexión `escritura`. Con commit=False (desde una migración) todo
+    queda en la transacción en curso.
+    """
+    consulta = (
+        select(Fichaje.usuario_id, Fichaje.empresa_id, Fichaje.tipo, Fichaje.fecha_hora)
+        .order_by(Fichaje.usuario_id, Fichaje.fecha_hora.asc())
+        .execution_options(yield_per=5000)
+    )
+    if usuario_id:
+        consulta = consulta.where(Fichaje.usuario_id == usuario_id)
+
+    filas = []
+    total = 0
+
+    def volcar_lote():
+        if not filas:
+            return
+        stmt = pg_insert(JornadaDiaria).values(filas)
+        columnas = {c: stmt.excluded[c] for c in filas[0] if c not in ("usuario_id", "fecha")}
+        escritura.execute(stmt.on_conflict_do_update(index_elements=["usuario_id", "fecha"], set_=columnas))
+        if commit:
+            escritura.commit()
+        filas.clear()
+
+    clave_actual = None
+    empresa_actual = None
+    estado = None
+    for f in lectura.execute(consulta):
+        clave = (f.usuario_id, fecha_de(f.fecha_hora))
+        if clave != clave_actual:
+            if estado is not None:
+                filas.append({
+                    "usuario_id": clave_actual[0],
+                    "fecha": clave_actual[1],
+                    "empresa_id": empresa_actual,
+                    **estado.como_valores(),
+                })
+                total += 1
+                if len(filas) >= lote:
+                    volcar_lote()
+            clave_actual, empresa_actual, estado = clave, f.empresa_id, EstadoJornada()
+        estado.aplicar(f.tipo, f.fecha_hora)
+
+    if estado is not None:
+        filas.append({
+            "usuario_id": clave_actual[0],
+            "fecha": clave_actual[1],
+            "empresa_id": empresa_actual,
+            **estado.como_valores(),
+        })
+        total += 1
+    volcar_lote()
+    return total
+
+
+def main():
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="accion", required=True)
+    relleno = sub.add_parser("backfill", help="Recalcula jornadas_diarias desde fichajes")
+    relleno.add_argument("--usuario", default=None, help="Solo este usuario")
+    args = parser.parse_args()
+
+    with engine.connect() as lectura, engine.connect() as escritura:
+        total = backfill(lectura, escritura, args.usuario)
+    print(f"✅ Jornadas recalculadas: {total}")
+
+
+if __name__ == "__main__":
+    main()
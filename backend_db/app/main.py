@@ -1,7 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import Base, engine
+from app.database import engine, async_engine
 from app.security import get_current_user
+from app.db_metrics import metricas_pool, iniciar_peticion
+from app.particiones import asegurar_particiones
+from app.ingesta import purgar_claves
+from app.cola_informes import iniciar_workers, detener_workers
+from app.informes import cerrar_pool
+from app.almacenamiento import almacenamiento
+from app.eventos import iniciar_escucha, detener_escucha
+from app.buffer_fichajes import iniciar_buffer, detener_buffer
+from app.blobs import iniciar_limpieza, detener_limpieza
 
 from app.routers import (
     auth,
@@ -10,11 +20,13 @@ from app.routers import (
     usuario as usuario_router,
     notification,
     invitacion,  
-    documentos
+    documentos,
+    informes,
+    eventos,
+    metrics,
 )
 
-print("✅ Creando tablas si no existen...")
-Base.metadata.create_all(bind=engine)
+# El esquema lo gestiona Alembic (`alembic upgrade head`, ver Dockerfile).
 
 app = FastAPI(title="Registro Horario API", version="1.0.0")
 
@@ -24,8 +36,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Sin esto el navegador no deja leer el cursor de las listas paginadas.
+    expose_headers=["X-Siguiente-Cursor"],
 )
 
+
+@app.middleware("http")
+async def medir_espera_pool(request: Request, call_next):
+    """Anota en cada respuesta cuánto esperó la petición por una conexión."""
+    acumulado = iniciar_peticion()
+    response = await call_next(request)
+    metricas_pool.registrar_peticion(acumulado)
+    response.headers["X-DB-Pool-Wait-Ms"] = f"{acumulado['espera'] * 1000:.1f}"
+    return response
+
+
 app.include_router(auth.router)
 app.include_router(empresa.router)
 app.include_router(fichaje.router, prefix="/fichajes")
@@ -33,6 +58,71 @@ app.include_router(usuario_router.router)
 app.include_router(notification.router)
 app.include_router(invitacion.router)
 app.include_router(documentos.router)
+app.include_router(informes.router)
+app.include_router(eventos.router)
+app.include_router(metrics.router)
+
+
+def _preparar_particiones():
+    with engine.begin() as conn:
+        creadas = asegurar_particiones(conn)
+    if creadas:
+        print(f"✅ Particiones de fichajes creadas: {', '.join(creadas)}")
+
+
+@app.on_event("startup")
+async def preparar_particiones():
+    await run_in_threadpool(_preparar_particiones)
+
+
+def _purgar_claves():
+    with engine.connect() as conn:
+        borradas = purgar_claves(conn)
+    if borradas:
+        print(f"✅ Claves de idempotencia caducadas borradas: {borradas}")
+
+
+@app.on_event("startup")
+async def purgar_claves_idempotencia():
+    await run_in_threadpool(_purgar_claves)
+
+
+@app.on_event("startup")
+async def preparar_almacenamiento():
+    await run_in_threadpool(almacenamiento.preparar)
+
+
+@app.on_event("startup")
+async def arrancar_cola_informes():
+    iniciar_workers()
+
+
+@app.on_event("startup")
+async def arrancar_eventos():
+    iniciar_escucha()
+
+
+@app.on_event("startup")
+async def arrancar_buffer_fichajes():
+    await iniciar_buffer()
+
+
+@app.on_event("startup")
+async def arrancar_limpieza_blobs():
+    iniciar_limpieza()
+
+
+@app.on_event("shutdown")
+async def cerrar_conexiones():
+    await detener_buffer()
+    await detener_workers()
+    await detener_escucha()
+    await detener_limpieza()
+    cerrar_pool()
+    await async_engine.dispose()
+    engine.dispose()
+
+
 @app.get("/")
 def root():
     return {"status": "API funcionando ✅"}
@@ -0,0 +1,22 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class Blob(Base):
+    """
+    Contenido guardado una sola vez en el almacenamiento, direccionado por su
+    sha256 (clave `blobs/{sha256[:2]}/{sha256}`). Cada fila de documentos que
+    lo usa tiene esa clave en `ruta`; `referencias` cuenta cuántas hay.
+    """
+
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    tamano = Column(BigInteger, nullable=False)
+    referencias = Column(Integer, nullable=False, default=0)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    # Se actualiza cada vez que se vuelve a guardar el mismo contenido; la
+    # limpieza respeta un margen desde aquí para no borrar un blob recién reutilizado.
+    fecha_uso = Column(DateTime(timezone=True), server_default=func.now())
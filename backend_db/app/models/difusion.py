@@ -0,0 +1,44 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, String
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+from app.database import Base
+
+
+class Difusion(Base):
+    """
+    Mensaje enviado a todos los empleados de una empresa. Se guarda una sola
+    vez; cada empleado lo ve al leer sus notificaciones (fan-out en lectura).
+    """
+
+    __tablename__ = "difusiones"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    empresa_id = Column(UUID(as_uuid=True), ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+    titulo = Column(String(150), nullable=False)
+    mensaje = Column(String, nullable=False)
+    tipo = Column(String(30), nullable=False)
+    origen = Column(String(50), default="admin")
+    archivo = Column(String, nullable=True)
+    # UTC sin zona, igual que notificaciones.fecha_envio, para poder mezclarlas
+    # y compararlas con usuarios.notificaciones_leidas_hasta.
+    fecha_envio = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_difusiones_empresa_fecha", empresa_id, fecha_envio.desc()),
+    )
+
+
+class EstadoDifusion(Base):
+    """
+    Estado de una difusión para un usuario. Solo hay fila si el usuario la ha
+    leído o borrado de una en una; "marcar todas como leídas" no crea filas
+    (usa Usuario.notificaciones_leidas_hasta).
+    """
+
+    __tablename__ = "estados_difusion"
+
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    difusion_id = Column(UUID(as_uuid=True), ForeignKey("difusiones.id", ondelete="CASCADE"), primary_key=True)
+    leida = Column(Boolean, nullable=False, default=False)
+    eliminada = Column(Boolean, nullable=False, default=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, String, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from uuid import uuid4
@@ -13,4 +13,11 @@ class Documento(Base):
     nombre = Column(String, nullable=False)
     ruta = Column(String, nullable=False)
     tipo = Column(String, nullable=True)
+    tamano = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True)
     fecha_subida = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_documentos_usuario_fecha", usuario_id, fecha_subida.desc()),
+        Index("ux_documentos_nombre_usuario", nombre, usuario_id, unique=True),
+    )
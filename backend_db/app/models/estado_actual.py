@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class EstadoActual(Base):
+    """Último fichaje de cada usuario, mantenido al fichar (una fila por usuario)."""
+
+    __tablename__ = "estado_actual"
+
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    empresa_id = Column(UUID(as_uuid=True), ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String(30), nullable=False)
+    fecha_hora = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_estado_actual_empresa", empresa_id),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime
+from sqlalchemy import Column, String, ForeignKey, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.database import Base
@@ -12,5 +12,11 @@ class Fichaje(Base):
     empresa_id = Column(UUID(as_uuid=True), ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
     tipo = Column(String(30), nullable=False)
 
-    fecha_hora = Column(DateTime(timezone=True), server_default=func.now())
+    # Clave de partición (particiones mensuales): forma parte de la PK.
+    fecha_hora = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_fichajes_usuario_fecha", usuario_id, fecha_hora.desc()),
+        Index("ix_fichajes_empresa_fecha", empresa_id, fecha_hora),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class FichajeIdempotencia(Base):
+    """
+    Clave de idempotencia con la que el cliente envió un fichaje. Reenviar la
+    misma clave devuelve el fichaje ya creado en lugar de duplicarlo. Va en
+    tabla aparte porque en fichajes (particionada) un índice único tendría
+    que incluir fecha_hora.
+    """
+
+    __tablename__ = "fichajes_idempotencia"
+
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    clave = Column(String(100), primary_key=True)
+    fichaje_id = Column(UUID(as_uuid=True), nullable=False)
+    fecha_hora = Column(DateTime(timezone=True), nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_fichajes_idempotencia_creacion", fecha_creacion),
+    )
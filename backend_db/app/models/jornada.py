@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class JornadaDiaria(Base):
+    """Resumen por usuario y día de sus fichajes, mantenido al fichar."""
+
+    __tablename__ = "jornadas_diarias"
+
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    fecha = Column(Date, primary_key=True)
+    empresa_id = Column(UUID(as_uuid=True), ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+
+    segundos_trabajados = Column(Float, nullable=False, default=0)
+    segundos_pausa = Column(Float, nullable=False, default=0)
+    primera_entrada = Column(DateTime(timezone=True), nullable=True)
+    ultima_salida = Column(DateTime(timezone=True), nullable=True)
+    anomalias = Column(Integer, nullable=False, default=0)
+    num_eventos = Column(Integer, nullable=False, default=0)
+
+    # Estado de la máquina entrada/pausa/salida para aplicar el siguiente evento
+    segundos_cerrados = Column(Float, nullable=False, default=0)
+    pausa_cerrada = Column(Float, nullable=False, default=0)
+    entrada_abierta = Column(DateTime(timezone=True), nullable=True)
+    pausa_inicio = Column(DateTime(timezone=True), nullable=True)
+    pausa_acumulada = Column(Float, nullable=False, default=0)
+    ultimo_evento = Column(DateTime(timezone=True), nullable=True)
+
+    actualizado = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_jornadas_diarias_empresa_fecha", empresa_id, fecha),
+    )
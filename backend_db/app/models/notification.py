@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
@@ -14,6 +14,13 @@ class Notificacion(Base):
     mensaje = Column(String, nullable=False)
     tipo = Column(String(30), nullable=False)
     leida = Column(Boolean, default=False)
-    fecha_envio = Column(DateTime(timezone=True), server_default=func.now())
+    # UTC sin zona (TIMESTAMP en la tabla, se escribe con datetime.utcnow()).
+    fecha_envio = Column(DateTime, server_default=func.now())
     origen = Column(String(50), default="sistema")
-    archivo = Column(String, nullable=True) 
+    archivo = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notificaciones_usuario_fecha", usuario_id, fecha_envio.desc()),
+        Index("ix_notificaciones_empresa_origen_fecha", empresa_id, origen, fecha_envio.desc()),
+        Index("ix_notificaciones_no_leidas", usuario_id, fecha_envio, postgresql_where=text("leida = false")),
+    )
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from uuid import uuid4
+from app.database import Base
+
+
+class TrabajoInforme(Base):
+    """Informe pedido a la cola de generación en segundo plano."""
+
+    __tablename__ = "trabajos_informe"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    solicitante_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    empresa_id = Column(UUID(as_uuid=True), ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False)
+
+    tipo = Column(String(20), nullable=False)        # semanal | mensual
+    periodo = Column(String(10), nullable=False)     # YYYY-MM-DD | YYYY-MM
+    formato = Column(String(10), nullable=False)     # pdf | xlsx | csv
+
+    estado = Column(String(20), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    archivo = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_inicio = Column(DateTime(timezone=True), nullable=True)
+    fecha_fin = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_trabajos_informe_cola", estado, fecha_creacion,
+            postgresql_where=text("estado IN ('pendiente', 'procesando')"),
+        ),
+        Index("ix_trabajos_informe_solicitante", solicitante_id, fecha_creacion.desc()),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
@@ -17,3 +17,11 @@ class Usuario(Base):
     rol = Column(String, default="empleado")
     activo = Column(Boolean, default=True)
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    # Todo lo enviado hasta aquí cuenta como leído: "marcar todas como
+    # leídas" solo mueve esta marca. UTC sin zona, como notificaciones y
+    # difusiones.fecha_envio, con las que se compara tal cual.
+    notificaciones_leidas_hasta = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_usuarios_empresa_rol", empresa_id, rol),
+    )
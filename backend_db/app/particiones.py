@@ -0,0 +1,170 @@
+"""
+Mantenimiento de las particiones mensuales de `fichajes`.
+
+    python -m app.particiones crear --meses 3
+    python -m app.particiones archivar --retener 24 [--borrar]
+
+`crear` deja creadas las particiones del mes actual y de los N siguientes
+(también lo hace la API al arrancar). `archivar` separa (DETACH) las
+particiones más antiguas que la retención indicada y las mueve al esquema
+`archivo`, de donde pueden volcarse con pg_dump y borrarse.
+"""
+import argparse
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+TABLA = "fichajes"
+PARTICION_DEFAULT = "fichajes_default"
+ESQUEMA_ARCHIVO = "archivo"
+
+
+def _sumar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + (mes.month - 1) + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(mes: date) -> str:
+    return f"{TABLA}_p{mes.year:04d}_{mes.month:02d}"
+
+
+def esta_particionada(conn: Connection) -> bool:
+    return bool(conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:tabla)"),
+        {"tabla": TABLA},
+    ).scalar())
+
+
+def _bloquear(conn: Connection):
+    """
+    Serializa hasta el fin de la transacción los cambios de particiones: las
+    réplicas de la API las crean todas al arrancar. Lo que se comprueba
+    después del bloqueo ya ve lo que haya creado la otra.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:clave))"), {"clave": f"particiones:{TABLA}"})
+
+
+def particiones(conn: Connection) -> list[str]:
+    return list(conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:tabla)
+        ORDER BY c.relname
+    """), {"tabla": TABLA}).scalars())
+
+
+def crear_particion(conn: Connection, mes: date) -> bool:
+    """
+    Crea la partición del mes si no existe. Si la partición DEFAULT ya tiene
+    filas de ese mes, se mueven a la nueva (Postgres no deja crearla si no).
+    """
+    mes = mes.replace(day=1)
+    nombre = nombre_particion(mes)
+    if nombre in particiones(conn):
+        return False
+
+    inicio, fin = mes, _sumar_meses(mes, 1)
+    hay_filas_en_default = conn.execute(
+        text(f"SELECT 1 FROM {PARTICION_DEFAULT} WHERE fecha_hora >= :inicio AND fecha_hora < :fin LIMIT 1"),
+        {"inicio": inicio, "fin": fin},
+    ).first() if PARTICION_DEFAULT in particiones(conn) else None
+
+    if hay_filas_en_default:
+        conn.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFAULT}"))
+
+    conn.execute(text(
+        f"CREATE TABLE {nombre} PARTITION OF {TABLA} "
+        f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fin.isoformat()}')"
+    ))
+
+    if hay_filas_en_default:
+        conn.execute(
+            text(f"""
+                WITH movidas AS (
+                    DELETE FROM {PARTICION_DEFAULT}
+                    WHERE fecha_hora >= :inicio AND fecha_hora < :fin
+                    RETURNING *
+                )
+                INSERT INTO {nombre} SELECT * FROM movidas
+            """),
+            {"inicio": inicio, "fin": fin},
+        )
+        conn.execute(text(f"ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFAULT} DEFAULT"))
+
+    return True
+
+
+def asegurar_particiones(conn: Connection, meses: int = 3, hoy: date | None = None) -> list[str]:
+    """Crea las particiones del mes actual y de los `meses` siguientes."""
+    if not esta_particionada(conn):
+        return []
+
+    _bloquear(conn)
+    actual = (hoy or date.today()).replace(day=1)
+    creadas = []
+    for n in range(meses + 1):
+        mes = _sumar_meses(actual, n)
+        if crear_particion(conn, mes):
+            creadas.append(nombre_particion(mes))
+    return creadas
+
+
+def archivar_particiones(
+    conn: Connection,
+    retener_meses: int,
+    borrar: bool = False,
+    hoy: date | None = None,
+) -> list[str]:
+    """
+    Separa las particiones anteriores a `retener_meses` meses. Por defecto
+    se conservan en el esquema `archivo`; con `borrar=True` se eliminan.
+    """
+    _bloquear(conn)
+    limite = _sumar_meses((hoy or date.today()).replace(day=1), -retener_meses)
+    limite_nombre = nombre_particion(limite)
+
+    antiguas = [
+        p for p in particiones(conn)
+        if p != PARTICION_DEFAULT and p < limite_nombre
+    ]
+    if not borrar and antiguas:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ESQUEMA_ARCHIVO}"))
+
+    for nombre in antiguas:
+        conn.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+        if borrar:
+            conn.execute(text(f"DROP TABLE {nombre}"))
+        else:
+            conn.execute(text(f"ALTER TABLE {nombre} SET SCHEMA {ESQUEMA_ARCHIVO}"))
+
+    return antiguas
+
+
+def main():
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="accion", required=True)
+
+    crear = sub.add_parser("crear", help="Crea las particiones de los próximos meses")
+    crear.add_argument("--meses", type=int, default=3)
+
+    archivar = sub.add_parser("archivar", help="Separa las particiones antiguas")
+    archivar.add_argument("--retener", type=int, required=True, help="Meses que se mantienen en la tabla")
+    archivar.add_argument("--borrar", action="store_true", help="Borra en vez de mover al esquema archivo")
+
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.accion == "crear":
+            creadas = asegurar_particiones(conn, args.meses)
+            print(f"✅ Particiones creadas: {', '.join(creadas) or 'ninguna'}")
+        else:
+            archivadas = archivar_particiones(conn, args.retener, borrar=args.borrar)
+            print(f"✅ Particiones archivadas: {', '.join(archivadas) or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Presencia de la plantilla: quién está trabajando, en pausa o fuera.
+
+- estado_actual guarda el último fichaje de cada usuario. `actualizar_estado_actual`
+  lo mantiene dentro de la transacción del fichaje (upsert que nunca retrocede
+  si llega un fichaje con hora anterior).
+- Cada proceso tiene en memoria un tablero por empresa, cargado con una sola
+  consulta (usuarios + estado_actual) y actualizado con los eventos `fichaje`
+  de app.eventos, que llegan a todas las réplicas. Así los paneles que
+  refrescan cada pocos segundos no tocan la BD. El tablero se recarga pasados
+  PRESENCIA_TTL_SEGUNDOS (altas, bajas, cambios de nombre) o si se han podido
+  perder eventos.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import eventos
+from app.jornadas import a_utc
+from app.models.estado_actual import EstadoActual
+from app.models.usuario import Usuario
+
+PRESENCIA_TTL_SEGUNDOS = float(os.getenv("PRESENCIA_TTL_SEGUNDOS", "300"))
+
+SITUACIONES = {
+    "entrada": "trabajando",
+    "fin_pausa": "trabajando",
+    "inicio_pausa": "en_pausa",
+    "salida": "fuera",
+}
+
+
+async def actualizar_estado_actual(db, fichajes):
+    """Aplica fichajes ya insertados a estado_actual, en la transacción en curso."""
+    ultimos = {}
+    for f in fichajes:
+        actual = ultimos.get(f.usuario_id)
+        if actual is None or a_utc(f.fecha_hora) >= a_utc(actual.fecha_hora):
+            ultimos[f.usuario_id] = f
+    if not ultimos:
+        return
+
+    stmt = pg_insert(EstadoActual)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[EstadoActual.usuario_id],
+        set_={"tipo": stmt.excluded.tipo, "fecha_hora": stmt.excluded.fecha_hora, "empresa_id": stmt.excluded.empresa_id},
+        where=EstadoActual.fecha_hora <= stmt.excluded.fecha_hora,
+    ), [
+        {"usuario_id": f.usuario_id, "empresa_id": f.empresa_id, "tipo": f.tipo, "fecha_hora": f.fecha_hora}
+        for _, f in sorted(ultimos.items(), key=lambda u: str(u[0]))
+    ])
+
+
+class _Tablero:
+    __slots__ = ("cargado", "empleados")
+
+    def __init__(self, empleados: dict):
+        self.cargado = time.monotonic()
+        self.empleados = empleados
+
+
+_tableros: dict[str, _Tablero] = {}
+_cargas: dict[str, asyncio.Lock] = {}
+
+
+async def _cargar(db, empresa_id) -> _Tablero:
+    filas = await db.execute(
+        select(Usuario.id, Usuario.nombre, Usuario.apellidos, EstadoActual.tipo, EstadoActual.fecha_hora)
+        .outerjoin(EstadoActual, EstadoActual.usuario_id == Usuario.id)
+        .where(Usuario.empresa_id == empresa_id, Usuario.rol == "empleado", Usuario.activo.isnot(False))
+        .order_by(Usuario.nombre, Usuario.apellidos)
+    )
+    return _Tablero({
+        str(f.id): {
+            "usuario_id": str(f.id),
+            "nombre": f.nombre,
+            "apellidos": f.apellidos,
+            "estado": f.tipo or "sin_registro",
+            "hora": a_utc(f.fecha_hora) if f.fecha_hora else None,
+        }
+        for f in filas
+    })
+
+
+async def tablero(db, empresa_id) -> dict:
+    """Resumen por situación y estado de cada empleado de la empresa."""
+    clave = str(empresa_id)
+    actual = _tableros.get(clave)
+    if actual is None or time.monotonic() - actual.cargado > PRESENCIA_TTL_SEGUNDOS:
+        # Una sola carga por empresa aunque lleguen varias peticiones a la vez.
+        async with _cargas.setdefault(clave, asyncio.Lock()):
+            actual = _tableros.get(clave)
+            if actual is None or time.monotonic() - actual.cargado > PRESENCIA_TTL_SEGUNDOS:
+                actual = _tableros[clave] = await _cargar(db, empresa_id)
+
+    resumen = {"trabajando": 0, "en_pausa": 0, "fuera": 0, "sin_registro": 0}
+    empleados = []
+    for e in actual.empleados.values():
+        situacion = SITUACIONES.get(e["estado"], "sin_registro")
+        resumen[situacion] += 1
+        empleados.append({
+            **e,
+            "situacion": situacion,
+            "hora": e["hora"].isoformat() if e["hora"] else None,
+        })
+    return {"resumen": resumen, "empleados": empleados}
+
+
+def _aplicar_evento(evento: dict):
+    if evento["tipo"] == "resincronizar":
+        _tableros.clear()
+        return
+    if evento["tipo"] != "fichaje":
+        return
+
+    actual = _tableros.get(evento.get("empresa_id"))
+    if actual is None:
+        return
+    datos = evento["datos"]
+    empleado = actual.empleados.get(datos["usuario_id"])
+    if empleado is None:
+        # Empleado que no estaba al cargar: se recarga en la próxima consulta.
+        _tableros.pop(evento["empresa_id"], None)
+        return
+
+    hora = a_utc(datetime.fromisoformat(datos["hora"]))
+    if empleado["hora"] is None or hora >= empleado["hora"]:
+        empleado["estado"] = datos["estado"]
+        empleado["hora"] = hora
+
+
+eventos.observar(_aplicar_evento)
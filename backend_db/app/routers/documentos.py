@@ -1,110 +1,530 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
+import csv
+import hashlib
+import mimetypes
 import os
-from fastapi.responses import Response, StreamingResponse
-from datetime import datetime, timedelta
+import zlib
+from collections import Counter
+from io import StringIO
+from itertools import chain
+from uuid import UUID
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from jose import jwt, JWTError
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from datetime import datetime
 from app.models.fichaje import Fichaje
-from app.database import get_db
-from app.security import get_current_user
+from app.database import get_db, SessionLocal, engine
+from app.security import get_current_user, get_token_claims, SECRET_KEY, ALGORITHM
+from app.models.blob import Blob
 from app.models.documento import Documento
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from collections import defaultdict
+from app.models.usuario import Usuario
+from app.informes import nombre_informe, pdf_por_dias, rango_periodo, renderizar, titulo_informe
+from app import cache_informes
+from app.almacenamiento import almacenamiento, caducidad, validar_clave
 
 router = APIRouter(prefix="/documentos", tags=["Documentos"])
 
-BASE_DIR = "uploads/documentos"
+# Prefijos de las claves en el almacenamiento: documentos/{usuario_id}/{nombre}
+# para los archivos propios de un usuario y blobs/{sha256[:2]}/{sha256} para
+# el contenido compartido (ver guardar_blob).
+PREFIJO = "documentos"
+PREFIJO_BLOBS = "blobs"
 
+DOCUMENTOS_MAX_MB = float(os.getenv("DOCUMENTOS_MAX_MB", "50"))
+# Holgura sobre DOCUMENTOS_MAX_MB para los separadores y campos del multipart.
+SUBIDA_MAX_CAMPOS = 64 * 1024
 
-def guardar_archivo(usuario_id: str, nombre: str, contenido: bytes):
-    ruta_dir = f"{BASE_DIR}/{usuario_id}/"
-    os.makedirs(ruta_dir, exist_ok=True)
+# Tipos que no todas las instalaciones traen en /etc/mime.types.
+mimetypes.add_type("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx")
+mimetypes.add_type("application/vnd.openxmlformats-officedocument.wordprocessingml.document", ".docx")
+mimetypes.add_type("text/csv", ".csv")
 
-    ruta_archivo = os.path.join(ruta_dir, nombre)
-    with open(ruta_archivo, "wb") as f:
-        f.write(contenido)
 
-    return ruta_archivo
+def _tipo_mime(nombre: str) -> str:
+    return mimetypes.guess_type(nombre)[0] or "application/octet-stream"
 
 
-@router.post("/subir")
-async def subir_documento(
-    usuario_id: str = Form(...),
-    tipo: str | None = Form(None),
-    archivo: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
-):
-    if user.rol != "admin" and str(user.id) != usuario_id:
-        raise HTTPException(status_code=403, detail="No autorizado")
+def clave_documento(usuario_id: str, nombre: str) -> str:
+    """Clave del documento en el almacenamiento; 404 si el nombre intenta salir de su carpeta."""
+    return validar_clave(PREFIJO, str(usuario_id), nombre)
+
+
+def clave_blob(sha256: str) -> str:
+    return validar_clave(PREFIJO_BLOBS, sha256[:2], sha256)
+
+
+def _sha256_blob(clave: str) -> str | None:
+    """sha256 del blob al que apunta la clave, o None si es una clave por usuario."""
+    partes = clave.split("/")
+    if len(partes) == 3 and partes[0] == PREFIJO_BLOBS:
+        return partes[2]
+    return None
 
-    contenido = await archivo.read()
-    guardar_archivo(usuario_id, archivo.filename, contenido)
 
-    doc = Documento(
-        usuario_id=usuario_id,
-        nombre=archivo.filename,
-        ruta=f"{BASE_DIR}/{usuario_id}/{archivo.filename}",
-        tipo=tipo,
+def registrar_documentos(
+    usuario_ids,
+    nombre: str,
+    ruta: str,
+    tipo: str | None = None,
+    tamano: int | None = None,
+    sha256: str | None = None,
+):
+    """
+    Alta (o actualización) del archivo en la tabla documentos, que es el índice
+    por (nombre, usuario_id) con el que se resuelven las descargas por nombre.
+    `ruta` es la clave en el almacenamiento, no una ruta de disco.
+
+    Acepta varios usuarios a la vez (un solo INSERT ... ON CONFLICT) y ajusta
+    en la misma transacción las referencias de los blobs: suma las filas que
+    pasan a apuntar a `ruta` y resta las que apuntaban a otro blob.
+    """
+    usuario_ids = sorted({str(u) for u in usuario_ids})
+    if not usuario_ids:
+        return
+
+    stmt = pg_insert(Documento).values([
+        {"usuario_id": u, "nombre": nombre, "ruta": ruta, "tipo": tipo, "tamano": tamano, "sha256": sha256}
+        for u in usuario_ids
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Documento.nombre, Documento.usuario_id],
+        set_={
+            "ruta": stmt.excluded.ruta,
+            "tipo": func.coalesce(stmt.excluded.tipo, Documento.tipo),
+            "tamano": stmt.excluded.tamano,
+            "sha256": stmt.excluded.sha256,
+            "fecha_subida": func.now(),
+        },
     )
 
-    db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    with engine.begin() as conn:
+        anteriores = conn.execute(
+            select(Documento.ruta)
+            .where(Documento.nombre == nombre, Documento.usuario_id.in_(usuario_ids))
+            .order_by(Documento.usuario_id)
+            .with_for_update()
+        ).scalars().all()
+        conn.execute(stmt)
+
+        referencias = Counter()
+        referencias[_sha256_blob(ruta)] += len(usuario_ids)
+        for anterior in anteriores:
+            referencias[_sha256_blob(anterior)] -= 1
+        for blob, delta in sorted(referencias.items(), key=lambda r: r[0] or ""):
+            if blob and delta:
+                conn.execute(
+                    update(Blob).where(Blob.sha256 == blob).values(referencias=Blob.referencias + delta)
+                )
+
+
+def registrar_documento(
+    usuario_id: str,
+    nombre: str,
+    ruta: str,
+    tipo: str | None = None,
+    tamano: int | None = None,
+    sha256: str | None = None,
+):
+    registrar_documentos([usuario_id], nombre, ruta, tipo, tamano, sha256)
+
+
+def guardar_blob(contenido: bytes, media_type: str | None = None) -> tuple[str, str]:
+    """
+    Guarda el contenido una sola vez, direccionado por su sha256, y devuelve
+    (clave, sha256). Si ya existe no se vuelve a escribir: solo se marca como
+    usado para que app.blobs no lo borre mientras se enlaza.
+    """
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    clave = clave_blob(sha256)
+
+    stmt = pg_insert(Blob).values(sha256=sha256, tamano=len(contenido), referencias=0)
+    stmt = stmt.on_conflict_do_update(index_elements=[Blob.sha256], set_={"fecha_uso": func.now()})
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+    if not almacenamiento.existe(clave):
+        almacenamiento.guardar(clave, contenido, media_type)
+    return clave, sha256
+
+
+def compartir_archivo(usuario_ids, nombre: str, contenido: bytes, tipo: str | None = None) -> str:
+    """
+    Da el mismo archivo a varios usuarios escribiendo los bytes una sola vez:
+    un blob y una fila de documentos por usuario que apunta a él.
+    """
+    validar_clave(nombre)
+    clave, sha256 = guardar_blob(contenido, _tipo_mime(nombre))
+    registrar_documentos(usuario_ids, nombre, clave, tipo, tamano=len(contenido), sha256=sha256)
+    return clave
+
+
+def guardar_archivo(usuario_id: str, nombre: str, contenido: bytes, tipo: str | None = None) -> str:
+    """
+    Guarda el documento del usuario (como blob compartible) y devuelve su
+    clave por usuario, documentos/{usuario_id}/{nombre}: es la que se puede
+    guardar en otras tablas, y se resuelve al blob con `resolver_clave`.
+    """
+    compartir_archivo([usuario_id], nombre, contenido, tipo)
+    return clave_documento(usuario_id, nombre)
+
+
+def ruta_documento(usuario_id: str, nombre: str) -> str | None:
+    """Clave en el almacenamiento del documento (usuario, nombre), o None si no está registrado."""
+    try:
+        usuario_id = UUID(str(usuario_id))
+    except ValueError:
+        return None
+    with engine.connect() as conn:
+        return conn.execute(
+            select(Documento.ruta).where(Documento.usuario_id == usuario_id, Documento.nombre == nombre)
+        ).scalar()
+
+
+def _limite_subida() -> int:
+    return int(DOCUMENTOS_MAX_MB * 1024 * 1024)
+
+
+def _demasiado_grande():
+    return HTTPException(status_code=413, detail=f"El archivo supera el máximo de {DOCUMENTOS_MAX_MB:g} MB")
+
+
+async def leer_multipart(request: Request):
+    """
+    Recorre el cuerpo multipart/form-data según llega de request.stream(), sin
+    volcarlo antes a un temporal como hace UploadFile. Genera por cada parte
+    ("inicio", campo, filename), luego ("datos", trozo) y ("fin", None, None).
+    """
+    tipo, opciones = parse_options_header(request.headers.get("content-type"))
+    if tipo != b"multipart/form-data" or b"boundary" not in opciones:
+        raise HTTPException(status_code=400, detail="Se esperaba multipart/form-data")
+
+    # Los callbacks del parser son síncronos: apuntan lo que ven y se
+    # entrega después de cada write.
+    eventos = []
+    campo, valor = bytearray(), bytearray()
+    disposicion = b""
+
+    def leer_campo(datos, inicio, fin):
+        campo.extend(datos[inicio:fin])
+
+    def leer_valor(datos, inicio, fin):
+        valor.extend(datos[inicio:fin])
+
+    def fin_cabecera():
+        nonlocal disposicion
+        if campo.lower() == b"content-disposition":
+            disposicion = bytes(valor)
+        campo.clear()
+        valor.clear()
+
+    def fin_cabeceras():
+        _, partes = parse_options_header(disposicion)
+        filename = partes.get(b"filename")
+        eventos.append((
+            "inicio",
+            partes.get(b"name", b"").decode(),
+            filename.decode(errors="replace") if filename is not None else None,
+        ))
+
+    def leer_datos(datos, inicio, fin):
+        eventos.append(("datos", bytes(datos[inicio:fin]), None))
+
+    parser = MultipartParser(opciones[b"boundary"], {
+        "on_header_field": leer_campo,
+        "on_header_value": leer_valor,
+        "on_header_end": fin_cabecera,
+        "on_headers_finished": fin_cabeceras,
+        "on_part_data": leer_datos,
+        "on_part_end": lambda: eventos.append(("fin", None, None)),
+    })
+
+    recibidos = 0
+    try:
+        async for trozo in request.stream():
+            # Sin Content-Length (chunked) el límite se comprueba aquí.
+            recibidos += len(trozo)
+            if recibidos > _limite_subida() + SUBIDA_MAX_CAMPOS:
+                raise _demasiado_grande()
+            parser.write(trozo)
+            for evento in eventos:
+                yield evento
+            eventos.clear()
+        parser.finalize()
+    except FormParserError:
+        raise HTTPException(status_code=400, detail="Cuerpo multipart inválido")
+    for evento in eventos:
+        yield evento
+
+
+def resolver_clave(clave: str) -> str:
+    """
+    Clave en el almacenamiento de una clave por usuario: la ruta registrada
+    en documentos (el blob, si es compartido) o la propia clave si no lo está.
+    """
+    partes = clave.split("/")
+    if len(partes) == 3 and partes[0] == PREFIJO:
+        return ruta_documento(partes[1], partes[2]) or clave
+    return clave
+
+
+async def guardar_subida(usuario_id: str, nombre: str, trozos) -> tuple[str, int, str]:
+    """
+    Escribe los trozos de la subida (iterable asíncrono de bytes) en un
+    temporal local sin cargarla entera en memoria: las escrituras van al
+    threadpool para no bloquear el event loop y el sha256 se calcula sobre la
+    marcha. Solo si está completa se publica en el almacenamiento (os.replace
+    en local, subida multipart en S3). Devuelve (clave, tamaño, sha256); 413
+    si supera DOCUMENTOS_MAX_MB.
+    """
+    limite = _limite_subida()
+    clave = clave_documento(usuario_id, nombre)
+    ruta_tmp = await run_in_threadpool(almacenamiento.temporal, clave)
+
+    sha256 = hashlib.sha256()
+    tamano = 0
+    f = await run_in_threadpool(open, ruta_tmp, "wb")
+    try:
+        async for trozo in trozos:
+            tamano += len(trozo)
+            if tamano > limite:
+                raise _demasiado_grande()
+            sha256.update(trozo)
+            await run_in_threadpool(f.write, trozo)
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(almacenamiento.guardar_desde, clave, ruta_tmp, _tipo_mime(nombre))
+    finally:
+        if not f.closed:
+            await run_in_threadpool(f.close)
+        if os.path.exists(ruta_tmp):
+            await run_in_threadpool(os.remove, ruta_tmp)
 
-    return {"status": "ok", "archivo": archivo.filename}
+    return clave, tamano, sha256.hexdigest()
 
 
-@router.get("/descargar-semanal/{usuario_id}")
-def descargar_informe_semanal(
+def respuesta_documento(request: Request, clave: str, nombre: str, media_type: str | None = None):
+    """
+    Descarga en streaming desde el almacenamiento, sin cargar el archivo en
+    memoria, con Range/If-Range para reanudar y 304 si el cliente ya tiene
+    la versión actual (If-None-Match / If-Modified-Since).
+    """
+    return almacenamiento.respuesta(request, clave, nombre, media_type or _tipo_mime(nombre))
+
+
+CSV_LOTE_FILAS = 1000
+
+
+def _csv_fichajes(
     usuario_id: str,
-    week: str = Query(..., description="Semana YYYY-MM-DD"),
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    inicio: datetime,
+    fin: datetime,
+    nombre: str,
+    comprimir: bool,
+    clave_cache: str,
 ):
-    if user.rol != "admin" and str(user.id) != usuario_id:
-        raise HTTPException(status_code=403, detail="No autorizado")
+    """
+    Genera el CSV de fichajes por trozos según llegan las filas (cursor de
+    servidor con yield_per), escribiendo a la vez un temporal que al terminar
+    se copia a la caché de informes y se publica como documento del usuario.
+    Usa su propia sesión porque el cuerpo se envía después de cerrar las
+    dependencias de la petición.
+    """
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    clave = clave_documento(usuario_id, nombre)
+    ruta_tmp = almacenamiento.temporal(clave)
+    sha256 = hashlib.sha256()
+    tamano = 0
+
+    db = SessionLocal()
+    try:
+        resultado = db.execute(
+            select(Fichaje.tipo, Fichaje.fecha_hora)
+            .where(
+                Fichaje.usuario_id == usuario_id,
+                Fichaje.fecha_hora >= inicio,
+                Fichaje.fecha_hora < fin,
+            )
+            .order_by(Fichaje.fecha_hora.asc())
+            .execution_options(yield_per=CSV_LOTE_FILAS)
+        )
+
+        texto = StringIO()
+        escritor = csv.writer(texto, lineterminator="\n")
+        escritor.writerow(["Fecha", "Tipo", "Hora"])
+
+        with open(ruta_tmp, "wb") as copia:
+            for filas in chain([()], resultado.partitions()):
+                for tipo, fecha_hora in filas:
+                    escritor.writerow([fecha_hora.date(), tipo, fecha_hora.time()])
+
+                trozo = texto.getvalue().encode()
+                texto.seek(0)
+                texto.truncate()
+
+                copia.write(trozo)
+                sha256.update(trozo)
+                tamano += len(trozo)
+                yield compresor.compress(trozo) if compresor else trozo
+
+        cache_informes.guardar_copia(clave_cache, ruta_tmp)
+        almacenamiento.guardar_desde(clave, ruta_tmp, "text/csv")
+        registrar_documento(usuario_id, nombre, clave, "informe", tamano, sha256.hexdigest())
+        if compresor:
+            yield compresor.flush()
+    finally:
+        db.close()
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+
+
+def _leer_archivo(ruta: str, comprimir: bool):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    with open(ruta, "rb") as f:
+        while trozo := f.read(64 * 1024):
+            yield compresor.compress(trozo) if compresor else trozo
+    if compresor:
+        yield compresor.flush()
 
+
+def _clave_informe(db: Session, usuario_id: str, tipo: str, periodo: str, formato: str, sin_datos: str):
+    """Rango del periodo y clave de caché según la versión actual de sus fichajes."""
     try:
-        inicio_semana = datetime.strptime(week, "%Y-%m-%d")
-    except:
+        inicio, fin = rango_periodo(tipo, periodo)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Formato inválido")
 
-    fin_semana = inicio_semana + timedelta(days=7)
+    num_fichajes, ultima_creacion = db.execute(
+        cache_informes.consulta_version(usuario_id, inicio, fin)
+    ).one()
+    if not num_fichajes:
+        raise HTTPException(status_code=404, detail=sin_datos)
 
-    fichajes = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .filter(Fichaje.fecha_hora >= inicio_semana)
-        .filter(Fichaje.fecha_hora < fin_semana)
-        .order_by(Fichaje.fecha_hora.asc())
-        .all()
-    )
+    clave = cache_informes.clave(usuario_id, tipo, periodo, formato, num_fichajes, ultima_creacion)
+    return inicio, fin, clave
 
-    if not fichajes:
-        raise HTTPException(status_code=404, detail="No hay fichajes esta semana")
 
-    csv_data = "Fecha,Tipo,Hora\n"
-    for f in fichajes:
-        csv_data += f"{f.fecha_hora.date()},{f.tipo},{f.fecha_hora.time()}\n"
+def _restaurar_copia(usuario_id: str, filename: str, ruta_cache: str):
+    """Repone la copia del usuario si falta; si ya está no se reescribe."""
+    ruta = ruta_documento(usuario_id, filename)
+    if ruta is None or not almacenamiento.existe(ruta):
+        with open(ruta_cache, "rb") as f:
+            guardar_archivo(usuario_id, filename, f.read(), "informe")
 
-    filename = f"informe_{week}.csv"
 
-    guardar_archivo(usuario_id, filename, csv_data.encode())
+def _respuesta_csv(
+    request: Request,
+    db: Session,
+    usuario_id: str,
+    tipo: str,
+    periodo: str,
+    sin_datos: str,
+):
+    inicio, fin, clave = _clave_informe(db, usuario_id, tipo, periodo, "csv", sin_datos)
 
-    return StreamingResponse(
-        iter([csv_data.encode()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    comprimir = "gzip" in request.headers.get("accept-encoding", "").lower()
+    etag = cache_informes.etag(clave, "-gzip" if comprimir else "")
+    if cache_informes.coincide_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+    filename = nombre_informe(tipo, periodo, "csv")
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Vary": "Accept-Encoding",
+        "ETag": etag,
+    }
+    if comprimir:
+        headers["Content-Encoding"] = "gzip"
+
+    ruta_cache = cache_informes.obtener(clave)
+    if ruta_cache:
+        _restaurar_copia(usuario_id, filename, ruta_cache)
+        cuerpo = _leer_archivo(ruta_cache, comprimir)
+    else:
+        cuerpo = _csv_fichajes(usuario_id, inicio, fin, filename, comprimir, clave)
+
+    return StreamingResponse(cuerpo, media_type="text/csv", headers=headers)
+
+
+@router.post("/subir")
+async def subir_documento(request: Request, user=Depends(get_current_user)):
+    """
+    multipart/form-data con `archivo` y los campos usuario_id y tipo (también
+    valen como parámetros de la URL; en el formulario, antes del archivo).
+    El cuerpo se lee en streaming directamente al temporal de
+    guardar_subida, y si Content-Length ya supera el máximo se rechaza sin
+    leerlo.
+    """
+    longitud = request.headers.get("content-length")
+    if longitud and longitud.isdigit() and int(longitud) > _limite_subida() + SUBIDA_MAX_CAMPOS:
+        raise _demasiado_grande()
+
+    campos = dict(request.query_params)
+    subido = None
+    partes = leer_multipart(request)
+
+    async def datos_parte():
+        async for evento, trozo, _ in partes:
+            if evento == "fin":
+                return
+            yield trozo
+
+    async for evento, campo, filename in partes:
+        if evento != "inicio":
+            continue
+        if filename is None:
+            valor = bytearray()
+            async for trozo in datos_parte():
+                valor.extend(trozo)
+                if len(valor) > SUBIDA_MAX_CAMPOS:
+                    raise HTTPException(status_code=400, detail=f"Campo '{campo}' demasiado largo")
+            campos[campo] = valor.decode(errors="replace")
+            continue
+        if campo != "archivo" or subido is not None:
+            raise HTTPException(status_code=400, detail="Solo se admite un archivo, en el campo 'archivo'")
+
+        usuario_id = campos.get("usuario_id")
+        if not usuario_id:
+            raise HTTPException(status_code=400, detail="Falta usuario_id")
+        if user.rol != "admin" and str(user.id) != usuario_id:
+            raise HTTPException(status_code=403, detail="No autorizado")
+
+        nombre = os.path.basename(filename)
+        if not nombre:
+            raise HTTPException(status_code=400, detail="Nombre de archivo inválido")
+
+        subido = (usuario_id, nombre, *await guardar_subida(usuario_id, nombre, datos_parte()))
+
+    if subido is None:
+        raise HTTPException(status_code=400, detail="Falta el archivo")
+
+    usuario_id, nombre, clave, tamano, sha256 = subido
+    await run_in_threadpool(registrar_documento, usuario_id, nombre, clave, campos.get("tipo"), tamano, sha256)
+
+    return {"status": "ok", "archivo": nombre, "tamano": tamano, "sha256": sha256}
+
+
+@router.get("/descargar-semanal/{usuario_id}")
+def descargar_informe_semanal(
+    usuario_id: str,
+    request: Request,
+    week: str = Query(..., description="Semana YYYY-MM-DD"),
+    db: Session = Depends(get_db),
+    user=Depends(get_token_claims),
+):
+    if user.rol != "admin" and str(user.id) != usuario_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    return _respuesta_csv(request, db, usuario_id, "semanal", week, "No hay fichajes esta semana")
 
 @router.get("/listar/{usuario_id}")
 def listar_documentos(
     usuario_id: str,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_token_claims),
 ):
     docs = (
         db.query(Documento)
@@ -118,39 +538,90 @@ def listar_documentos(
 def descargar_documento(
     usuario_id: str,
     archivo: str,
-    user=Depends(get_current_user),
+    request: Request,
+    user=Depends(get_token_claims),
 ):
-    ruta = f"{BASE_DIR}/{usuario_id}/{archivo}"
+    # Los documentos compartidos apuntan a un blob; los no registrados siguen
+    # en su clave por usuario.
+    clave = ruta_documento(usuario_id, archivo) or clave_documento(usuario_id, archivo)
+    return respuesta_documento(request, clave, archivo)
+
 
-    if not os.path.exists(ruta):
+@router.get("/url/{usuario_id}/{archivo}")
+def url_documento(
+    usuario_id: str,
+    archivo: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user=Depends(get_token_claims),
+):
+    """
+    URL temporal (URL_FIRMADA_SEGUNDOS) para descargar el documento sin token:
+    con S3 apunta directamente al almacén y los bytes no pasan por la API; en
+    local es /documentos/firmado con un enlace firmado.
+    """
+    doc = db.execute(
+        select(Documento.ruta, Usuario.empresa_id)
+        .join(Usuario, Usuario.id == Documento.usuario_id)
+        .where(Documento.usuario_id == usuario_id, Documento.nombre == archivo)
+    ).first()
+    if not doc:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    with open(ruta, "rb") as f:
-        contenido = f.read()
+    es_admin = user.rol == "admin" and doc.empresa_id == user.empresa_id
+    if not es_admin and str(user.id) != usuario_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
 
-    return Response(
-        content=contenido,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={archivo}"},
-    )
+    expira = caducidad()
+    url = almacenamiento.url_firmada(doc.ruta, archivo)
+    if url is None:
+        token = jwt.encode({"clave": doc.ruta, "nombre": archivo, "exp": expira}, SECRET_KEY, algorithm=ALGORITHM)
+        url = str(request.url_for("descargar_firmado").include_query_params(token=token))
+
+    return {"url": url, "expira": expira.isoformat()}
+
+
+@router.get("/firmado", name="descargar_firmado")
+def descargar_firmado(token: str, request: Request):
+    try:
+        datos = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Enlace inválido o caducado")
+
+    if not datos.get("clave") or not datos.get("nombre"):
+        raise HTTPException(status_code=403, detail="Enlace inválido o caducado")
+
+    return respuesta_documento(request, datos["clave"], datos["nombre"])
 
 
 @router.get("/descargar-mensual/{usuario_id}")
 def descargar_informe_mensual(
     usuario_id: str,
+    request: Request,
     month: str = Query(..., description="Mes YYYY-MM"),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_token_claims),
 ):
-    try:
-        inicio = datetime.strptime(month, "%Y-%m")
-    except:
-        raise HTTPException(status_code=400, detail="Formato inválido")
+    return _respuesta_csv(request, db, usuario_id, "mensual", month, "No hay fichajes este mes")
+
+
+def _informe_pdf(request: Request, db: Session, usuario_id: str, tipo: str, periodo: str, sin_datos: str):
+    inicio, fin, clave = _clave_informe(db, usuario_id, tipo, periodo, "pdf", sin_datos)
 
-    fin = (inicio + timedelta(days=32)).replace(day=1)
+    etag = cache_informes.etag(clave)
+    if cache_informes.coincide_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    filename = nombre_informe(tipo, periodo, "pdf")
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "ETag": etag}
+
+    ruta_cache = cache_informes.obtener(clave)
+    if ruta_cache:
+        _restaurar_copia(usuario_id, filename, ruta_cache)
+        return FileResponse(ruta_cache, media_type="application/pdf", headers=headers)
 
     fichajes = (
-        db.query(Fichaje)
+        db.query(Fichaje.tipo, Fichaje.fecha_hora)
         .filter(Fichaje.usuario_id == usuario_id)
         .filter(Fichaje.fecha_hora >= inicio)
         .filter(Fichaje.fecha_hora < fin)
@@ -158,193 +629,58 @@ def descargar_informe_mensual(
         .all()
     )
 
-    if not fichajes:
-        raise HTTPException(status_code=404, detail="No hay fichajes este mes")
+    contenido = renderizar(pdf_por_dias, titulo_informe(tipo, periodo), [tuple(f) for f in fichajes])
 
-    csv_data = "Fecha,Tipo,Hora\n"
-    for f in fichajes:
-        csv_data += f"{f.fecha_hora.date()},{f.tipo},{f.fecha_hora.time()}\n"
+    guardar_archivo(usuario_id, filename, contenido, "informe")
+    cache_informes.guardar(clave, contenido)
 
-    filename = f"informe_mensual_{month}.csv"
-
-    guardar_archivo(usuario_id, filename, csv_data.encode())
-
-    return StreamingResponse(
-        iter([csv_data.encode()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    return Response(content=contenido, media_type="application/pdf", headers=headers)
 
 
 @router.get("/descargar-semanal-pdf/{usuario_id}")
 def descargar_informe_semanal_pdf(
     usuario_id: str,
+    request: Request,
     week: str = Query(...),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_token_claims),
 ):
-    try:
-        inicio_semana = datetime.strptime(week, "%Y-%m-%d")
-    except:
-        raise HTTPException(status_code=400, detail="Formato inválido")
-
-    fin_semana = inicio_semana + timedelta(days=7)
-
-    fichajes = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .filter(Fichaje.fecha_hora >= inicio_semana)
-        .filter(Fichaje.fecha_hora < fin_semana)
-        .order_by(Fichaje.fecha_hora.asc())
-        .all()
-    )
-
-    if not fichajes:
-        raise HTTPException(status_code=404, detail="No hay fichajes esta semana")
-
-    fichajes_por_dia = defaultdict(list)
-    for f in fichajes:
-        fichajes_por_dia[f.fecha_hora.date()].append(f)
-
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 60
-
-    pdf.setFont("Helvetica-Bold", 18)
-    pdf.drawString(50, y, f"Informe semanal de fichajes - {week}")
-    y -= 40
-
-    pdf.setFont("Helvetica", 12)
-
-    for dia, items in fichajes_por_dia.items():
-
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(40, y, dia.strftime("%A %d/%m/%Y"))
-        y -= 20
-
-        pdf.setStrokeColor(colors.grey)
-        pdf.line(40, y, width - 40, y)
-        y -= 20
-
-        pdf.setFont("Helvetica", 12)
-
-        for f in items:
-            txt = f"- {f.tipo.capitalize()} a las {f.fecha_hora.strftime('%H:%M:%S')}"
-            pdf.drawString(60, y, txt)
-            y -= 18
-
-            if y < 60:
-                pdf.showPage()
-                pdf.setFont("Helvetica", 12)
-                y = height - 60
-
-        y -= 15
-
-    pdf.save()
-    buffer.seek(0)
-
-    filename = f"informe_{week}.pdf"
-    guardar_archivo(usuario_id, filename, buffer.getvalue())
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    return _informe_pdf(request, db, usuario_id, "semanal", week, "No hay fichajes esta semana")
 
 @router.get("/descargar-mensual-pdf/{usuario_id}")
 def descargar_informe_mensual_pdf(
     usuario_id: str,
+    request: Request,
     month: str = Query(...),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(get_token_claims),
 ):
-    try:
-        inicio = datetime.strptime(month, "%Y-%m")
-    except:
-        raise HTTPException(status=400, detail="Formato inválido")
-
-    fin = (inicio + timedelta(days=32)).replace(day=1)
-
-    fichajes = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .filter(Fichaje.fecha_hora >= inicio)
-        .filter(Fichaje.fecha_hora < fin)
-        .order_by(Fichaje.fecha_hora.asc())
-        .all()
-    )
-
-    if not fichajes:
-        raise HTTPException(404, detail="No hay fichajes este mes")
-
-    fichajes_por_dia = defaultdict(list)
-    for f in fichajes:
-        fichajes_por_dia[f.fecha_hora.date()].append(f)
-
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 60
-
-    pdf.setFont("Helvetica-Bold", 18)
-    pdf.drawString(50, y, f"Informe mensual de fichajes - {month}")
-    y -= 40
-
-    pdf.setFont("Helvetica", 12)
-
-    for dia, items in fichajes_por_dia.items():
-
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(40, y, dia.strftime("%A %d/%m/%Y"))
-        y -= 20
-
-        pdf.setStrokeColor(colors.grey)
-        pdf.line(40, y, width - 40, y)
-        y -= 20
-
-        pdf.setFont("Helvetica", 12)
-
-        for f in items:
-            txt = f"- {f.tipo.capitalize()} a las {f.fecha_hora.strftime('%H:%M:%S')}"
-            pdf.drawString(60, y, txt)
-            y -= 18
-
-            if y < 60:
-                pdf.showPage()
-                pdf.setFont("Helvetica", 12)
-                y = height - 60
-
-        y -= 15
-
-    pdf.save()
-    buffer.seek(0)
-
-    filename = f"informe_mensual_{month}.pdf"
-    guardar_archivo(usuario_id, filename, buffer.getvalue())
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    return _informe_pdf(request, db, usuario_id, "mensual", month, "No hay fichajes este mes")
 
 @router.get("/descargar-por-nombre/{archivo}")
 def descargar_por_nombre(
     archivo: str,
-    user=Depends(get_current_user)
+    request: Request,
+    db: Session = Depends(get_db),
+    user=Depends(get_token_claims)
 ):
-    for root, dirs, files in os.walk(BASE_DIR):
-        if archivo in files:
-            ruta = os.path.join(root, archivo)
-            with open(ruta, "rb") as f:
-                contenido = f.read()
-
-            return Response(
-                content=contenido,
-                media_type="application/octet-stream",
-                headers={"Content-Disposition": f"attachment; filename={archivo}"}
-            )
+    """
+    Resuelve el nombre contra la tabla documentos (índice por nombre y
+    usuario), limitado a la empresa del usuario: un empleado solo ve sus
+    documentos y un admin los de su empresa, empezando por los suyos.
+    """
+    consulta = (
+        select(Documento.ruta)
+        .join(Usuario, Usuario.id == Documento.usuario_id)
+        .where(Documento.nombre == archivo, Usuario.empresa_id == user.empresa_id)
+        .order_by((Documento.usuario_id == user.id).desc(), Documento.fecha_subida.desc())
+        .limit(1)
+    )
+    if user.rol != "admin":
+        consulta = consulta.where(Documento.usuario_id == user.id)
+
+    clave = db.execute(consulta).scalar()
+    if clave is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    return respuesta_documento(request, clave, archivo)
@@ -1,14 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
 from app.database import get_db
 from app.models.usuario import Usuario
 from app.models.empresa import Empresa
-from app.security import SECRET_KEY, ALGORITHM
+from app.security import get_token_claims, TokenClaims
 
 router = APIRouter(prefix="/empresa", tags=["Empresa"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 PLAN_LIMITS = {
     "starter": 5,
@@ -17,28 +14,8 @@ PLAN_LIMITS = {
 }
 
 
-def get_user_from_token(token: str, db: Session):
-    """Decodifica el token JWT y obtiene el usuario correspondiente"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Token inválido")
-
-        user = db.query(Usuario).filter(Usuario.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
-
-        return user
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
-
-
 @router.get("/empleados")
-def get_empleados(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    user = get_user_from_token(token, db)
-
+def get_empleados(db: Session = Depends(get_db), user: TokenClaims = Depends(get_token_claims)):
     if user.rol != "admin":
         raise HTTPException(status_code=403, detail="Solo los administradores pueden ver los empleados")
 
@@ -57,8 +34,7 @@ def get_empleados(token: str = Depends(oauth2_scheme), db: Session = Depends(get
 
 
 @router.get("/datos")
-def get_empresa_datos(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    user = get_user_from_token(token, db)
+def get_empresa_datos(db: Session = Depends(get_db), user: TokenClaims = Depends(get_token_claims)):
     empresa = db.query(Empresa).filter(Empresa.id == user.empresa_id).first()
 
     if not empresa:
@@ -77,8 +53,7 @@ def get_empresa_datos(token: str = Depends(oauth2_scheme), db: Session = Depends
 
 
 @router.put("/actualizar")
-def update_empresa(data: dict, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    user = get_user_from_token(token, db)
+def update_empresa(data: dict, db: Session = Depends(get_db), user: TokenClaims = Depends(get_token_claims)):
     empresa = db.query(Empresa).filter(Empresa.id == user.empresa_id).first()
 
     if not empresa:
@@ -106,9 +81,8 @@ def update_empresa(data: dict, token: str = Depends(oauth2_scheme), db: Session
 
 
 @router.get("/verificar-limite")
-def verificar_limite(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def verificar_limite(db: Session = Depends(get_db), user: TokenClaims = Depends(get_token_claims)):
     """Endpoint opcional para que Flutter verifique antes de crear invitaciones"""
-    user = get_user_from_token(token, db)
     empresa = db.query(Empresa).filter(Empresa.id == user.empresa_id).first()
 
     if not empresa:
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app import eventos
+from app.database import AsyncSessionLocal
+from app.security import get_token_claims
+
+router = APIRouter(prefix="/eventos", tags=["Eventos"])
+
+LATIDO_SEGUNDOS = 20
+RECONEXION_MS = 3000
+
+
+async def _claims(request: Request, token: str | None):
+    """
+    EventSource no deja poner cabeceras, así que el JWT puede venir también
+    como ?token=. La sesión se cierra aquí mismo para no tener una conexión
+    ocupada mientras dure el stream.
+    """
+    autorizacion = request.headers.get("authorization", "")
+    if autorizacion.lower().startswith("bearer "):
+        token = autorizacion[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="No autenticado", headers={"WWW-Authenticate": "Bearer"})
+
+    async with AsyncSessionLocal() as db:
+        return await get_token_claims(token, db)
+
+
+def _sse(tipo: str, datos: dict) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+@router.get("/stream")
+async def stream_eventos(request: Request, token: str | None = Query(None)):
+    """
+    Server-Sent Events del usuario autenticado:
+
+    - notificacion: notificación personal nueva.
+    - difusion: mensaje nuevo a toda la empresa (solo empleados).
+    - fichaje: fichaje del usuario o, para los admins, de su empresa
+      (mismo formato que /fichajes/ultimo más usuario_id).
+    - resincronizar: se han podido perder eventos; recargar con `since`.
+
+    Cada LATIDO_SEGUNDOS se envía un comentario para que proxies y
+    balanceadores no cierren la conexión.
+    """
+    claims = await _claims(request, token)
+
+    async def cuerpo():
+        # Se suscribe al empezar a enviar: si el cliente se va antes,
+        # Starlette no llega a iterar el generador y no queda nada colgado.
+        suscripcion = eventos.suscribir(claims.id, claims.empresa_id, claims.rol)
+        try:
+            yield f"retry: {RECONEXION_MS}\n\n"
+            yield _sse("conectado", {"usuario_id": str(claims.id)})
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), LATIDO_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": latido\n\n"
+                    continue
+                yield _sse(evento["tipo"], evento["datos"])
+        finally:
+            eventos.desuscribir(suscripcion)
+
+    return StreamingResponse(
+        cuerpo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
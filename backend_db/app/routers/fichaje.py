@@ -1,50 +1,190 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from datetime import datetime, timezone
-from fastapi.responses import JSONResponse
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.database import get_db, get_async_db
 from app.models.fichaje import Fichaje
+from app.models.jornada import JornadaDiaria
+from app.jornadas import actualizar_jornadas
+from app.horas import calcular_horas
+from app.exportacion import FORMATOS, exportar_csv, exportar_columnar
 from fastapi.responses import Response
-from app.schemas.fichaje import FichajeResponse
-from app.security import get_current_user
-from io import BytesIO
-import pandas as pd
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from app.schemas.fichaje import FichajeLote, FichajeResponse
+from app.security import get_current_user_async, get_token_claims, get_admin_claims
+from app.informes import pdf_listado, renderizar, xlsx
+from app.eventos import publicar_async
+from app.models.estado_actual import EstadoActual
+from app.presencia import actualizar_estado_actual, tablero
+from app.ingesta import bloquear_usuarios, fichaje_repetido, guardar_clave, registrar_fichajes, resumen
+from app.models.usuario import Usuario
+from app import buffer_fichajes
 
 
 router = APIRouter(tags=["Fichajes"])
 
 VALID_TIPOS = ["entrada", "salida", "inicio_pausa", "fin_pausa"]
 
+
+def _rango_mes(year: int, month: int) -> tuple[date, date]:
+    """[primer día del mes, primer día del siguiente): toca una sola partición."""
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Mes inválido")
+    inicio = date(year, month, 1)
+    fin = date(year + month // 12, month % 12 + 1, 1)
+    return inicio, fin
+
+
+def _rango_dias(desde: date, hasta: date) -> tuple[datetime, datetime]:
+    """[desde 00:00 UTC, hasta+1 00:00 UTC), limitado a un año."""
+    if hasta < desde or (hasta - desde).days > 366:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido (máximo un año)")
+    inicio = datetime(desde.year, desde.month, desde.day, tzinfo=timezone.utc)
+    fin = datetime(hasta.year, hasta.month, hasta.day, tzinfo=timezone.utc) + timedelta(days=1)
+    return inicio, fin
+
+
+@router.post("/lote")
+async def registrar_lote(
+    lote: FichajeLote,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user_async),
+):
+    """
+    Alta de varios fichajes con la hora del cliente (sincronización offline,
+    terminales). Cada evento lleva una clave de idempotencia: reenviar el lote
+    tras un corte no duplica nada. Responde un resultado por evento
+    (creado, duplicado o rechazado con su motivo); ver app.ingesta.
+
+    Un empleado solo puede enviar sus fichajes; un admin, los de cualquier
+    empleado de su empresa indicando usuario_id.
+    """
+    ajenos = {e.usuario_id for e in lote.eventos if e.usuario_id and e.usuario_id != user.id}
+    if ajenos and user.rol != "admin":
+        raise HTTPException(status_code=403, detail="Solo puedes registrar tus propios fichajes")
+    if ajenos:
+        encontrados = set((
+            await db.execute(
+                select(Usuario.id).where(Usuario.id.in_(ajenos), Usuario.empresa_id == user.empresa_id)
+            )
+        ).scalars())
+        if ajenos - encontrados:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado en tu empresa")
+
+    resultados = await registrar_fichajes(db, [
+        {
+            "usuario_id": e.usuario_id or user.id,
+            "empresa_id": user.empresa_id,
+            "tipo": e.tipo,
+            "fecha_hora": e.fecha_hora,
+            "clave": e.clave,
+        }
+        for e in lote.eventos
+    ])
+    await db.commit()
+
+    return {**resumen(resultados), "resultados": resultados}
+
+
 @router.post("/{tipo}", response_model=FichajeResponse)
-def marcar_fichaje(tipo: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def marcar_fichaje(
+    tipo: str,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=100),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user_async),
+):
+    """
+    Los reintentos del cliente no crean fichajes de más: con la cabecera
+    Idempotency-Key se devuelve el fichaje creado la primera vez con esa
+    clave y, sin ella, un fichaje del mismo tipo que el último del usuario
+    dentro de FICHAJE_DEDUP_SEGUNDOS. En ambos casos responde el original con
+    Idempotent-Replayed: true, sin escribir nada.
+
+    Con FICHAJES_BUFFER=1 el fichaje se confirma en el buffer local y se
+    responde 202; llega a la BD en el siguiente volcado (app.buffer_fichajes).
+    """
 
     if tipo not in VALID_TIPOS:
         raise HTTPException(status_code=400, detail="Tipo de fichaje inválido")
 
+    ahora = datetime.now(timezone.utc)
+    if buffer_fichajes.buffer is not None:
+        return await _marcar_diferido(buffer_fichajes.buffer, tipo, idempotency_key, ahora, response, db, user)
+
+    # Dos reintentos simultáneos se atienden uno detrás de otro.
+    await bloquear_usuarios(db, [user.id])
+    repetido = await fichaje_repetido(db, user.id, tipo, idempotency_key, ahora)
+    if repetido is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return repetido
+
     fichaje = Fichaje(
         usuario_id=user.id,
         empresa_id=user.empresa_id,
         tipo=tipo,
-        fecha_hora=datetime.now(timezone.utc)
+        fecha_hora=ahora
     )
 
     db.add(fichaje)
-    db.commit()
-    db.refresh(fichaje)
+    await db.flush()
+    if idempotency_key is not None:
+        await guardar_clave(db, fichaje, idempotency_key)
+    await actualizar_jornadas(db, [fichaje])
+    await actualizar_estado_actual(db, [fichaje])
+    await publicar_async(
+        db, "fichaje",
+        {"usuario_id": str(user.id), "estado": fichaje.tipo, "hora": fichaje.fecha_hora.isoformat()},
+        audiencia="usuario_y_admins", usuario_id=user.id, empresa_id=user.empresa_id,
+    )
+    await db.commit()
+    await db.refresh(fichaje)
 
     return fichaje
 
 
+async def _marcar_diferido(buffer, tipo, idempotency_key, ahora, response, db, user):
+    repetido = buffer.repetido(user.id, tipo, idempotency_key, ahora)
+    if repetido is None and idempotency_key is not None:
+        # La clave puede ser de un fichaje ya volcado.
+        repetido = await fichaje_repetido(db, user.id, tipo, idempotency_key, ahora)
+        if repetido is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return repetido
+    if repetido is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        repetido = await buffer.encolar(user.id, user.empresa_id, tipo, idempotency_key, ahora)
+        response.status_code = 202
+
+    return {
+        "id": repetido["id"],
+        "usuario_id": repetido["usuario_id"],
+        "empresa_id": repetido["empresa_id"],
+        "tipo": repetido["tipo"],
+        "fecha_hora": repetido["fecha_hora"],
+        "fecha_creacion": repetido["fecha_hora"],
+    }
+
+
 @router.get("/", response_model=None)
-def historial(db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def historial(db: AsyncSession = Depends(get_async_db), user=Depends(get_token_claims)):
     fichajes = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == user.id)
-        .order_by(Fichaje.fecha_hora.desc())
-        .all()
-    )
+        await db.execute(
+            select(
+                Fichaje.id,
+                Fichaje.usuario_id,
+                Fichaje.empresa_id,
+                Fichaje.tipo,
+                Fichaje.fecha_hora,
+                Fichaje.fecha_creacion,
+            )
+            .where(Fichaje.usuario_id == user.id)
+            .order_by(Fichaje.fecha_hora.desc())
+        )
+    ).all()
 
     data = []
     for f in fichajes:
@@ -66,76 +206,134 @@ def historial(db: Session = Depends(get_db), user=Depends(get_current_user)):
 
     return JSONResponse(content=data)
 @router.get("/empleado/{usuario_id}/horas")
-def obtener_horas_empleado(usuario_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    registros = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .order_by(Fichaje.fecha_hora.asc())
-        .all()
+async def obtener_horas_empleado(
+    usuario_id: str,
+    desde: date | None = Query(None, description="Primer día (YYYY-MM-DD)"),
+    hasta: date | None = Query(None, description="Último día (YYYY-MM-DD)"),
+    limit: int | None = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_token_claims),
+):
+    consulta = (
+        select(JornadaDiaria.fecha, JornadaDiaria.segundos_trabajados)
+        .where(JornadaDiaria.usuario_id == usuario_id)
+        .order_by(JornadaDiaria.fecha.desc())
+        .offset(offset)
+        .limit(limit)
     )
+    if desde:
+        consulta = consulta.where(JornadaDiaria.fecha >= desde)
+    if hasta:
+        consulta = consulta.where(JornadaDiaria.fecha <= hasta)
+
+    jornadas = (await db.execute(consulta)).all()
+
+    return [
+        {"fecha": str(j.fecha), "horas": round(j.segundos_trabajados / 3600, 2)}
+        for j in jornadas
+    ]
+
+@router.get("/empresa/horas")
+async def obtener_horas_empresa(
+    desde: date = Query(..., description="Primer día (YYYY-MM-DD)"),
+    hasta: date = Query(..., description="Último día (YYYY-MM-DD)"),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_admin_claims),
+):
+    """Horas trabajadas y de pausa por empleado y día de toda la empresa."""
+    inicio, fin = _rango_dias(desde, hasta)
+
+    filas = (
+        await db.execute(
+            select(Fichaje.usuario_id, Fichaje.tipo, Fichaje.fecha_hora)
+            .where(
+                Fichaje.empresa_id == user.empresa_id,
+                Fichaje.fecha_hora >= inicio,
+                Fichaje.fecha_hora < fin,
+            )
+        )
+    ).all()
+
+    usuario_ids, tipos, fechas = zip(*filas) if filas else ((), (), ())
+    horas = await run_in_threadpool(calcular_horas, usuario_ids, tipos, fechas)
+
+    empleados = []
+    for usuario_id, dias in horas.sort_values(["usuario_id", "fecha"]).groupby("usuario_id", sort=False):
+        empleados.append({
+            "usuario_id": str(usuario_id),
+            "horas_totales": round(dias["segundos_trabajados"].sum() / 3600, 2),
+            "dias": [
+                {
+                    "fecha": str(d.fecha),
+                    "horas": round(d.segundos_trabajados / 3600, 2),
+                    "horas_pausa": round(d.segundos_pausa / 3600, 2),
+                }
+                for d in dias.itertuples()
+            ],
+        })
+
+    return {"desde": str(desde), "hasta": str(hasta), "empleados": empleados}
+
+
+@router.get("/empresa/exportar")
+async def exportar_fichajes_empresa(
+    desde: date = Query(..., description="Primer día (YYYY-MM-DD)"),
+    hasta: date = Query(..., description="Último día (YYYY-MM-DD)"),
+    formato: str = Query("csv", description="csv, parquet o arrow"),
+    user=Depends(get_admin_claims),
+):
+    """
+    Todos los fichajes de la empresa en el rango, en streaming y sin pasar por
+    el ORM: CSV mediante COPY TO STDOUT, Parquet/Arrow por lotes.
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato inválido (csv, parquet o arrow)")
+
+    inicio, fin = _rango_dias(desde, hasta)
+    media_type, extension = FORMATOS[formato]
+
+    if formato == "csv":
+        cuerpo = exportar_csv(user.empresa_id, inicio, fin)
+    else:
+        cuerpo = exportar_columnar(user.empresa_id, inicio, fin, formato)
+
+    return StreamingResponse(
+        cuerpo,
+        media_type=media_type,
+        headers={
+            "Content-Disposition":
+                f"attachment; filename=fichajes_{desde}_{hasta}.{extension}"
+        },
+    )
+
+
+@router.get("/empresa/presencia")
+async def presencia_empresa(
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_admin_claims),
+):
+    """
+    Quién está trabajando, en pausa o fuera ahora mismo en la empresa, con el
+    último fichaje de cada empleado. Se sirve desde memoria (app.presencia):
+    pensado para paneles que refrescan cada pocos segundos.
+    """
+    return await tablero(db, user.empresa_id)
 
-    if not registros:
-        return []
-
-    dias = {}
-    for r in registros:
-        fecha = r.fecha_hora.date()
-        dias.setdefault(fecha, []).append(r)
-
-    resultado = []
-
-    for fecha, eventos in dias.items():
-        total = 0
-        pausa_total = 0
-        entrada = None
-        pausa_ini = None
-        en_pausa = False
-
-        for e in eventos:
-            if e.tipo == "entrada":
-                if entrada:
-                    total += (e.fecha_hora - entrada).total_seconds() - pausa_total
-                entrada = e.fecha_hora
-                pausa_ini = None
-                pausa_total = 0
-                en_pausa = False
-
-            elif e.tipo == "inicio_pausa" and entrada and not en_pausa:
-                pausa_ini = e.fecha_hora
-                en_pausa = True
-
-            elif e.tipo == "fin_pausa" and pausa_ini and en_pausa:
-                pausa_total += (e.fecha_hora - pausa_ini).total_seconds()
-                pausa_ini = None
-                en_pausa = False
-
-            elif e.tipo == "salida" and entrada:
-                if en_pausa and pausa_ini:
-                    pausa_total += (e.fecha_hora - pausa_ini).total_seconds()
-                    en_pausa = False
-                total += (e.fecha_hora - entrada).total_seconds() - pausa_total
-                entrada = None
-                pausa_ini = None
-                pausa_total = 0
-
-        if entrada:
-            fin_jornada = eventos[-1].fecha_hora
-            total += (fin_jornada - entrada).total_seconds() - pausa_total
-
-        horas = round(total / 3600, 2)
-        resultado.append({"fecha": str(fecha), "horas": horas})
-
-    return sorted(resultado, key=lambda x: x["fecha"], reverse=True)
 
 @router.get("/ultimo/{usuario_id}")
-def ultimo_fichaje(usuario_id: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def ultimo_fichaje(
+    usuario_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_token_claims),
+):
 
     fichaje = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .order_by(Fichaje.fecha_hora.desc())
-        .first()
-    )
+        await db.execute(
+            select(EstadoActual.tipo, EstadoActual.fecha_hora)
+            .where(EstadoActual.usuario_id == usuario_id)
+        )
+    ).first()
 
     if not fichaje:
         return {"estado": "sin_registro"}
@@ -145,41 +343,30 @@ def ultimo_fichaje(usuario_id: str, db: Session = Depends(get_db), user=Depends(
         "hora": fichaje.fecha_hora.isoformat()
     }
 
-@router.get("/reporte/{usuario_id}/{year}/{month}/excel")
-def reporte_excel(usuario_id: str, year: int, month: int,
-                  db: Session = Depends(get_db),
-                  user=Depends(get_current_user)):
-
-    registros = (
-        db.query(Fichaje)
+def _filas_reporte(db: Session, usuario_id: str, year: int, month: int):
+    inicio, fin = _rango_mes(year, month)
+    return [
+        tuple(r)
+        for r in db.query(Fichaje.tipo, Fichaje.fecha_hora)
         .filter(Fichaje.usuario_id == usuario_id)
-        .filter(Fichaje.fecha_hora.between(
-            f"{year}-{month:02d}-01",
-            f"{year}-{month:02d}-31"
-        ))
+        .filter(Fichaje.fecha_hora >= inicio, Fichaje.fecha_hora < fin)
         .order_by(Fichaje.fecha_hora.asc())
         .all()
-    )
+    ]
 
-    if not registros:
-        return Response(status_code=404, content="No hay datos")
 
-    filas = []
-    for r in registros:
-        filas.append({
-            "Fecha": r.fecha_hora.date().isoformat(),
-            "Hora": r.fecha_hora.time().isoformat(),
-            "Tipo": r.tipo,
-        })
+@router.get("/reporte/{usuario_id}/{year}/{month}/excel")
+def reporte_excel(usuario_id: str, year: int, month: int,
+                  db: Session = Depends(get_db),
+                  user=Depends(get_token_claims)):
 
-    df = pd.DataFrame(filas)
+    registros = _filas_reporte(db, usuario_id, year, month)
 
-    output = BytesIO()
-    df.to_excel(output, index=False)
-    output.seek(0)
+    if not registros:
+        return Response(status_code=404, content="No hay datos")
 
     return Response(
-        content=output.read(),
+        content=renderizar(xlsx, registros),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={
             "Content-Disposition":
@@ -190,44 +377,22 @@ def reporte_excel(usuario_id: str, year: int, month: int,
 @router.get("/reporte/{usuario_id}/{year}/{month}/pdf")
 def reporte_pdf(usuario_id: str, year: int, month: int,
                 db: Session = Depends(get_db),
-                user=Depends(get_current_user)):
+                user=Depends(get_token_claims)):
 
-    registros = (
-        db.query(Fichaje)
-        .filter(Fichaje.usuario_id == usuario_id)
-        .filter(Fichaje.fecha_hora.between(
-            f"{year}-{month:02d}-01",
-            f"{year}-{month:02d}-31"
-        ))
-        .order_by(Fichaje.fecha_hora.asc())
-        .all()
-    )
+    registros = _filas_reporte(db, usuario_id, year, month)
 
     if not registros:
         return Response(status_code=404, content="No hay datos")
 
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-
-    c.drawString(50, 760, f"Reporte mensual de fichajes - {month}/{year}")
-    c.drawString(50, 740, f"Empleado: {usuario_id}")
-
-    y = 700
-    for r in registros:
-        c.drawString(
-            50, y,
-            f"{r.fecha_hora.date()} {r.fecha_hora.time()} - {r.tipo}"
-        )
-        y -= 16
-        if y < 50:
-            c.showPage()
-            y = 750
-
-    c.save()
-    buffer.seek(0)
+    contenido = renderizar(
+        pdf_listado,
+        f"Reporte mensual de fichajes - {month}/{year}",
+        f"Empleado: {usuario_id}",
+        registros,
+    )
 
     return Response(
-        content=buffer.read(),
+        content=contenido,
         media_type="application/pdf",
         headers={
             "Content-Disposition":
@@ -0,0 +1,112 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.cola_informes import encolar
+from app.informes import FORMATOS_INFORME, TIPOS_INFORME, rango_periodo
+from app.routers.documentos import resolver_clave, respuesta_documento
+from app.models.trabajo_informe import TrabajoInforme
+from app.models.usuario import Usuario
+from app.schemas.informe import InformeSolicitud
+from app.security import get_token_claims, TokenClaims
+
+router = APIRouter(prefix="/informes", tags=["Informes"])
+
+
+def _trabajo_dict(t: TrabajoInforme) -> dict:
+    return {
+        "id": str(t.id),
+        "usuario_id": str(t.usuario_id),
+        "tipo": t.tipo,
+        "periodo": t.periodo,
+        "formato": t.formato,
+        "estado": t.estado,
+        "intentos": t.intentos,
+        "archivo": os.path.basename(t.archivo) if t.archivo else None,
+        "error": t.error,
+        "fecha_creacion": t.fecha_creacion.isoformat() if t.fecha_creacion else None,
+        "fecha_fin": t.fecha_fin.isoformat() if t.fecha_fin else None,
+    }
+
+
+async def _obtener_trabajo(trabajo_id: str, db: AsyncSession, user: TokenClaims) -> TrabajoInforme:
+    trabajo = await db.get(TrabajoInforme, trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Informe no encontrado")
+
+    es_admin = user.rol == "admin" and trabajo.empresa_id == user.empresa_id
+    if not es_admin and trabajo.solicitante_id != user.id and trabajo.usuario_id != user.id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return trabajo
+
+
+@router.post("/", status_code=202)
+async def solicitar_informe(
+    data: InformeSolicitud,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenClaims = Depends(get_token_claims),
+):
+    """
+    Encola la generación de un informe y devuelve su id al momento. Cuando
+    esté listo llega una notificación de tipo "informe"; también se puede
+    consultar con GET /informes/{id}.
+    """
+    if data.tipo not in TIPOS_INFORME:
+        raise HTTPException(status_code=400, detail="Tipo de informe inválido (semanal o mensual)")
+    if data.formato not in FORMATOS_INFORME:
+        raise HTTPException(status_code=400, detail="Formato inválido (pdf, xlsx o csv)")
+    try:
+        rango_periodo(data.tipo, data.periodo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato inválido")
+
+    if user.rol != "admin" and user.id != data.usuario_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    empresa_id = (
+        await db.execute(select(Usuario.empresa_id).where(Usuario.id == data.usuario_id))
+    ).scalar()
+    if empresa_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    if empresa_id != user.empresa_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    trabajo = await encolar(
+        db, data.usuario_id, user.id, empresa_id, data.tipo, data.periodo, data.formato
+    )
+    return {"id": str(trabajo.id), "estado": trabajo.estado}
+
+
+@router.get("/{trabajo_id}")
+async def estado_informe(
+    trabajo_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenClaims = Depends(get_token_claims),
+):
+    return _trabajo_dict(await _obtener_trabajo(trabajo_id, db, user))
+
+
+@router.get("/{trabajo_id}/descargar")
+async def descargar_informe(
+    trabajo_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    user: TokenClaims = Depends(get_token_claims),
+):
+    trabajo = await _obtener_trabajo(trabajo_id, db, user)
+
+    if trabajo.estado != "completado":
+        raise HTTPException(status_code=409, detail=f"El informe está {trabajo.estado}")
+    if not trabajo.archivo:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    clave = await run_in_threadpool(resolver_clave, trabajo.archivo)
+    return await run_in_threadpool(
+        respuesta_documento,
+        request,
+        clave,
+        os.path.basename(trabajo.archivo),
+        FORMATOS_INFORME[trabajo.formato],
+    )
@@ -2,45 +2,24 @@ import requests
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from uuid import uuid4
-from jose import jwt, JWTError
-from fastapi.security import OAuth2PasswordBearer
 from app.database import get_db
 from app.models.usuario import Usuario
 from app.models.empresa import Empresa
 from app.models.invitacion import Invitacion
 from app.schemas.invitacion import InvitacionCreate, InvitacionResponse, RegistroEmpleado
-from app.security import SECRET_KEY, ALGORITHM, hash_password
+from app.security import hash_password, get_token_claims, TokenClaims
 
 router = APIRouter(prefix="/invitaciones", tags=["Invitaciones"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-
-def get_user_from_token(token: str, db: Session):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Token inválido")
-
-        user = db.query(Usuario).filter(Usuario.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
-
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
 
 
 @router.post("/enviar")
 def enviar_invitacion(
     data: InvitacionCreate,
-    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
+    user: TokenClaims = Depends(get_token_claims),
 ):
 
     try:
-        user = get_user_from_token(token, db)
-
         if user.rol != "admin":
             raise HTTPException(status_code=403, detail="Solo los administradores pueden enviar invitaciones")
 
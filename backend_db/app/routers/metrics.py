@@ -0,0 +1,38 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from app.auth_cache import principal_cache
+from app.database import engine, async_engine, DB_PGBOUNCER
+from app.db_metrics import metricas_pool, estado_pool
+
+router = APIRouter(prefix="/metrics", tags=["Métricas"])
+
+# Los contadores son de todo el proceso (todas las empresas), así que no se
+# abren a los admins: se pide este token compartido como
+# `Authorization: Bearer <METRICS_TOKEN>`. Sin token configurado no hay /metrics.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def verificar_token_metricas(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    autorizacion = request.headers.get("authorization", "")
+    token = autorizacion[7:] if autorizacion.lower().startswith("bearer ") else ""
+    if not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="No autenticado", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("", dependencies=[Depends(verificar_token_metricas)])
+def get_metrics():
+    """Contadores internos del proceso (caché de autenticación y pool de BD)"""
+    return {
+        "auth_cache": principal_cache.stats(),
+        "db_pool": {
+            "pgbouncer": DB_PGBOUNCER,
+            "sync": estado_pool(engine.pool),
+            "async": estado_pool(async_engine.pool),
+            "espera": metricas_pool.stats(),
+        },
+    }
@@ -1,42 +1,212 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Body
+from sqlalchemy import and_, case, exists, func, literal, literal_column, or_, select, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.models.difusion import Difusion, EstadoDifusion
 from app.models.notification import Notificacion
 from app.models.usuario import Usuario
-from app.security import get_current_user
-from datetime import datetime
+from app.security import get_token_claims, TokenClaims
+from app.routers.documentos import compartir_archivo, guardar_archivo
+from app.eventos import publicar
+from datetime import datetime, timezone
+from uuid import UUID
+import base64
+import binascii
 
 router = APIRouter(prefix="/notificaciones", tags=["Notificaciones"])
 
+# Las notificaciones de un usuario son la unión de dos fuentes:
+# - notificaciones: las personales, una fila por destinatario.
+# - difusiones: los mensajes a toda la empresa, una fila por envío. Cada
+#   empleado ve las enviadas desde su alta; su estado (leída / borrada) solo
+#   tiene fila en estados_difusion si lo cambió de una en una.
+# "Marcar todas como leídas" mueve Usuario.notificaciones_leidas_hasta: todo
+# lo enviado hasta esa marca cuenta como leído en ambas fuentes.
+
+
+def datos_notificacion(n, difusion: bool = False) -> dict:
+    """Formato de una notificación en /me y en los eventos en tiempo real."""
+    return {
+        "id": str(n.id),
+        "titulo": n.titulo,
+        "mensaje": n.mensaje,
+        "tipo": n.tipo,
+        "leida": bool(getattr(n, "leida", False)),
+        "fecha_envio": n.fecha_envio.isoformat() if n.fecha_envio else None,
+        "origen": n.origen,
+        "archivo": n.archivo,
+        "difusion": difusion,
+    }
+
+
+def difundir_notificacion(db: Session, empresa_id, titulo, mensaje, tipo, origen, archivo=None) -> Difusion:
+    """Registra el mensaje para toda la empresa con una sola fila. No hace commit."""
+    difusion = Difusion(
+        empresa_id=empresa_id,
+        titulo=titulo,
+        mensaje=mensaje,
+        tipo=tipo,
+        origen=origen,
+        archivo=archivo,
+        fecha_envio=datetime.utcnow(),
+    )
+    db.add(difusion)
+    db.flush()
+    return difusion
+
+
+def _usuario_actual(db: Session, current_user: TokenClaims):
+    usuario = db.execute(
+        select(
+            Usuario.id,
+            Usuario.empresa_id,
+            Usuario.rol,
+            Usuario.fecha_creacion,
+            Usuario.notificaciones_leidas_hasta,
+        ).where(Usuario.id == current_user.id)
+    ).first()
+    if not usuario:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return usuario
+
+
+def _leida(leida, fecha_envio, leidas_hasta):
+    if leidas_hasta is None:
+        return leida
+    return or_(leida, fecha_envio <= leidas_hasta)
+
+
+def consulta_notificaciones(usuario):
+    """Subconsulta con las notificaciones personales y las difusiones visibles del usuario."""
+    personales = select(
+        Notificacion.id,
+        Notificacion.titulo,
+        Notificacion.mensaje,
+        Notificacion.tipo,
+        _leida(Notificacion.leida.is_(True), Notificacion.fecha_envio, usuario.notificaciones_leidas_hasta).label("leida"),
+        Notificacion.fecha_envio,
+        Notificacion.origen,
+        Notificacion.archivo,
+        literal(False).label("difusion"),
+    ).where(Notificacion.usuario_id == usuario.id)
+
+    if usuario.rol != "empleado":
+        return personales.subquery()
+
+    difusiones = (
+        select(
+            Difusion.id,
+            Difusion.titulo,
+            Difusion.mensaje,
+            Difusion.tipo,
+            _leida(EstadoDifusion.leida.is_(True), Difusion.fecha_envio, usuario.notificaciones_leidas_hasta),
+            Difusion.fecha_envio,
+            Difusion.origen,
+            Difusion.archivo,
+            literal(True),
+        )
+        .outerjoin(
+            EstadoDifusion,
+            and_(EstadoDifusion.difusion_id == Difusion.id, EstadoDifusion.usuario_id == usuario.id),
+        )
+        .where(Difusion.empresa_id == usuario.empresa_id, EstadoDifusion.eliminada.isnot(True))
+    )
+    if usuario.fecha_creacion is not None:
+        difusiones = difusiones.where(Difusion.fecha_envio >= usuario.fecha_creacion)
+
+    return union_all(personales, difusiones).subquery()
+
+
+def _difusion_visible(db: Session, usuario, id: str):
+    if usuario.rol != "empleado":
+        return None
+    consulta = select(Difusion.id).where(Difusion.id == id, Difusion.empresa_id == usuario.empresa_id)
+    if usuario.fecha_creacion is not None:
+        consulta = consulta.where(Difusion.fecha_envio >= usuario.fecha_creacion)
+    return db.execute(consulta).scalar()
+
+
+def _cambiar_estado_difusion(db: Session, usuario_id, difusion_id, **estado):
+    stmt = pg_insert(EstadoDifusion).values(usuario_id=usuario_id, difusion_id=difusion_id, **estado)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[EstadoDifusion.usuario_id, EstadoDifusion.difusion_id],
+        set_=estado,
+    ))
+
+
+NOTIFICACIONES_POR_PAGINA = 50
+NOTIFICACIONES_MAX_PAGINA = 200
+
+
+def _utc_sin_zona(fecha: datetime) -> datetime:
+    """fecha_envio se guarda en UTC sin zona: así se comparan los filtros."""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def _codificar_cursor(fila) -> str:
+    return base64.urlsafe_b64encode(f"{fila.fecha_envio.isoformat()}|{fila.id}".encode()).decode()
+
+
+def _decodificar_cursor(cursor: str):
+    try:
+        fecha, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), UUID(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _paginar(db: Session, response: Response, notificaciones, cursor, since, limite):
+    """
+    Paginación por clave sobre (fecha_envio, id), de la más reciente a la más
+    antigua. El cursor de la página siguiente va en la cabecera
+    X-Siguiente-Cursor (sin cabecera = no hay más). `since` devuelve solo lo
+    enviado después de esa fecha, para sincronizar de forma incremental.
+    """
+    consulta = select(notificaciones)
+    if cursor:
+        fecha, id = _decodificar_cursor(cursor)
+        consulta = consulta.where(
+            tuple_(notificaciones.c.fecha_envio, notificaciones.c.id) < tuple_(literal(fecha), literal(id))
+        )
+    if since:
+        consulta = consulta.where(notificaciones.c.fecha_envio > _utc_sin_zona(since))
+
+    filas = db.execute(
+        consulta
+        .order_by(notificaciones.c.fecha_envio.desc(), notificaciones.c.id.desc())
+        .limit(limite + 1)
+    ).all()
+
+    if len(filas) > limite:
+        filas = filas[:limite]
+        response.headers["X-Siguiente-Cursor"] = _codificar_cursor(filas[-1])
+    return filas
+
+
 @router.get("/me")
 def get_my_notifications(
+    response: Response,
+    cursor: str | None = Query(None, description="X-Siguiente-Cursor de la página anterior"),
+    since: datetime | None = Query(None, description="Solo las enviadas después de esta fecha"),
+    limite: int = Query(NOTIFICACIONES_POR_PAGINA, ge=1, le=NOTIFICACIONES_MAX_PAGINA),
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_token_claims)
 ):
-    notificaciones = (
-        db.query(Notificacion)
-        .filter(Notificacion.usuario_id == current_user.id)
-        .order_by(Notificacion.fecha_envio.desc())
-        .all()
-    )
-    return [
-        {
-            "id": str(n.id),
-            "titulo": n.titulo,
-            "mensaje": n.mensaje,
-            "tipo": n.tipo,
-            "leida": n.leida,
-            "fecha_envio": n.fecha_envio.isoformat() if n.fecha_envio else None,
-            "origen": n.origen,
-            "archivo": n.archivo,   
-        }
-        for n in notificaciones
-    ]
+    notificaciones = consulta_notificaciones(_usuario_actual(db, current_user))
+    filas = _paginar(db, response, notificaciones, cursor, since, limite)
+    return [datos_notificacion(n, n.difusion) for n in filas]
 
 @router.get("/enviadas")
 def get_sent_notifications(
+    response: Response,
+    cursor: str | None = Query(None, description="X-Siguiente-Cursor de la página anterior"),
+    since: datetime | None = Query(None, description="Solo las enviadas después de esta fecha"),
+    limite: int = Query(NOTIFICACIONES_POR_PAGINA, ge=1, le=NOTIFICACIONES_MAX_PAGINA),
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_token_claims)
 ):
     if current_user.rol != "admin":
         raise HTTPException(
@@ -44,15 +214,32 @@ def get_sent_notifications(
             detail="Solo los administradores pueden ver esta información."
         )
 
-    notificaciones = (
-        db.query(Notificacion)
-        .filter(
-            Notificacion.empresa_id == current_user.empresa_id,
-            Notificacion.origen == "admin"
-        )
-        .order_by(Notificacion.fecha_envio.desc())
-        .all()
+    personales = select(
+        Notificacion.id,
+        Notificacion.titulo,
+        Notificacion.mensaje,
+        Notificacion.tipo,
+        Notificacion.fecha_envio,
+        Notificacion.usuario_id.cast(Notificacion.archivo.type).label("destinatario"),
+        Notificacion.archivo,
+    ).where(
+        Notificacion.empresa_id == current_user.empresa_id,
+        Notificacion.origen == "admin"
     )
+    difusiones = select(
+        Difusion.id,
+        Difusion.titulo,
+        Difusion.mensaje,
+        Difusion.tipo,
+        Difusion.fecha_envio,
+        literal("todos"),
+        Difusion.archivo,
+    ).where(
+        Difusion.empresa_id == current_user.empresa_id,
+        Difusion.origen == "admin"
+    )
+    enviadas = union_all(personales, difusiones).subquery()
+    notificaciones = _paginar(db, response, enviadas, cursor, since, limite)
 
     return [
         {
@@ -61,34 +248,98 @@ def get_sent_notifications(
             "mensaje": n.mensaje,
             "tipo": n.tipo,
             "fecha_envio": n.fecha_envio.isoformat() if n.fecha_envio else None,
-            "destinatario": str(n.usuario_id),
+            "destinatario": n.destinatario,
             "archivo": n.archivo, 
         }
         for n in notificaciones
     ]
 
+@router.get("/no-leidas")
+def count_unread(
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_token_claims)
+):
+    """
+    Contador para el globo de no leídas, en una sola consulta: las personales
+    salen del índice parcial ix_notificaciones_no_leidas y las difusiones de
+    ix_difusiones_empresa_fecha (solo las posteriores a la marca de leídas).
+    """
+    menos_infinito = literal_column("'-infinity'::timestamp")
+    leidas_hasta = func.coalesce(Usuario.notificaciones_leidas_hasta, menos_infinito)
+
+    personales = (
+        select(func.count())
+        .select_from(Notificacion)
+        .where(
+            Notificacion.usuario_id == Usuario.id,
+            Notificacion.leida == False,
+            Notificacion.fecha_envio > leidas_hasta,
+        )
+        .scalar_subquery()
+    )
+    difusiones = (
+        select(func.count())
+        .select_from(Difusion)
+        .where(
+            Difusion.empresa_id == Usuario.empresa_id,
+            Difusion.fecha_envio > leidas_hasta,
+            Difusion.fecha_envio >= func.coalesce(Usuario.fecha_creacion, menos_infinito),
+            ~exists().where(
+                EstadoDifusion.usuario_id == Usuario.id,
+                EstadoDifusion.difusion_id == Difusion.id,
+                or_(EstadoDifusion.leida, EstadoDifusion.eliminada),
+            ),
+        )
+        .scalar_subquery()
+    )
+
+    no_leidas = db.execute(
+        select(personales + case((Usuario.rol == "empleado", difusiones), else_=0))
+        .where(Usuario.id == current_user.id)
+    ).scalar()
+    return {"no_leidas": no_leidas or 0}
+
+
 @router.post("/mark_all")
 def mark_all_read(
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_token_claims)
 ):
-    updated = (
+    db.execute(
+        update(Usuario)
+        .where(Usuario.id == current_user.id)
+        .values(notificaciones_leidas_hasta=datetime.utcnow())
+    )
+    db.commit()
+    return {"message": "Notificaciones marcadas como leídas"}
+
+
+@router.post("/{id}/leida")
+def mark_read(
+    id: str,
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_token_claims)
+):
+    actualizada = (
         db.query(Notificacion)
-        .filter(
-            Notificacion.usuario_id == current_user.id,
-            Notificacion.leida == False
-        )
+        .filter(Notificacion.id == id, Notificacion.usuario_id == current_user.id)
         .update({Notificacion.leida: True})
     )
+    if not actualizada:
+        usuario = _usuario_actual(db, current_user)
+        if not _difusion_visible(db, usuario, id):
+            raise HTTPException(status_code=404, detail="Notificación no encontrada")
+        _cambiar_estado_difusion(db, usuario.id, id, leida=True)
+
     db.commit()
-    return {"message": f"{updated} notificaciones marcadas como leídas"}
+    return {"message": "Notificación marcada como leída"}
 
 
 @router.post("/enviar")
 def enviar_mensaje(
     data: dict = Body(...),
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_token_claims)
 ):
     if current_user.rol != "admin":
         raise HTTPException(
@@ -113,43 +364,20 @@ def enviar_mensaje(
         raise HTTPException(status_code=400, detail="El admin no tiene empresa asociada")
 
 
-    def guardar_archivo(usuario_id: str, nombre: str, contenido: bytes):
-        from app.routers.documentos import BASE_DIR
-        import os
-
-        ruta_dir = f"{BASE_DIR}/{usuario_id}/"
-        os.makedirs(ruta_dir, exist_ok=True)
-
-        ruta_archivo = os.path.join(ruta_dir, nombre)
-
-        with open(ruta_archivo, "wb") as f:
-            f.write(contenido)
-
-        return ruta_archivo
-
     if todos:
-        empleados = (
-            db.query(Usuario)
-            .filter(Usuario.empresa_id == empresa_id, Usuario.rol == "empleado")
-            .all()
-        )
+        difusion = difundir_notificacion(db, empresa_id, titulo, mensaje, tipo, origen, archivo)
+        publicar(db, "difusion", datos_notificacion(difusion, True), audiencia="empleados", empresa_id=empresa_id)
 
-        for emp in empleados:
-
-            if tipo == "documento" and archivo and contenido_archivo:
-                guardar_archivo(emp.id, archivo, contenido_archivo.encode())
-
-            notif = Notificacion(
-                usuario_id=emp.id,
-                empresa_id=empresa_id,
-                titulo=titulo,
-                mensaje=mensaje,
-                tipo=tipo,
-                origen=origen,
-                archivo=archivo,
-                fecha_envio=datetime.utcnow(),
-            )
-            db.add(notif)
+        empleados = select(Usuario.id).where(Usuario.empresa_id == empresa_id, Usuario.rol == "empleado")
+        if tipo == "documento" and archivo and contenido_archivo:
+            # El documento se escribe una sola vez y cada empleado recibe una
+            # referencia a él, en lugar de una copia por empleado.
+            usuario_ids = db.execute(empleados).scalars().all()
+            if usuario_ids:
+                compartir_archivo(usuario_ids, archivo, contenido_archivo.encode(), tipo)
+            enviados = len(usuario_ids)
+        else:
+            enviados = db.execute(select(func.count()).select_from(empleados.subquery())).scalar()
 
     else:
         if not usuario_id:
@@ -159,7 +387,7 @@ def enviar_mensaje(
             )
 
         if tipo == "documento" and archivo and contenido_archivo:
-            guardar_archivo(usuario_id, archivo, contenido_archivo.encode())
+            guardar_archivo(usuario_id, archivo, contenido_archivo.encode(), tipo)
 
         notif = Notificacion(
             usuario_id=usuario_id,
@@ -172,16 +400,19 @@ def enviar_mensaje(
             fecha_envio=datetime.utcnow(),
         )
         db.add(notif)
+        db.flush()
+        publicar(db, "notificacion", datos_notificacion(notif), audiencia="usuario", usuario_id=usuario_id)
+        enviados = 1
 
     db.commit()
-    return {"message": "Mensaje enviado correctamente"}
+    return {"message": "Mensaje enviado correctamente", "enviados": enviados}
 
 
 @router.delete("/{id}")
 def delete_notification(
     id: str,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_token_claims)
 ):
     notificacion = (
         db.query(Notificacion)
@@ -191,9 +422,14 @@ def delete_notification(
         )
         .first()
     )
-    if not notificacion:
-        raise HTTPException(status_code=404, detail="Notificación no encontrada")
+    if notificacion:
+        db.delete(notificacion)
+    else:
+        # Una difusión no se borra: se oculta solo para este usuario.
+        usuario = _usuario_actual(db, current_user)
+        if not _difusion_visible(db, usuario, id):
+            raise HTTPException(status_code=404, detail="Notificación no encontrada")
+        _cambiar_estado_difusion(db, usuario.id, id, eliminada=True)
 
-    db.delete(notificacion)
     db.commit()
     return {"message": "Notificación eliminada correctamente"}
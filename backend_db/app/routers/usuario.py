@@ -1,32 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
 from app.database import get_db
 from app.models.usuario import Usuario
 from app.models.empresa import Empresa
-from app.security import SECRET_KEY, ALGORITHM, get_current_user  
+from app.security import get_admin_claims, TokenClaims
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-def get_user_from_token(token: str, db: Session):
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    user_email = payload.get("sub")
-    user = db.query(Usuario).filter(Usuario.email == user_email).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="Usuario no encontrado")
-    return user
-
 @router.get("/empleados")
 def listar_empleados(
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: TokenClaims = Depends(get_admin_claims)
 ):
-    if current_user.rol != "admin":
-        raise HTTPException(status_code=403, detail="No autorizado")
-
     empleados = (
         db.query(Usuario, Empresa)
         .join(Empresa, Usuario.empresa_id == Empresa.id)
@@ -8,6 +8,8 @@ class DocumentoSchema(BaseModel):
     nombre: str
     ruta: str
     tipo: str | None
+    tamano: int | None = None
+    sha256: str | None = None
     fecha_subida: datetime
 
     class Config:
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, UUID4
+from pydantic import BaseModel, Field, UUID4
 from datetime import datetime
 
 class FichajeCreate(BaseModel):
@@ -17,3 +17,17 @@ class FichajeResponse(BaseModel):
         from_attributes = True
 
 
+
+
+class FichajeLoteItem(BaseModel):
+    tipo: str
+    # Hora del cliente; sin zona se interpreta como UTC.
+    fecha_hora: datetime
+    # Clave de idempotencia generada por el cliente (p. ej. un UUID por evento).
+    clave: str = Field(..., min_length=1, max_length=100)
+    # Solo para admins (terminales de fichaje): empleado de su empresa.
+    usuario_id: UUID4 | None = None
+
+
+class FichajeLote(BaseModel):
+    eventos: list[FichajeLoteItem] = Field(..., min_length=1, max_length=500)
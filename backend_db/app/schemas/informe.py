@@ -0,0 +1,8 @@
+from pydantic import BaseModel, UUID4
+
+
+class InformeSolicitud(BaseModel):
+    usuario_id: UUID4
+    tipo: str                # semanal | mensual
+    periodo: str             # YYYY-MM-DD (semana) | YYYY-MM (mes)
+    formato: str = "pdf"     # pdf | xlsx | csv
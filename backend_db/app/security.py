@@ -1,11 +1,15 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from uuid import UUID
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from app.models.usuario import Usuario
+from app.auth_cache import principal_cache, UsuarioActual
 
 SECRET_KEY = "supersecretomuyseguro"
 ALGORITHM = "HS256"
@@ -30,43 +34,147 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    """
-    Obtiene el usuario autenticado desde el token JWT.
-    Soporta 'sub' como UUID o email, con logs de depuración.
-    """
-    print("🪪 TOKEN RECIBIDO EN BACKEND →", token[:50], "..." if len(token) > 50 else "")
 
-    credentials_exception = HTTPException(
+
+def _cargar_usuario(sub_value: str, db: Session) -> Usuario | None:
+    """Busca el usuario del token; 'sub' puede ser UUID o email (tokens antiguos)."""
+    try:
+        UUID(sub_value)
+    except ValueError:
+        return db.query(Usuario).filter(Usuario.email == sub_value).first()
+
+    user = db.query(Usuario).filter(Usuario.id == sub_value).first()
+    if not user:
+        user = db.query(Usuario).filter(Usuario.email == sub_value).first()
+    return user
+
+
+async def _cargar_usuario_async(sub_value: str, db: AsyncSession) -> Usuario | None:
+    """Versión asíncrona de _cargar_usuario."""
+    try:
+        UUID(sub_value)
+    except ValueError:
+        return (await db.execute(select(Usuario).where(Usuario.email == sub_value))).scalars().first()
+
+    user = (await db.execute(select(Usuario).where(Usuario.id == sub_value))).scalars().first()
+    if not user:
+        user = (await db.execute(select(Usuario).where(Usuario.email == sub_value))).scalars().first()
+    return user
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token inválido o expirado",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def decodificar_token(token: str) -> dict:
+    """Verifica la firma y expiración del JWT y devuelve su payload."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print("📦 PAYLOAD DECODIFICADO:", payload)
+    except JWTError:
+        raise _credentials_exception()
+
+    if not payload.get("sub"):
+        raise _credentials_exception()
+
+    return payload
 
-        sub_value: str = payload.get("sub")
-        if not sub_value:
-            print("❌ El campo 'sub' no existe en el payload")
-            raise credentials_exception
 
-        user = db.query(Usuario).filter(Usuario.id == sub_value).first()
+def resolver_usuario(sub_value: str, db: Session) -> UsuarioActual:
+    """Devuelve el usuario del 'sub' desde la caché o, si no está, desde la BD."""
+    principal = principal_cache.get(sub_value)
+    if principal is not None:
+        return principal
 
-        if not user:
-            user = db.query(Usuario).filter(Usuario.email == sub_value).first()
+    user = _cargar_usuario(sub_value, db)
+    if not user:
+        raise _credentials_exception()
 
-        if not user:
-            print(f"❌ Usuario no encontrado para sub={sub_value}")
-            raise credentials_exception
+    principal = UsuarioActual.desde_modelo(user)
+    principal_cache.put(sub_value, principal)
+    return principal
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """
+    Dependencia "usuario completo": obtiene el usuario autenticado desde el
+    token JWT. Soporta 'sub' como UUID o email. El usuario se sirve desde la
+    caché de principales, de modo que normalmente no se ejecuta ninguna consulta.
+    """
+    payload = decodificar_token(token)
+    return resolver_usuario(payload["sub"], db)
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Igual que get_current_user pero sin salir del event loop: pensada para
+    los endpoints `async def`, que así no ocupan un hilo del threadpool.
+    """
+    payload = decodificar_token(token)
+    sub_value = payload["sub"]
+
+    principal = principal_cache.get(sub_value)
+    if principal is not None:
+        return principal
+
+    user = await _cargar_usuario_async(sub_value, db)
+    if not user:
+        raise _credentials_exception()
+
+    principal = UsuarioActual.desde_modelo(user)
+    principal_cache.put(sub_value, principal)
+    return principal
+
+
+class TokenClaims:
+    """Identidad del usuario tal y como viene firmada en el JWT."""
+
+    __slots__ = ("id", "rol", "empresa_id")
+
+    def __init__(self, id, rol, empresa_id):
+        self.id = id
+        self.rol = rol
+        self.empresa_id = empresa_id
+
+    def __repr__(self):
+        return f"<TokenClaims {self.id} ({self.rol})>"
+
+
+async def get_token_claims(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> TokenClaims:
+    """
+    Dependencia "solo claims": responde con id, rol y empresa_id del token
+    sin consultar la BD. Los cambios de rol o empresa se reflejan al renovar
+    el token. Los tokens antiguos sin esos claims se resuelven como usuario
+    completo (la sesión solo abre conexión en ese caso). Es `async` para
+    no ocupar un hilo del threadpool en cada petición.
+    """
+    payload = decodificar_token(token)
+
+    try:
+        return TokenClaims(
+            id=UUID(payload["sub"]),
+            rol=payload["rol"],
+            empresa_id=UUID(payload["empresa_id"]) if payload["empresa_id"] else None,
+        )
+    except (KeyError, ValueError):
+        user = await get_current_user_async(token, db)
+        return TokenClaims(id=user.id, rol=user.rol, empresa_id=user.empresa_id)
 
-        print(f"✅ Usuario autenticado: {user.email} ({user.rol})")
-        return user
 
-    except JWTError as e:
-        print(f"❌ Error JWT: {e}")
-        raise credentials_exception
+async def get_admin_claims(claims: TokenClaims = Depends(get_token_claims)) -> TokenClaims:
+    """Como get_token_claims, pero exige rol de administrador."""
+    if claims.rol != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return claims
@@ -0,0 +1,104 @@
+"""Esquema inicial (el que creaban init.sql y Base.metadata.create_all)
+
+Es idempotente para poder aplicarse sobre bases de datos ya existentes:
+solo crea lo que falta.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+    op.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS empresas (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            nombre VARCHAR(150) NOT NULL,
+            nombre_admin VARCHAR(150) NOT NULL,
+            email_admin VARCHAR(150) NOT NULL UNIQUE,
+            plan VARCHAR(30) NOT NULL DEFAULT 'starter',
+            max_empleados INT NOT NULL,
+            fecha_creacion TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    op.execute("ALTER TABLE empresas ADD COLUMN IF NOT EXISTS plan VARCHAR(30) NOT NULL DEFAULT 'starter'")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            empresa_id UUID NOT NULL REFERENCES empresas(id) ON DELETE CASCADE,
+            email VARCHAR(150) NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            nombre VARCHAR(100) NOT NULL,
+            apellidos VARCHAR(100),
+            dni VARCHAR(20),
+            rol VARCHAR(20) NOT NULL CHECK (rol IN ('admin','empleado')),
+            activo BOOLEAN DEFAULT TRUE,
+            fecha_creacion TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS invitaciones (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            empresa_id UUID NOT NULL REFERENCES empresas(id) ON DELETE CASCADE,
+            email VARCHAR(150) NOT NULL,
+            token UUID NOT NULL UNIQUE,
+            usada BOOLEAN DEFAULT FALSE,
+            enviada BOOLEAN DEFAULT FALSE,
+            fecha_creacion TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS fichajes (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+            empresa_id UUID NOT NULL REFERENCES empresas(id) ON DELETE CASCADE,
+            tipo VARCHAR(30) NOT NULL CHECK (tipo IN ('entrada','salida','inicio_pausa','fin_pausa')),
+            fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(),
+            fecha_creacion TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS notificaciones (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            usuario_id UUID NOT NULL REFERENCES usuarios(id),
+            empresa_id UUID NOT NULL REFERENCES empresas(id),
+            titulo VARCHAR(150) NOT NULL,
+            mensaje TEXT NOT NULL,
+            tipo VARCHAR(30) NOT NULL,
+            leida BOOLEAN DEFAULT FALSE,
+            fecha_envio TIMESTAMP NOT NULL DEFAULT NOW(),
+            origen VARCHAR(50) DEFAULT 'sistema',
+            fecha_lectura TIMESTAMP NULL,
+            archivo TEXT NULL
+        )
+    """)
+    op.execute("ALTER TABLE notificaciones ADD COLUMN IF NOT EXISTS archivo TEXT NULL")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS documentos (
+            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+            nombre VARCHAR(255) NOT NULL,
+            ruta TEXT NOT NULL,
+            tipo VARCHAR(50) DEFAULT 'general',
+            fecha_subida TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def downgrade():
+    for tabla in ("documentos", "notificaciones", "fichajes", "invitaciones", "usuarios", "empresas"):
+        op.execute(f"DROP TABLE IF EXISTS {tabla}")
@@ -0,0 +1,41 @@
+"""Índices compuestos para las consultas calientes
+
+- fichajes por usuario ordenados por fecha (historial, último fichaje,
+  horas, informes) y por empresa en un rango (exportaciones).
+- notificaciones por usuario y por empresa/origen ordenadas por envío.
+- documentos por usuario ordenados por subida.
+- usuarios por empresa y rol (listados de empleados, límites del plan).
+
+Se crean CONCURRENTLY para no bloquear escrituras en tablas grandes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDICES = [
+    ("ix_fichajes_usuario_fecha", "fichajes (usuario_id, fecha_hora DESC)"),
+    ("ix_fichajes_empresa_fecha", "fichajes (empresa_id, fecha_hora)"),
+    ("ix_notificaciones_usuario_fecha", "notificaciones (usuario_id, fecha_envio DESC)"),
+    ("ix_notificaciones_empresa_origen_fecha", "notificaciones (empresa_id, origen, fecha_envio DESC)"),
+    ("ix_documentos_usuario_fecha", "documentos (usuario_id, fecha_subida DESC)"),
+    ("ix_usuarios_empresa_rol", "usuarios (empresa_id, rol)"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nombre, definicion in INDICES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nombre, _ in INDICES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
@@ -0,0 +1,84 @@
+"""Particiona fichajes por mes sobre fecha_hora
+
+La tabla se recrea como `PARTITION BY RANGE (fecha_hora)` con una
+partición por mes (fichajes_pAAAA_MM) desde el primer fichaje hasta tres
+meses vista, más una partición DEFAULT de seguridad. La clave primaria
+pasa a ser (id, fecha_hora), ya que en Postgres debe incluir la clave de
+partición. El resto de meses los crea/archiva app/particiones.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE fichajes RENAME TO fichajes_sin_particionar")
+
+    op.execute("""
+        CREATE TABLE fichajes (
+            LIKE fichajes_sin_particionar INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE (fecha_hora)
+    """)
+
+    op.execute("""
+        DO $$
+        DECLARE
+            mes DATE;
+            ultimo DATE := (date_trunc('month', NOW()) + INTERVAL '3 months')::date;
+        BEGIN
+            SELECT COALESCE(date_trunc('month', MIN(fecha_hora)), date_trunc('month', NOW()))::date
+              INTO mes FROM fichajes_sin_particionar;
+
+            WHILE mes <= ultimo LOOP
+                EXECUTE format(
+                    'CREATE TABLE fichajes_p%s PARTITION OF fichajes FOR VALUES FROM (%L) TO (%L)',
+                    to_char(mes, 'YYYY_MM'), mes, (mes + INTERVAL '1 month')::date
+                );
+                mes := (mes + INTERVAL '1 month')::date;
+            END LOOP;
+        END $$
+    """)
+    op.execute("CREATE TABLE fichajes_default PARTITION OF fichajes DEFAULT")
+
+    op.execute("INSERT INTO fichajes SELECT * FROM fichajes_sin_particionar")
+    op.execute("DROP TABLE fichajes_sin_particionar")
+
+    op.execute("ALTER TABLE fichajes ADD PRIMARY KEY (id, fecha_hora)")
+    op.execute("""
+        ALTER TABLE fichajes
+            ADD CONSTRAINT fichajes_usuario_id_fkey
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+            ADD CONSTRAINT fichajes_empresa_id_fkey
+                FOREIGN KEY (empresa_id) REFERENCES empresas(id) ON DELETE CASCADE
+    """)
+    op.execute("CREATE INDEX ix_fichajes_usuario_fecha ON fichajes (usuario_id, fecha_hora DESC)")
+    op.execute("CREATE INDEX ix_fichajes_empresa_fecha ON fichajes (empresa_id, fecha_hora)")
+
+
+def downgrade():
+    op.execute("ALTER TABLE fichajes RENAME TO fichajes_particionada")
+    op.execute("""
+        CREATE TABLE fichajes (
+            LIKE fichajes_particionada INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        )
+    """)
+    op.execute("INSERT INTO fichajes SELECT * FROM fichajes_particionada")
+    op.execute("DROP TABLE fichajes_particionada CASCADE")
+
+    op.execute("ALTER TABLE fichajes ADD PRIMARY KEY (id)")
+    op.execute("""
+        ALTER TABLE fichajes
+            ADD CONSTRAINT fichajes_usuario_id_fkey
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+            ADD CONSTRAINT fichajes_empresa_id_fkey
+                FOREIGN KEY (empresa_id) REFERENCES empresas(id) ON DELETE CASCADE
+    """)
+    op.execute("CREATE INDEX ix_fichajes_usuario_fecha ON fichajes (usuario_id, fecha_hora DESC)")
+    op.execute("CREATE INDEX ix_fichajes_empresa_fecha ON fichajes (empresa_id, fecha_hora)")
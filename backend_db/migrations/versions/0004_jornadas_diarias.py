@@ -0,0 +1,158 @@
+"""Tabla jornadas_diarias (resumen incremental de horas por día)
+
+Se rellena aquí desde los fichajes existentes; después la mantiene
+marcar_fichaje. `python -m app.jornadas backfill` la recalcula si hiciera falta.
+
+El relleno lleva su propia copia de la máquina de estados de
+app.jornadas.EstadoJornada tal como era en esta revisión, y SQL directo en
+lugar de los modelos, para que cambiar la app no cambie esta migración.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from datetime import timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+LOTE = 1000
+
+ENTRADA_DUPLICADA, SALIDA_SIN_ENTRADA, PAUSA_IGNORADA, SALIDA_EN_PAUSA = 1, 2, 4, 8
+
+INSERTAR = sa.text("""
+    INSERT INTO jornadas_diarias (
+        usuario_id, fecha, empresa_id, segundos_trabajados, segundos_pausa,
+        primera_entrada, ultima_salida, anomalias, num_eventos, segundos_cerrados,
+        pausa_cerrada, entrada_abierta, pausa_inicio, pausa_acumulada, ultimo_evento
+    ) VALUES (
+        :usuario_id, :fecha, :empresa_id, :segundos_trabajados, :segundos_pausa,
+        :primera_entrada, :ultima_salida, :anomalias, :num_eventos, :segundos_cerrados,
+        :pausa_cerrada, :entrada_abierta, :pausa_inicio, :pausa_acumulada, :ultimo_evento
+    )
+""")
+
+
+def _jornada(usuario_id, fecha, empresa_id, eventos) -> dict:
+    """Columnas de jornadas_diarias de un día; `eventos`: (tipo, fecha_hora UTC) en orden."""
+    cerrados = pausa_cerrada = pausa_total = 0.0
+    entrada = pausa_ini = primera_entrada = ultima_salida = None
+    anomalias = 0
+
+    for tipo, fecha_hora in eventos:
+        if tipo == "entrada":
+            if entrada is not None:
+                cerrados += (fecha_hora - entrada).total_seconds() - pausa_total
+                pausa_cerrada += pausa_total
+                anomalias |= ENTRADA_DUPLICADA
+            entrada, pausa_ini, pausa_total = fecha_hora, None, 0.0
+            primera_entrada = primera_entrada or fecha_hora
+        elif tipo == "inicio_pausa":
+            if entrada is not None and pausa_ini is None:
+                pausa_ini = fecha_hora
+            else:
+                anomalias |= PAUSA_IGNORADA
+        elif tipo == "fin_pausa":
+            if pausa_ini is not None:
+                pausa_total += (fecha_hora - pausa_ini).total_seconds()
+                pausa_ini = None
+            else:
+                anomalias |= PAUSA_IGNORADA
+        elif tipo == "salida":
+            if entrada is not None:
+                if pausa_ini is not None:
+                    pausa_total += (fecha_hora - pausa_ini).total_seconds()
+                    pausa_ini = None
+                    anomalias |= SALIDA_EN_PAUSA
+                cerrados += (fecha_hora - entrada).total_seconds() - pausa_total
+                pausa_cerrada += pausa_total
+                entrada, pausa_total, ultima_salida = None, 0.0, fecha_hora
+            else:
+                anomalias |= SALIDA_SIN_ENTRADA
+
+    ultimo_evento = eventos[-1][1]
+    abierta = entrada is not None
+    return {
+        "usuario_id": usuario_id,
+        "fecha": fecha,
+        "empresa_id": empresa_id,
+        "segundos_trabajados": cerrados + ((ultimo_evento - entrada).total_seconds() - pausa_total if abierta else 0.0),
+        "segundos_pausa": pausa_cerrada + (pausa_total if abierta else 0.0),
+        "primera_entrada": primera_entrada,
+        "ultima_salida": ultima_salida,
+        "anomalias": anomalias,
+        "num_eventos": len(eventos),
+        "segundos_cerrados": cerrados,
+        "pausa_cerrada": pausa_cerrada,
+        "entrada_abierta": entrada,
+        "pausa_inicio": pausa_ini,
+        "pausa_acumulada": pausa_total,
+        "ultimo_evento": ultimo_evento,
+    }
+
+
+def _rellenar(conexion) -> int:
+    # fichajes.fecha_hora es TIMESTAMP sin zona con la hora UTC.
+    filas = conexion.execute(sa.text(
+        "SELECT usuario_id, empresa_id, tipo, fecha_hora FROM fichajes ORDER BY usuario_id, fecha_hora"
+    ).execution_options(stream_results=True, yield_per=5000))
+
+    lote, total = [], 0
+    clave, empresa_id, eventos = None, None, []
+    for usuario_id, empresa, tipo, fecha_hora in filas:
+        fecha_hora = fecha_hora.replace(tzinfo=timezone.utc)
+        if (usuario_id, fecha_hora.date()) != clave:
+            if eventos:
+                lote.append(_jornada(*clave, empresa_id, eventos))
+            clave, empresa_id, eventos = (usuario_id, fecha_hora.date()), empresa, []
+            if len(lote) >= LOTE:
+                conexion.execute(INSERTAR, lote)
+                total += len(lote)
+                lote.clear()
+        eventos.append((tipo, fecha_hora))
+
+    if eventos:
+        lote.append(_jornada(*clave, empresa_id, eventos))
+    if lote:
+        conexion.execute(INSERTAR, lote)
+        total += len(lote)
+    return total
+
+
+def upgrade():
+    op.create_table(
+        "jornadas_diarias",
+        sa.Column("usuario_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("fecha", sa.Date, primary_key=True),
+        sa.Column("empresa_id", UUID(as_uuid=True), sa.ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("segundos_trabajados", sa.Float, nullable=False, server_default="0"),
+        sa.Column("segundos_pausa", sa.Float, nullable=False, server_default="0"),
+        sa.Column("primera_entrada", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("ultima_salida", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("anomalias", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("num_eventos", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("segundos_cerrados", sa.Float, nullable=False, server_default="0"),
+        sa.Column("pausa_cerrada", sa.Float, nullable=False, server_default="0"),
+        sa.Column("entrada_abierta", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("pausa_inicio", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("pausa_acumulada", sa.Float, nullable=False, server_default="0"),
+        sa.Column("ultimo_evento", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("actualizado", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_jornadas_diarias_empresa_fecha", "jornadas_diarias", ["empresa_id", "fecha"])
+
+    # Sin esto /fichajes/empleado/{id}/horas devolvería [] para todo el
+    # historial hasta lanzar el backfill a mano.
+    total = _rellenar(op.get_bind())
+    print(f"✅ Jornadas calculadas: {total}")
+
+
+def downgrade():
+    op.drop_index("ix_jornadas_diarias_empresa_fecha", table_name="jornadas_diarias")
+    op.drop_table("jornadas_diarias")
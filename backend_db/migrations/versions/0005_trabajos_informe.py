@@ -0,0 +1,48 @@
+"""Tabla trabajos_informe (cola de generación de informes)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "trabajos_informe",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("usuario_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("solicitante_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("empresa_id", UUID(as_uuid=True), sa.ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("tipo", sa.String(20), nullable=False),
+        sa.Column("periodo", sa.String(10), nullable=False),
+        sa.Column("formato", sa.String(10), nullable=False),
+        sa.Column("estado", sa.String(20), nullable=False, server_default="pendiente"),
+        sa.Column("intentos", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("archivo", sa.String, nullable=True),
+        sa.Column("error", sa.String, nullable=True),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("fecha_inicio", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("fecha_fin", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_trabajos_informe_cola", "trabajos_informe", ["estado", "fecha_creacion"],
+        postgresql_where=sa.text("estado IN ('pendiente', 'procesando')"),
+    )
+    op.create_index(
+        "ix_trabajos_informe_solicitante", "trabajos_informe",
+        ["solicitante_id", sa.text("fecha_creacion DESC")],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_trabajos_informe_solicitante", table_name="trabajos_informe")
+    op.drop_index("ix_trabajos_informe_cola", table_name="trabajos_informe")
+    op.drop_table("trabajos_informe")
@@ -0,0 +1,39 @@
+"""Índice único documentos (nombre, usuario_id) para descargas por nombre
+
+guardar_archivo sobrescribe el archivo si ya existe, así que varias filas
+con el mismo (nombre, usuario_id) apuntaban al mismo archivo: se conserva la
+más reciente. Los archivos que ya estaban en disco sin fila se dan de alta
+con `python -m scripts.indexar_documentos`.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        DELETE FROM documentos d
+        USING documentos otro
+        WHERE d.nombre = otro.nombre
+          AND d.usuario_id = otro.usuario_id
+          AND (d.fecha_subida, d.id::text) < (otro.fecha_subida, otro.id::text)
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_documentos_nombre_usuario "
+            "ON documentos (nombre, usuario_id)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ux_documentos_nombre_usuario")
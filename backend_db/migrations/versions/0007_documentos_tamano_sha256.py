@@ -0,0 +1,25 @@
+"""Tamaño y sha256 de cada documento
+
+Se rellenan al guardar o subir un archivo; las filas anteriores quedan a NULL.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("documentos", sa.Column("tamano", sa.BigInteger, nullable=True))
+    op.add_column("documentos", sa.Column("sha256", sa.String(64), nullable=True))
+
+
+def downgrade():
+    op.drop_column("documentos", "sha256")
+    op.drop_column("documentos", "tamano")
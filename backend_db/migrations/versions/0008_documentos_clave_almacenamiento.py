@@ -0,0 +1,34 @@
+"""documentos.ruta y trabajos_informe.archivo pasan a ser claves del almacenamiento
+
+'uploads/documentos/<usuario>/<nombre>' -> 'documentos/<usuario>/<nombre>',
+que vale igual para el almacenamiento local (bajo ALMACENAMIENTO_DIR=uploads)
+que para S3.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+COLUMNAS = [("documentos", "ruta"), ("trabajos_informe", "archivo")]
+
+
+def upgrade():
+    for tabla, columna in COLUMNAS:
+        op.execute(
+            f"UPDATE {tabla} SET {columna} = regexp_replace({columna}, '^(\\./)?uploads/+', '') "
+            f"WHERE {columna} ~ '^(\\./)?uploads/'"
+        )
+
+
+def downgrade():
+    for tabla, columna in COLUMNAS:
+        op.execute(
+            f"UPDATE {tabla} SET {columna} = 'uploads/' || {columna} "
+            f"WHERE {columna} LIKE 'documentos/%'"
+        )
@@ -0,0 +1,32 @@
+"""Tabla blobs (documentos direccionados por contenido)
+
+Los documentos enviados a varios empleados se guardan una vez en
+`blobs/{sha256[:2]}/{sha256}` y cada fila de documentos apunta a esa clave.
+Las filas existentes no cambian: siguen con su clave por usuario.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("tamano", sa.BigInteger, nullable=False),
+        sa.Column("referencias", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("fecha_uso", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("blobs")
@@ -0,0 +1,55 @@
+"""Difusiones (mensajes a toda la empresa) con estado por usuario
+
+- difusiones: un registro por mensaje enviado con todos=True.
+- estados_difusion: leída/borrada por usuario, solo cuando se marca una a una.
+- usuarios.notificaciones_leidas_hasta: marca de "todas leídas".
+
+Las notificaciones ya enviadas a toda la empresa siguen como filas por
+empleado en notificaciones.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "difusiones",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("empresa_id", UUID(as_uuid=True), sa.ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("titulo", sa.String(150), nullable=False),
+        sa.Column("mensaje", sa.String, nullable=False),
+        sa.Column("tipo", sa.String(30), nullable=False),
+        sa.Column("origen", sa.String(50), server_default="admin"),
+        sa.Column("archivo", sa.String, nullable=True),
+        sa.Column("fecha_envio", sa.DateTime, nullable=False, server_default=sa.text("(now() AT TIME ZONE 'utc')")),
+    )
+    op.create_index(
+        "ix_difusiones_empresa_fecha", "difusiones", ["empresa_id", sa.text("fecha_envio DESC")],
+    )
+
+    op.create_table(
+        "estados_difusion",
+        sa.Column("usuario_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("difusion_id", UUID(as_uuid=True), sa.ForeignKey("difusiones.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("leida", sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Column("eliminada", sa.Boolean, nullable=False, server_default=sa.false()),
+    )
+
+    op.add_column("usuarios", sa.Column("notificaciones_leidas_hasta", sa.DateTime, nullable=True))
+
+
+def downgrade():
+    op.drop_column("usuarios", "notificaciones_leidas_hasta")
+    op.drop_table("estados_difusion")
+    op.drop_index("ix_difusiones_empresa_fecha", table_name="difusiones")
+    op.drop_table("difusiones")
@@ -0,0 +1,31 @@
+"""Índice parcial de notificaciones no leídas
+
+Sirve al contador de no leídas (GET /notificaciones/no-leidas): con
+(usuario_id, fecha_envio) WHERE leida = false el recuento es un index-only
+scan sobre las pocas filas sin leer de cada usuario. Las filas con leida NULL
+(anteriores al valor por defecto) pasan a false para que el índice las vea.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE notificaciones SET leida = false WHERE leida IS NULL")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notificaciones_no_leidas "
+            "ON notificaciones (usuario_id, fecha_envio) WHERE leida = false"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_notificaciones_no_leidas")
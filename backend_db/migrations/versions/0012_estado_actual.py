@@ -0,0 +1,43 @@
+"""Tabla estado_actual (último fichaje por usuario)
+
+Se rellena aquí con el último fichaje de cada usuario; después la mantiene
+marcar_fichaje en la misma transacción que el fichaje.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "estado_actual",
+        sa.Column("usuario_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("empresa_id", UUID(as_uuid=True), sa.ForeignKey("empresas.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("tipo", sa.String(30), nullable=False),
+        sa.Column("fecha_hora", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_estado_actual_empresa", "estado_actual", ["empresa_id"])
+
+    # ix_fichajes_usuario_fecha (usuario_id, fecha_hora DESC) sirve el DISTINCT ON.
+    op.execute(
+        """
+        INSERT INTO estado_actual (usuario_id, empresa_id, tipo, fecha_hora)
+        SELECT DISTINCT ON (usuario_id) usuario_id, empresa_id, tipo, fecha_hora
+        FROM fichajes
+        ORDER BY usuario_id, fecha_hora DESC
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_estado_actual_empresa", table_name="estado_actual")
+    op.drop_table("estado_actual")
@@ -0,0 +1,31 @@
+"""Tabla fichajes_idempotencia (claves de idempotencia de POST /fichajes/lote)
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "fichajes_idempotencia",
+        sa.Column("usuario_id", UUID(as_uuid=True), sa.ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("clave", sa.String(100), primary_key=True),
+        sa.Column("fichaje_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("fecha_hora", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_fichajes_idempotencia_creacion", "fichajes_idempotencia", ["fecha_creacion"])
+
+
+def downgrade():
+    op.drop_index("ix_fichajes_idempotencia_creacion", table_name="fichajes_idempotencia")
+    op.drop_table("fichajes_idempotencia")
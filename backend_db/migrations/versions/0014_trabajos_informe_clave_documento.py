@@ -0,0 +1,31 @@
+"""trabajos_informe.archivo vuelve a guardar la clave por usuario
+
+Los informes terminados mientras guardar_archivo devolvía la clave del blob
+(blobs/xx/sha256) pasan a documentos/{usuario_id}/{nombre}, con el mismo
+nombre que les dio la cola (app.informes.nombre_informe).
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        UPDATE trabajos_informe
+        SET archivo = 'documentos/' || usuario_id || '/'
+            || CASE WHEN tipo = 'semanal' THEN 'informe_' ELSE 'informe_mensual_' END
+            || periodo || '.' || formato
+        WHERE archivo LIKE 'blobs/%'
+    """)
+
+
+def downgrade():
+    # La clave por usuario se resuelve igual al descargar; no hace falta volver atrás.
+    pass
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark y comprobación de paridad del motor vectorizado de horas.
+
+Genera N fichajes sintéticos (mezcla de jornadas normales y secuencias
+aleatorias con anomalías), los calcula con app.horas.calcular_horas y con
+la máquina de estados fila a fila (app.jornadas.EstadoJornada), compara
+ambos resultados y muestra los tiempos. No necesita base de datos.
+
+Uso (desde backend_db/):
+    python -m scripts.bench_horas --filas 1000000 --usuarios 2000
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from app.horas import calcular_horas
+from app.jornadas import EstadoJornada, fecha_de
+
+TIPOS = np.array(["entrada", "inicio_pausa", "fin_pausa", "salida"], dtype=object)
+
+
+def generar(filas: int, usuarios: int, semilla: int):
+    rng = np.random.default_rng(semilla)
+    usuario_id = rng.integers(0, usuarios, filas)
+    # Mitad jornadas ordenadas (entrada, pausa, fin, salida), mitad aleatorias
+    ciclo = np.arange(filas) % 4
+    aleatorio = rng.integers(0, 4, filas)
+    tipo = TIPOS[np.where(rng.random(filas) < 0.5, ciclo, aleatorio)]
+    base = np.datetime64("2025-01-01T00:00:00", "s")
+    segundos = rng.integers(0, 60 * 86400, filas)
+    fecha_hora = pd.to_datetime(base + segundos.astype("timedelta64[s]")).tz_localize("UTC")
+    return usuario_id.astype(str), tipo, fecha_hora
+
+
+def referencia(usuario_id, tipo, fecha_hora):
+    ordenados = sorted(zip(usuario_id, tipo, fecha_hora), key=lambda r: (r[0], r[2]))
+    eventos = defaultdict(list)
+    for u, t, f in ordenados:
+        eventos[(u, fecha_de(f))].append((t, f))
+    return {
+        clave: EstadoJornada.desde_eventos(ev)
+        for clave, ev in eventos.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    usuario_id, tipo, fecha_hora = generar(args.filas, args.usuarios, args.semilla)
+
+    inicio = time.perf_counter()
+    vectorizado = calcular_horas(usuario_id, tipo, fecha_hora)
+    t_vectorizado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    esperado = referencia(usuario_id, tipo, fecha_hora.to_pydatetime())
+    t_referencia = time.perf_counter() - inicio
+
+    obtenido = {
+        (r.usuario_id, r.fecha): (r.segundos_trabajados, r.segundos_pausa)
+        for r in vectorizado.itertuples()
+    }
+    assert obtenido.keys() == esperado.keys(), "Los grupos (usuario, día) no coinciden"
+    errores = [
+        clave for clave, estado in esperado.items()
+        if abs(obtenido[clave][0] - estado.segundos_trabajados) > 1e-6
+        or abs(obtenido[clave][1] - estado.segundos_pausa) > 1e-6
+    ]
+    assert not errores, f"{len(errores)} días difieren, p. ej. {errores[:3]}"
+
+    print(f"filas: {args.filas}  días calculados: {len(vectorizado)}  paridad: OK")
+    print(f"vectorizado: {t_vectorizado:8.2f}s  ({args.filas / t_vectorizado:,.0f} filas/s)")
+    print(f"fila a fila: {t_referencia:8.2f}s  ({args.filas / t_referencia:,.0f} filas/s)")
+    print(f"aceleración: x{t_referencia / t_vectorizado:.1f}")
+
+
+if __name__ == "__main__":
+    main()
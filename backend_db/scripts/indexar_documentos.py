@@ -0,0 +1,83 @@
+"""
+Da de alta en la tabla documentos los archivos de uploads/documentos que no
+tienen fila (subidos o generados antes de que las descargas por nombre se
+resolvieran contra la BD). Los que ya la tienen no se tocan. Solo tiene
+sentido con el almacenamiento local (ALMACENAMIENTO=local).
+
+Uso (desde backend_db/):
+    python -m scripts.indexar_documentos [--dry-run]
+
+Una vez tras desplegar, dentro del contenedor de la API:
+    docker compose exec api python -m scripts.indexar_documentos
+"""
+import argparse
+import hashlib
+import os
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.documento import Documento
+from app.models.usuario import Usuario
+from app.almacenamiento import ALMACENAMIENTO, ALMACENAMIENTO_DIR
+from app.routers.documentos import PREFIJO, clave_documento, registrar_documento
+
+BASE_DIR = os.path.join(ALMACENAMIENTO_DIR, PREFIJO)
+
+
+def _sha256(ruta: str) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        while trozo := f.read(1024 * 1024):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Solo lista lo que se daría de alta")
+    args = parser.parse_args()
+
+    if ALMACENAMIENTO != "local":
+        print("Este script solo recorre el almacenamiento local")
+        return
+
+    if not os.path.isdir(BASE_DIR):
+        print(f"No existe {BASE_DIR}")
+        return
+
+    with SessionLocal() as db:
+        usuarios = {str(u) for u in db.execute(select(Usuario.id)).scalars()}
+        existentes = {
+            (str(usuario_id), nombre)
+            for usuario_id, nombre in db.execute(select(Documento.usuario_id, Documento.nombre))
+        }
+
+    nuevos = omitidos = 0
+    for usuario_id in sorted(os.listdir(BASE_DIR)):
+        carpeta = os.path.join(BASE_DIR, usuario_id)
+        if not os.path.isdir(carpeta):
+            continue
+        if usuario_id not in usuarios:
+            print(f"⚠️  Carpeta sin usuario, se ignora: {carpeta}")
+            omitidos += 1
+            continue
+
+        for nombre in sorted(os.listdir(carpeta)):
+            ruta = os.path.join(carpeta, nombre)
+            if not os.path.isfile(ruta) or nombre.endswith(".tmp") or (usuario_id, nombre) in existentes:
+                continue
+            if not args.dry_run:
+                registrar_documento(
+                    usuario_id, nombre, clave_documento(usuario_id, nombre),
+                    tamano=os.path.getsize(ruta), sha256=_sha256(ruta),
+                )
+            print(f"+ {usuario_id}/{nombre}")
+            nuevos += 1
+
+    accion = "a dar de alta" if args.dry_run else "dados de alta"
+    print(f"✅ {nuevos} documentos {accion}, {omitidos} carpetas ignoradas")
+
+
+if __name__ == "__main__":
+    main()
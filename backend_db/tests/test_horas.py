@@ -0,0 +1,96 @@
+"""
+app.horas.calcular_horas tiene que dar lo mismo que EstadoJornada
+(app/jornadas.py), que es lo que se guarda en jornadas_diarias.
+
+    python -m pytest tests  (desde backend_db/)
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from app.horas import calcular_horas
+from app.jornadas import EstadoJornada
+
+
+def h(hora: str) -> datetime:
+    return datetime.fromisoformat(f"2025-03-10T{hora}").replace(tzinfo=timezone.utc)
+
+
+def esperado(eventos):
+    """{(usuario, fecha): (trabajados, pausa)} según EstadoJornada."""
+    dias = {}
+    for usuario, tipo, fecha_hora in sorted(eventos, key=lambda e: (e[0], e[2])):
+        dias.setdefault((usuario, fecha_hora.date()), []).append((tipo, fecha_hora))
+    resultado = {}
+    for clave, eventos_dia in dias.items():
+        estado = EstadoJornada.desde_eventos(eventos_dia)
+        resultado[clave] = (estado.segundos_trabajados, estado.segundos_pausa)
+    return resultado
+
+
+def calculado(eventos):
+    usuario_id, tipo, fecha_hora = zip(*eventos)
+    df = calcular_horas(list(usuario_id), list(tipo), list(fecha_hora))
+    return {
+        (f.usuario_id, f.fecha): (f.segundos_trabajados, f.segundos_pausa)
+        for f in df.itertuples()
+    }
+
+
+CASOS = {
+    "entrada_duplicada": [
+        ("u1", "entrada", h("08:00")),
+        ("u1", "entrada", h("09:00")),
+        ("u1", "salida", h("12:00")),
+    ],
+    "pausa_abierta_en_salida": [
+        ("u1", "entrada", h("08:00")),
+        ("u1", "inicio_pausa", h("10:00")),
+        ("u1", "salida", h("10:30")),
+    ],
+    "eventos_antes_de_la_primera_entrada": [
+        ("u1", "salida", h("07:00")),
+        ("u1", "inicio_pausa", h("07:10")),
+        ("u1", "fin_pausa", h("07:20")),
+        ("u1", "entrada", h("08:00")),
+        ("u1", "salida", h("16:00")),
+    ],
+    "sesion_abierta_al_final_del_dia": [
+        ("u1", "entrada", h("08:00")),
+        ("u1", "inicio_pausa", h("11:00")),
+        ("u1", "fin_pausa", h("11:15")),
+        ("u1", "inicio_pausa", h("13:00")),
+    ],
+    "varios_usuarios_el_mismo_dia": [
+        ("u2", "entrada", h("09:00")),
+        ("u1", "entrada", h("08:00")),
+        ("u2", "inicio_pausa", h("12:00")),
+        ("u1", "salida", h("14:00")),
+        ("u2", "fin_pausa", h("12:30")),
+        ("u1", "entrada", h("15:00")),
+        ("u2", "salida", h("17:00")),
+        ("u1", "salida", h("18:00")),
+    ],
+}
+
+
+@pytest.mark.parametrize("eventos", CASOS.values(), ids=CASOS.keys())
+def test_coincide_con_estado_jornada(eventos):
+    obtenido = calculado(eventos)
+    referencia = esperado(eventos)
+
+    assert obtenido.keys() == referencia.keys()
+    for clave, (trabajados, pausa) in referencia.items():
+        assert obtenido[clave] == pytest.approx((trabajados, pausa)), clave
+
+
+def test_valores_conocidos():
+    # Una referencia fija por si las dos implementaciones cambiaran a la vez.
+    dia = h("00:00").date()
+
+    pausa = calculado(CASOS["pausa_abierta_en_salida"])
+    assert pausa[("u1", dia)] == pytest.approx((2 * 3600, 0.5 * 3600))
+
+    varios = calculado(CASOS["varios_usuarios_el_mismo_dia"])
+    assert varios[("u1", dia)] == pytest.approx((9 * 3600, 0))
+    assert varios[("u2", dia)] == pytest.approx((7.5 * 3600, 0.5 * 3600))
@@ -0,0 +1,111 @@
+"""
+Un informe de la cola sigue descargándose (con su nombre) después de pasar
+la limpieza de blobs de app.blobs, también si su documento se sobrescribe.
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas; si
+no hay conexión se salta.
+
+    python -m pytest tests  (desde backend_db/)
+"""
+import time
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+
+try:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1 FROM trabajos_informe LIMIT 1"))
+except Exception as e:  # sin Postgres o sin migrar
+    pytest.skip(f"Sin base de datos: {e}", allow_module_level=True)
+
+from fastapi.testclient import TestClient
+
+from app.blobs import limpiar
+from app.main import app
+from app.routers.documentos import guardar_archivo, ruta_documento
+from app.security import hash_password
+
+
+@pytest.fixture
+def empleado():
+    empresa_id, usuario_id = uuid.uuid4(), uuid.uuid4()
+    email = f"informe-{usuario_id}@example.com"
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO empresas (id, nombre, nombre_admin, email_admin, max_empleados) "
+                "VALUES (:id, 'test', 'test', :email, 1)"
+            ),
+            {"id": empresa_id, "email": f"admin-{empresa_id}@example.com"},
+        )
+        conn.execute(
+            text(
+                "INSERT INTO usuarios (id, empresa_id, email, password_hash, nombre, rol) "
+                "VALUES (:id, :empresa_id, :email, :password, 'test', 'empleado')"
+            ),
+            {"id": usuario_id, "empresa_id": empresa_id, "email": email, "password": hash_password("pw")},
+        )
+    yield usuario_id, email
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM notificaciones WHERE empresa_id = :id"), {"id": empresa_id})
+        conn.execute(text("DELETE FROM fichajes WHERE empresa_id = :id"), {"id": empresa_id})
+        conn.execute(text("DELETE FROM empresas WHERE id = :id"), {"id": empresa_id})
+
+
+def _esperar(client, cabeceras, trabajo_id):
+    for _ in range(60):
+        trabajo = client.get(f"/informes/{trabajo_id}", headers=cabeceras).json()
+        if trabajo["estado"] not in ("pendiente", "procesando"):
+            return trabajo
+        time.sleep(0.5)
+    pytest.fail(f"El informe sigue {trabajo['estado']}")
+
+
+def test_informe_sobrevive_a_la_limpieza_de_blobs(empleado):
+    usuario_id, email = empleado
+    periodo = date.today().strftime("%Y-%m")
+    nombre = f"informe_mensual_{periodo}.csv"
+
+    with TestClient(app) as client:
+        token = client.post("/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+        cabeceras = {"Authorization": f"Bearer {token}"}
+        assert client.post("/fichajes/entrada", headers=cabeceras).status_code == 200
+        assert client.post("/fichajes/salida", headers=cabeceras).status_code == 200
+
+        respuesta = client.post(
+            "/informes/",
+            json={"usuario_id": str(usuario_id), "tipo": "mensual", "periodo": periodo, "formato": "csv"},
+            headers=cabeceras,
+        )
+        trabajo = _esperar(client, cabeceras, respuesta.json()["id"])
+        assert trabajo["estado"] == "completado", trabajo
+        assert trabajo["archivo"] == nombre
+
+        descarga = client.get(f"/informes/{trabajo['id']}/descargar", headers=cabeceras)
+        assert descarga.status_code == 200
+        assert nombre in descarga.headers["content-disposition"]
+        original = descarga.content
+
+        limpiar(gracia_horas=0)
+        descarga = client.get(f"/informes/{trabajo['id']}/descargar", headers=cabeceras)
+        assert descarga.status_code == 200
+        assert descarga.content == original
+
+        # El documento del mismo nombre se sobrescribe: el blob del informe
+        # anterior se queda sin referencias y se borra, y la descarga del
+        # trabajo sigue al documento actual.
+        blob_anterior = ruta_documento(usuario_id, nombre)
+        guardar_archivo(str(usuario_id), nombre, b"Fecha,Tipo,Hora\n", "informe")
+        limpiar(gracia_horas=0)
+        with engine.connect() as conn:
+            sha256 = blob_anterior.rsplit("/", 1)[1]
+            assert conn.execute(text("SELECT 1 FROM blobs WHERE sha256 = :s"), {"s": sha256}).first() is None
+
+        descarga = client.get(f"/informes/{trabajo['id']}/descargar", headers=cabeceras)
+        assert descarga.status_code == 200
+        assert nombre in descarga.headers["content-disposition"]
+        assert descarga.content == b"Fecha,Tipo,Hora\n"
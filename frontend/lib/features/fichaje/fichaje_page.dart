@@ -10,6 +10,7 @@ import 'package:provider/provider.dart';
 import 'package:registro_horario/utils/fichaje_utils.dart';
 import 'package:registro_horario/theme_provider.dart';
 import 'package:registro_horario/features/notifications/notification_page.dart';
+import 'package:registro_horario/features/notifications/notification_services.dart';
 import 'package:registro_horario/features/fichaje/fichado_detalle_page.dart'
     hide FichajeUtils;
 import 'package:registro_horario/services/fichaje_service.dart';
@@ -38,12 +39,15 @@ class _FichajePageState extends State<FichajePage> with WidgetsBindingObserver {
 
   Duration _pausaHoy = Duration.zero;
 
+  int _noLeidas = 0;
+
   @override
   void initState() {
     super.initState();
     WidgetsBinding.instance.addObserver(this);
     _loadUser();
     _loadAll();
+    _loadUnread();
 
     _tick = Timer.periodic(const Duration(seconds: 1), (_) {
       if (historial.isNotEmpty) {
@@ -64,7 +68,19 @@ class _FichajePageState extends State<FichajePage> with WidgetsBindingObserver {
 
   @override
   void didChangeAppLifecycleState(AppLifecycleState state) {
-    if (state == AppLifecycleState.resumed) _loadAll();
+    if (state == AppLifecycleState.resumed) {
+      _loadAll();
+      _loadUnread();
+    }
+  }
+
+  Future<void> _loadUnread() async {
+    try {
+      final n = await NotificationsService.getUnreadCount();
+      if (mounted) setState(() => _noLeidas = n);
+    } catch (e) {
+      print("⚠️ No se pudo cargar el contador de notificaciones: $e");
+    }
   }
 
   Future<void> _loadUser() async {
@@ -266,14 +282,21 @@ class _FichajePageState extends State<FichajePage> with WidgetsBindingObserver {
           ),
           IconButton(
             tooltip: "Notificaciones",
-            icon: Icon(
-              Icons.notifications_active_rounded,
-              color: theme.colorScheme.onSurface,
-            ),
-            onPressed: () => Navigator.push(
-              context,
-              MaterialPageRoute(builder: (_) => NotificationsPage()),
+            icon: Badge(
+              isLabelVisible: _noLeidas > 0,
+              label: Text(_noLeidas > 99 ? "99+" : "$_noLeidas"),
+              child: Icon(
+                Icons.notifications_active_rounded,
+                color: theme.colorScheme.onSurface,
+              ),
             ),
+            onPressed: () async {
+              await Navigator.push(
+                context,
+                MaterialPageRoute(builder: (_) => NotificationsPage()),
+              );
+              _loadUnread();
+            },
           ),
           Padding(
             padding: const EdgeInsets.only(right: 14),
@@ -1,14 +1,37 @@
 import 'package:registro_horario/services/api_service.dart';
 
 class NotificationsService {
-  static Future<List<Map<String, dynamic>>> getNotifications() async {
-    final res = await ApiService.get("/notificaciones/me");
-    return List<Map<String, dynamic>>.from(res);
+  static const int _pageSize = 200;
+
+  /// Las listas vienen paginadas: se sigue `x-siguiente-cursor` hasta que
+  /// el servidor deja de enviarlo.
+  static Future<List<Map<String, dynamic>>> _fetchAllPages(
+    String endpoint,
+  ) async {
+    final items = <Map<String, dynamic>>[];
+    String? cursor;
+    do {
+      final query = cursor == null
+          ? "?limite=$_pageSize"
+          : "?limite=$_pageSize&cursor=${Uri.encodeQueryComponent(cursor)}";
+      final res = await ApiService.getWithHeaders("$endpoint$query");
+      items.addAll(List<Map<String, dynamic>>.from(res.body));
+      cursor = res.headers["x-siguiente-cursor"];
+    } while (cursor != null && cursor.isNotEmpty);
+    return items;
+  }
+
+  static Future<List<Map<String, dynamic>>> getNotifications() {
+    return _fetchAllPages("/notificaciones/me");
+  }
+
+  static Future<List<Map<String, dynamic>>> getSentNotifications() {
+    return _fetchAllPages("/notificaciones/enviadas");
   }
 
-  static Future<List<Map<String, dynamic>>> getSentNotifications() async {
-    final res = await ApiService.get("/notificaciones/enviadas");
-    return List<Map<String, dynamic>>.from(res);
+  static Future<int> getUnreadCount() async {
+    final res = await ApiService.get("/notificaciones/no-leidas");
+    return res["no_leidas"] as int;
   }
 
   static Future<void> markAllRead() async {
@@ -37,6 +37,21 @@ class ApiService {
     }
   }
 
+  /// Como [get], pero devuelve también las cabeceras de la respuesta
+  /// (p. ej. `x-siguiente-cursor` en las listas paginadas).
+  static Future<({dynamic body, Map<String, String> headers})> getWithHeaders(
+    String endpoint,
+  ) async {
+    final uri = Uri.parse("$baseUrl$endpoint");
+    try {
+      final res = await http.get(uri, headers: await authHeaders());
+      return (body: _handleResponse(res), headers: res.headers);
+    } catch (e) {
+      print("❌ Error GET $uri → $e");
+      throw Exception("Error de conexión al servidor");
+    }
+  }
+
   static Future<dynamic> post(String endpoint, dynamic data) async {
     final uri = Uri.parse("$baseUrl$endpoint");
     try {